@@ -3,7 +3,14 @@ BTLE geiger counter Kismet data source
 
 Accepts standard options:
     device=BTLE device MAC
-
+    devices="MAC,MAC,..."   Additional counters handled by the same source
+    window=seconds          Aggregate each counter's samples into one report
+                            per window with min/max/mean values (default 10,
+                            0 reports every sample)
+
+Samples are taken from GATT notifications when the counter supports them, and
+by polling the characteristics otherwise.  Lost connections are re-established
+in the background.
 """
 
 from __future__ import print_function
@@ -19,6 +26,7 @@ import subprocess
 import sys
 import threading
 import time
+import traceback
 import uuid
 
 have_blepy = False
@@ -31,47 +39,326 @@ except:
 
 from . import kismetexternal
 
-class Geiger(Peripheral):
-    def __init__(self, addr):
-        self.svcUUID = UUID('db058fb8-776a-45a9-a5b4-cdefbbdfacc3')
-        self.cpsUUID = UUID('413fad46-e55e-495c-bb97-4bf18efe911d')
-        self.cpmUUID = UUID('6861f015-66e0-4a83-a31f-527a34829341')
-        self.usvhUUID = UUID('99f35c9e-b165-432c-942e-d5155a19a2f1')
+GEIGER_SERVICE_UUID = 'db058fb8-776a-45a9-a5b4-cdefbbdfacc3'
+GEIGER_CPS_UUID = '413fad46-e55e-495c-bb97-4bf18efe911d'
+GEIGER_CPM_UUID = '6861f015-66e0-4a83-a31f-527a34829341'
+GEIGER_USVH_UUID = '99f35c9e-b165-432c-942e-d5155a19a2f1'
+
+# Client characteristic configuration descriptor, and the notify property bit
+CCCD_UUID = 0x2902
+PROP_NOTIFY = 0x10
+
+class GeigerDelegate(DefaultDelegate if have_blepy else object):
+    def __init__(self, geiger):
+        if have_blepy:
+            DefaultDelegate.__init__(self)
+
+        self.geiger = geiger
+
+    def handleNotification(self, cHandle, data):
+        self.geiger.handle_value(cHandle, data)
+
+class Geiger(object):
+    """
+    Connection to a single BTLE geiger counter.
+
+    The reader thread subscribes to notifications on the CPS, CPM, and uSv/h
+    characteristics; a counter which doesn't notify, or goes quiet, is read
+    directly instead.  When the connection drops it is re-established with an
+    increasing delay.  Complete samples are passed to sample_cb as a dict, and
+    connection changes to status_cb as a message, both from the reader thread.
+
+    peripheral_cb creates the bluepy Peripheral for an address, and can be
+    replaced to run without hardware.
+    """
+    def __init__(self, addr, sample_cb, status_cb = None, peripheral_cb = None):
+        self.addr = addr
+        self.sample_cb = sample_cb
+        self.status_cb = status_cb
+
+        if peripheral_cb is None:
+            if not have_blepy:
+                raise RuntimeError("btgeiger requires bluepy")
+            peripheral_cb = Peripheral
+
+        self.peripheral_cb = peripheral_cb
+
+        # Poll rate when we can't get notifications, and how long notifications
+        # can go quiet before we poll anyhow
+        self.poll_interval = 0.5
+        self.notify_timeout = 5
+
+        self.backoff_min = 1
+        self.backoff_max = 60
+
+        self.peripheral = None
+        self.fields = {}
+        self.notifying = False
+
+        self.values = {}
+        self.pending = set()
 
-        connected = False
-        for x in range(0, 5):
+        self.running = False
+        self.thread = None
+        self.wakeup = threading.Event()
+
+        self.stats = {
+                'samples': 0,
+                'notifications': 0,
+                'polls': 0,
+                'connects': 0,
+                'disconnects': 0,
+                }
+
+    def connect(self):
+        p = self.peripheral_cb(self.addr)
+
+        try:
+            service = p.getServiceByUUID(GEIGER_SERVICE_UUID)
+
+            chars = {}
+            for (field, u) in (('cps', GEIGER_CPS_UUID), ('cpm', GEIGER_CPM_UUID), ('usvh', GEIGER_USVH_UUID)):
+                chars[field] = service.getCharacteristics(u)[0]
+
+            self.chars = chars
+            self.fields = { c.getHandle(): f for f, c in chars.items() }
+
+            p.withDelegate(GeigerDelegate(self))
+
+            # Subscribe to anything which supports it; one characteristic without
+            # notifications puts us back on polling
+            self.notifying = True
+            for c in chars.values():
+                if not c.properties & PROP_NOTIFY:
+                    self.notifying = False
+                    continue
+
+                cccd = c.getDescriptors(forUUID = CCCD_UUID)[0]
+                cccd.write(b"\x01\x00", withResponse = True)
+        except Exception:
             try:
-                Peripheral.__init__(self, addr)
-                connected = True
-                break
-            except Exception as e:
-                continue
+                p.disconnect()
+            except Exception:
+                pass
+            raise
+
+        self.peripheral = p
+        self.values = {}
+        self.pending = set()
 
-        if not connected:
-            raise RuntimeError('could not connect to btgeiger device in 5 tries')
+        self.stats['connects'] += 1
 
-        self.service = self.getServiceByUUID(self.svcUUID)
-        self.cps = self.service.getCharacteristics(self.cpsUUID)[0]
-        self.cpm = self.service.getCharacteristics(self.cpmUUID)[0]
-        self.usvh = self.service.getCharacteristics(self.usvhUUID)[0]
+    def disconnect(self):
+        p = self.peripheral
+        self.peripheral = None
+
+        if p is not None:
+            try:
+                p.disconnect()
+            except Exception:
+                pass
 
     def read(self):
-        cps = int.from_bytes(self.cps.read(), "little")
-        cpm = int.from_bytes(self.cpm.read(), "little")
-        usvh = int.from_bytes(self.usvh.read(), "little")
+        cps = int.from_bytes(self.chars['cps'].read(), "little")
+        cpm = int.from_bytes(self.chars['cpm'].read(), "little")
+        usvh = int.from_bytes(self.chars['usvh'].read(), "little")
         usvh = float(usvh) / 1000.0
 
         return (cps, cpm, usvh)
 
+    def __emit(self):
+        if not len(self.values):
+            return
+
+        sample = { 'cps': self.values.get('cps'), 'cpm': self.values.get('cpm'), 'usvh': self.values.get('usvh') }
+        self.pending = set()
+
+        self.stats['samples'] += 1
+        self.sample_cb(self, sample)
+
+    def handle_value(self, handle, data):
+        """
+        A notification arrived; a sample is complete once every field has been
+        updated, or when a field repeats before the others arrive
+        """
+        field = self.fields.get(handle)
+
+        if field is None:
+            return
+
+        self.stats['notifications'] += 1
+
+        if field in self.pending:
+            self.__emit()
+
+        v = int.from_bytes(data, "little")
+
+        if field == 'usvh':
+            v = float(v) / 1000.0
+
+        self.values[field] = v
+        self.pending.add(field)
+
+        if len(self.pending) == 3:
+            self.__emit()
+
+    def poll(self):
+        (cps, cpm, usvh) = self.read()
+        self.values = { 'cps': cps, 'cpm': cpm, 'usvh': usvh }
+
+        self.stats['polls'] += 1
+        self.__emit()
+
+    def __status(self, msg):
+        if self.status_cb is not None:
+            self.status_cb(self, msg)
+
+    def __sample_loop(self):
+        last = time.monotonic()
+
+        while self.running:
+            if self.notifying:
+                if self.peripheral.waitForNotifications(self.poll_interval):
+                    last = time.monotonic()
+                    continue
+
+                # Notifications went quiet; make sure the counter is still there
+                # and keep the samples coming
+                if time.monotonic() - last < self.notify_timeout:
+                    continue
+
+            self.poll()
+            last = time.monotonic()
+
+            if not self.notifying:
+                self.wakeup.wait(self.poll_interval)
+
+    def __run(self):
+        backoff = self.backoff_min
+
+        while self.running:
+            try:
+                if self.peripheral is None:
+                    self.connect()
+                    self.__status("connected to {}".format(self.addr))
+
+                backoff = self.backoff_min
+
+                self.__sample_loop()
+            except Exception as e:
+                self.disconnect()
+
+                if not self.running:
+                    break
+
+                self.stats['disconnects'] += 1
+                self.__status("lost connection to {} ({}), reconnecting in {} seconds".format(self.addr, e, backoff))
+
+                self.wakeup.wait(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+
+        self.disconnect()
+
+    def start(self):
+        if self.thread is not None:
+            return
+
+        self.running = True
+        self.wakeup.clear()
+
+        self.thread = threading.Thread(target = self.__run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+class GeigerWindow(object):
+    """
+    Aggregate one counter's samples over a reporting window, keeping the
+    minimum, maximum, and mean of each field so short spikes still show up in
+    the report
+    """
+    fields = ('cps', 'cpm', 'usvh')
+
+    def __init__(self, device, window):
+        self.device = device
+        self.window = window
+
+        self.start = None
+        self.reset()
+
+    def reset(self):
+        self.start = None
+        self.count = 0
+        self.min = {}
+        self.max = {}
+        self.sum = {}
+
+    def add(self, sample, now):
+        if self.start is None:
+            self.start = now
+
+        self.count += 1
+
+        for f in self.fields:
+            v = sample.get(f)
+
+            if v is None:
+                continue
+
+            if f in self.sum:
+                self.min[f] = min(self.min[f], v)
+                self.max[f] = max(self.max[f], v)
+                self.sum[f] += v
+            else:
+                self.min[f] = v
+                self.max[f] = v
+                self.sum[f] = v
+
+    def deadline(self):
+        if self.start is None:
+            return None
+
+        return self.start + self.window
+
+    def report(self, now):
+        """
+        Summarize the window and start a new one; the plain field names carry the
+        mean so a window reads like a single sample
+        """
+        r = { 'device': self.device, 'window': now - self.start, 'samples': self.count }
+
+        for f in self.fields:
+            if not f in self.sum:
+                continue
+
+            r[f] = self.sum[f] / self.count
+            r[f + '_min'] = self.min[f]
+            r[f + '_max'] = self.max[f]
+
+        self.reset()
+
+        return r
+
 class KismetBtGeiger(object):
     def __init__(self):
         self.opts = {}
 
         self.opts['device'] = None
+        self.opts['devices'] = []
         self.opts['debug'] = None
+        self.opts['window'] = 10
 
         self.kismet = None
-        self.geiger = None
+
+        # Geiger connections and their report windows, by device MAC
+        self.geigers = {}
+        self.windows = {}
+
+        # How many times to try the first connection when opening the source
+        self.open_tries = 5
 
         # We're usually not remote
         self.proberet = None
@@ -197,6 +484,23 @@ class KismetBtGeiger(object):
             if options['debug'] == 'True' or options['debug'] == 'true':
                 self.opts['debug'] = True
 
+        devices = [options['device']]
+
+        if 'devices' in options:
+            for d in options['devices'].split(','):
+                d = d.strip()
+
+                if len(d) and not d in devices:
+                    devices.append(d)
+
+        if 'window' in options:
+            try:
+                self.opts['window'] = float(options['window'])
+            except ValueError:
+                ret["success"] = False
+                ret["message"] = "Could not parse 'window' option, expected seconds"
+                return ret
+
         ret['hardware'] = options['device']
         if ('uuid' in options):
             ret['uuid'] = options['uuid']
@@ -206,8 +510,9 @@ class KismetBtGeiger(object):
         ret['capture_interface'] = f"btgeiger-{options['device']}"
 
         self.opts['device'] = options['device']
+        self.opts['devices'] = devices
 
-        (ret['success'], ret['message']) = self.open_radio(self.opts['device'])
+        (ret['success'], ret['message']) = self.open_radios(devices)
 
         if not ret['success']:
             return ret
@@ -242,31 +547,91 @@ class KismetBtGeiger(object):
 
         return True
 
-    def __async_radio_thread(self):
-        # This function blocks forever until cancelled
+    def __post_message(self, msg):
+        # Called from the geiger reader thread
         try:
-            while True:
-                (cps, cpm, usvh) = self.geiger.read()
-                self.kismet.add_task(self.message_queue.put, [{"cps": cps, "cpm": cpm, "usvh": usvh}])
-                time.sleep(0.5)
-        except Exception as e:
-            self.kismet.send_datasource_error_report(message = f"Error reading from BT geiger: {e}")
+            self.kismet.get_loop().call_soon_threadsafe(self.message_queue.put_nowait, msg)
+        except RuntimeError:
+            # Loop is already closed, we're shutting down
+            pass
+
+    def __geiger_sample(self, geiger, sample):
+        self.__post_message((geiger.addr, sample))
 
-        # Always make sure we die
-        self.kismet.spindown()
+    def __geiger_status(self, geiger, msg):
+        def send():
+            self.kismet.send_message("btgeiger: {}".format(msg))
 
-    def open_radio(self, device):
         try:
-            self.geiger = Geiger(device)
+            self.kismet.get_loop().call_soon_threadsafe(send)
+        except RuntimeError:
+            pass
+
+    def open_radios(self, devices, peripheral_cb = None):
+        """
+        Connect to every counter; the source opens as long as one of them answers,
+        and the others keep trying in the background
+        """
+        try:
+            for device in devices:
+                self.geigers[device] = Geiger(device, self.__geiger_sample, self.__geiger_status,
+                        peripheral_cb = peripheral_cb)
         except Exception as e:
-            return [False, f"Error opening BT Geiger device: {e.args[0]}"]
+            self.geigers = {}
+            return [False, f"Error opening BT Geiger device: {e}"]
+
+        # Make sure at least one device is there before we report the source open
+        errors = {}
+        for x in range(0, self.open_tries):
+            for device, geiger in self.geigers.items():
+                if geiger.peripheral is not None:
+                    continue
+
+                try:
+                    geiger.connect()
+                    errors.pop(device, None)
+                except Exception as e:
+                    errors[device] = e
+
+            if len(errors) < len(self.geigers):
+                break
+
+            time.sleep(0.5)
 
-        self.geiger_thread = threading.Thread(target=self.__async_radio_thread)
-        self.geiger_thread.daemon = True
-        self.geiger_thread.start()
+        if len(errors) == len(self.geigers):
+            self.geigers = {}
+            err = "; ".join(f"{d}: {e}" for d, e in errors.items())
+            return [False, f"Error opening BT Geiger device, could not connect in {self.open_tries} tries: {err}"]
+
+        for device, e in errors.items():
+            self.kismet.send_message(f"btgeiger: could not connect to {device} ({e}), will keep trying")
+
+        for device, geiger in self.geigers.items():
+            self.windows[device] = GeigerWindow(device, self.opts['window'])
+            self.kismet.add_exit_callback(geiger.stop)
+            geiger.start()
 
         return [True, ""]
 
+    def next_window(self):
+        """
+        Seconds until the next report window closes, or None to wait for samples
+        """
+        deadlines = [w.deadline() for w in self.windows.values() if w.deadline() is not None]
+
+        if not len(deadlines):
+            return None
+
+        return max(0, min(deadlines) - time.monotonic())
+
+    def flush_windows(self, now):
+        for w in self.windows.values():
+            if w.deadline() is not None and now >= w.deadline():
+                if not self.handle_json(w.report(now)):
+                    return False
+
+        return True
+
     async def __btgeiger_task(self):
         print_stderr = False
 
@@ -275,15 +640,28 @@ class KismetBtGeiger(object):
 
         try:
             while not self.kismet.kill_ioloop:
-                msg = await self.message_queue.get()
+                try:
+                    msg = await asyncio.wait_for(self.message_queue.get(), self.next_window())
+                except asyncio.TimeoutError:
+                    msg = None
 
-                if not msg:
-                    break
+                now = time.monotonic()
+
+                if msg is not None:
+                    (device, sample) = msg
+
+                    if print_stderr:
+                        print(device, sample, file=sys.stderr)
+
+                    if self.opts['window'] <= 0:
+                        sample['device'] = device
 
-                if print_stderr:
-                    print(msg, file=sys.stderr)
+                        if not self.handle_json(sample):
+                            raise RuntimeError('could not send btgeiger data')
+                    else:
+                        self.windows[device].add(sample, now)
 
-                if not self.handle_json(msg):
+                if not self.flush_windows(now):
                     raise RuntimeError('could not send btgeiger data')
 
         except Exception as e:
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Test script for the BTLE geiger reader
+Runs the reader against a fake bluepy peripheral, covering notifications,
+polling fallback, and reconnecting after the counter drops the connection,
+and checks windowed aggregation of samples
+"""
+
+import time
+
+from KismetCaptureBtGeiger import (Geiger, GeigerWindow, GEIGER_SERVICE_UUID, GEIGER_CPS_UUID,
+        GEIGER_CPM_UUID, GEIGER_USVH_UUID, PROP_NOTIFY)
+
+class FakeDisconnect(Exception):
+    pass
+
+class FakeDescriptor(object):
+    def __init__(self, char):
+        self.char = char
+
+    def write(self, data, withResponse=False):
+        self.char.subscribed = data == b"\x01\x00"
+
+class FakeCharacteristic(object):
+    def __init__(self, device, handle, field, notify):
+        self.device = device
+        self.handle = handle
+        self.field = field
+        self.properties = 0x02 | (PROP_NOTIFY if notify else 0)
+        self.subscribed = False
+
+    def getHandle(self):
+        return self.handle
+
+    def getDescriptors(self, forUUID=None):
+        return [FakeDescriptor(self)]
+
+    def read(self):
+        self.device.check()
+        self.device.reads += 1
+        return self.device.encode(self.field)
+
+class FakeService(object):
+    def __init__(self, chars):
+        self.chars = chars
+
+    def getCharacteristics(self, uuid):
+        return [self.chars[uuid]]
+
+class FakeCounter(object):
+    """
+    A simulated geiger counter; each connection creates a FakePeripheral bound
+    to it, and the counter can drop connections or refuse them for a while
+    """
+    def __init__(self, notify=True, rate=0.05):
+        self.notify = notify
+        self.rate = rate
+        self.count = 0
+        self.connected = None
+        self.refuse = 0
+        self.connects = 0
+        self.reads = 0
+
+    def encode(self, field):
+        if field == 'cps':
+            v = self.count % 10
+        elif field == 'cpm':
+            v = 60 + self.count
+        else:
+            v = 150 + self.count
+        return v.to_bytes(2, "little")
+
+    def check(self):
+        if self.connected is None:
+            raise FakeDisconnect("device disconnected")
+
+    def drop(self):
+        self.connected = None
+
+    def peripheral(self, addr):
+        if self.refuse > 0:
+            self.refuse -= 1
+            raise FakeDisconnect("failed to connect")
+
+        self.connects += 1
+        self.connected = FakePeripheral(self)
+        return self.connected
+
+class FakePeripheral(object):
+    def __init__(self, counter):
+        self.counter = counter
+        self.delegate = None
+        self.chars = {
+                GEIGER_CPS_UUID: FakeCharacteristic(counter, 0x10, 'cps', counter.notify),
+                GEIGER_CPM_UUID: FakeCharacteristic(counter, 0x13, 'cpm', counter.notify),
+                GEIGER_USVH_UUID: FakeCharacteristic(counter, 0x16, 'usvh', counter.notify),
+                }
+
+    def getServiceByUUID(self, uuid):
+        assert uuid == GEIGER_SERVICE_UUID
+        return FakeService(self.chars)
+
+    def withDelegate(self, delegate):
+        self.delegate = delegate
+        return self
+
+    def waitForNotifications(self, timeout):
+        if self.counter.connected is not self:
+            raise FakeDisconnect("device disconnected")
+
+        time.sleep(min(timeout, self.counter.rate))
+
+        if not all(c.subscribed for c in self.chars.values()):
+            return False
+
+        self.counter.count += 1
+        for c in self.chars.values():
+            self.delegate.handleNotification(c.handle, self.counter.encode(c.field))
+
+        return True
+
+    def disconnect(self):
+        if self.counter.connected is self:
+            self.counter.connected = None
+
+def collect(counter, duration, action=None):
+    samples = []
+    status = []
+
+    geiger = Geiger("AA:BB:CC:DD:EE:FF", lambda g, s: samples.append(s),
+            lambda g, m: status.append(m), peripheral_cb=counter.peripheral)
+    geiger.poll_interval = 0.05
+    geiger.backoff_min = 0.05
+
+    geiger.start()
+    try:
+        if action is not None:
+            action(geiger)
+        time.sleep(duration)
+    finally:
+        geiger.stop()
+        geiger.thread.join(1)
+
+    return (geiger, samples, status)
+
+def test_notifications():
+    """Test samples assembled from notifications without reading"""
+    print("Testing notification samples...")
+
+    counter = FakeCounter(notify=True)
+    (geiger, samples, status) = collect(counter, 0.5)
+
+    assert len(samples) >= 5, f"Only {len(samples)} samples"
+    assert counter.reads == 0, f"Read {counter.reads} characteristics with notifications enabled"
+    # Every sample carries the three fields of one notification round
+    for s in samples:
+        assert abs(s['usvh'] - (150 + s['cpm'] - 60) / 1000.0) < 1e-9, s
+
+    print(f"📊 {len(samples)} samples, {geiger.stats['notifications']} notifications, {counter.reads} reads")
+    print("✅ Notifications: OK")
+
+def test_polling_fallback():
+    """Test a counter without notify support is polled"""
+    print("Testing polling fallback...")
+
+    counter = FakeCounter(notify=False)
+    (geiger, samples, status) = collect(counter, 0.5)
+
+    assert len(samples) >= 3, f"Only {len(samples)} samples"
+    assert geiger.stats['polls'] == len(samples)
+    assert counter.reads == 3 * len(samples)
+
+    print("✅ Polling fallback: OK")
+
+def test_reconnect():
+    """Test the reader reconnects with backoff after the counter drops"""
+    print("Testing reconnect...")
+
+    counter = FakeCounter(notify=True)
+
+    def outage(geiger):
+        time.sleep(0.3)
+        outage.before = geiger.stats['samples']
+        counter.refuse = 2
+        counter.drop()
+
+    (geiger, samples, status) = collect(counter, 1.0, outage)
+
+    assert counter.connects == 2, f"{counter.connects} connects"
+    assert geiger.stats['disconnects'] == 3, f"{geiger.stats['disconnects']} disconnects"
+    assert len(samples) > outage.before, "No samples after reconnecting"
+    assert any("reconnecting in 0.2" in m for m in status), status
+
+    print(f"📊 {len(status)} status messages, {len(samples)} samples")
+    print("✅ Reconnect: OK")
+
+def test_window():
+    """Test windowed min/max/mean keeps spikes"""
+    print("Testing windowed aggregation...")
+
+    w = GeigerWindow("AA:BB:CC:DD:EE:FF", 10)
+    assert w.deadline() is None
+
+    cpms = [20, 22, 19, 400, 21, 20]
+    for i, cpm in enumerate(cpms):
+        w.add({ 'cps': cpm // 60, 'cpm': cpm, 'usvh': cpm / 100.0 }, 100.0 + i)
+
+    assert w.deadline() == 110.0
+
+    r = w.report(110.0)
+
+    assert r['device'] == "AA:BB:CC:DD:EE:FF"
+    assert r['samples'] == len(cpms)
+    assert r['cpm_max'] == 400 and r['cpm_min'] == 19
+    assert abs(r['cpm'] - sum(cpms) / len(cpms)) < 1e-9
+    assert abs(r['usvh_max'] - 4.0) < 1e-9
+    assert w.deadline() is None, "Window not reset after reporting"
+
+    print("✅ Windowed aggregation: OK")
+
+def run_all_tests():
+    print("🧪 Running BT geiger reader tests\n")
+
+    tests = [
+        test_notifications,
+        test_polling_fallback,
+        test_reconnect,
+        test_window,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n📊 Results: {passed}/{len(tests)} tests passed")
+
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if run_all_tests() else 1)
@@ -10,6 +10,8 @@ accepts additional options:
 device=/path/to/serial
 baud=baudrate
 band=800|900|2400
+channel_weights="11:4,15:2,..."  relative dwell time per hop channel (default 1)
+adaptive_dwell=true|false        shift dwell time toward channels with traffic
 
 Based in part on the Sensniff code from:
 https://github.com/freaklabs/sensniff-freaklabs.git
@@ -45,6 +47,7 @@ POSSIBILITY OF SUCH DAMAGE.
 """
 
 import argparse
+import asyncio
 from datetime import datetime
 import json
 import os
@@ -54,10 +57,10 @@ try:
 except ImportError:
     raise ImportError("KismetCaptureFreaklabsZigbee requires python-serial, please install it!")
 
+import select
 import struct
 import subprocess
 import sys
-import threading
 import time
 import uuid
 
@@ -76,12 +79,240 @@ SNIFFER_PROTO_VERSION = 1
 class FreaklabException(Exception):
     pass
 
+class SensniffParser(object):
+    """
+    Incremental parser for the sensniff serial protocol.
+
+    Everything read from the port is appended to one buffer and every complete
+    frame in it is returned.  Frames are found by searching for either sensniff
+    magic, so peripheral UART output or a corrupted frame only costs the bytes
+    up to the next magic instead of everything buffered behind it.
+    """
+    def __init__(self, magics):
+        self.magics = magics
+        self.magic_len = len(magics[0])
+
+        self.buf = bytearray()
+        self.pos = 0
+
+        self.stats = {
+                'frames': 0,
+                'commands': 0,
+                'resyncs': 0,
+                'dropped_bytes': 0,
+                }
+
+    def find_magic(self, start):
+        found = -1
+
+        for m in self.magics:
+            i = self.buf.find(m, start)
+            if i >= 0 and (found < 0 or i < found):
+                found = i
+
+        return found
+
+    def feed(self, data):
+        """
+        Add data read from the port; returns a list of (cmd, payload) for every
+        complete frame or command response now in the buffer.  Legacy frames are
+        returned as CMD_FRAME.
+        """
+        self.buf += data
+
+        buf = self.buf
+        end = len(buf)
+        pos = self.pos
+
+        frames = []
+
+        while True:
+            m = self.find_magic(pos)
+
+            if m < 0:
+                # Keep anything which could be the start of a split magic
+                keep = max(pos, end - (self.magic_len - 1))
+                self.stats['dropped_bytes'] += keep - pos
+                pos = keep
+                break
+
+            if m > pos:
+                self.stats['dropped_bytes'] += m - pos
+                self.stats['resyncs'] += 1
+                pos = m
+
+            hdr = pos + self.magic_len
+
+            if end <= hdr:
+                break
+
+            if buf[hdr] == SNIFFER_PROTO_VERSION:
+                # Proto version 1: cmd, length, payload
+                if end < hdr + 3:
+                    break
+
+                cmd = buf[hdr + 1]
+                length = buf[hdr + 2]
+                start = hdr + 3
+            else:
+                # Legacy contiki sniffer; the byte after the magic is the frame
+                # length, which can't exceed an 802.15.4 frame
+                cmd = CMD_FRAME
+                length = buf[hdr]
+                start = hdr + 1
+
+                if length > 127:
+                    cmd = None
+
+            if cmd not in (CMD_FRAME, CMD_CHANNEL):
+                # Magic bytes in the middle of something else; skip past them
+                # and look for the next one
+                self.stats['dropped_bytes'] += 1
+                self.stats['resyncs'] += 1
+                pos += 1
+                continue
+
+            if end < start + length:
+                break
+
+            frames.append((cmd, bytes(buf[start:start + length])))
+            pos = start + length
+
+            if cmd == CMD_FRAME:
+                self.stats['frames'] += 1
+            else:
+                self.stats['commands'] += 1
+
+        # Consumed data is dropped from the front of the buffer only once there's
+        # enough of it to be worth moving the remainder
+        if pos == end or pos > 4096:
+            del buf[:pos]
+            pos = 0
+
+        self.pos = pos
+
+        return frames
+
+class HopScheduler(object):
+    """
+    Dwell-timed channel hopping.
+
+    Each channel is held for its share of the hop period; weights scale the
+    dwell of individual channels while a full pass over the hop list still takes
+    len(channels) / hop_rate seconds.  Deadlines are computed from the previous
+    deadline on the monotonic clock, so retune time doesn't accumulate as
+    drift.  With adaptive dwell the weights are recomputed after every pass,
+    moving dwell toward channels which have recently seen frames.
+    """
+
+    # How much of the dwell follows the observed traffic, and the smallest
+    # share of its normal dwell any channel keeps
+    adapt_share = 0.5
+    min_weight = 0.25
+
+    def __init__(self, channels, hop_rate, weights=None, adaptive=False):
+        self.channels = list(channels)
+        self.hop_rate = hop_rate
+        self.adaptive = adaptive
+
+        if weights is None:
+            weights = {}
+
+        self.weights = { c: float(weights.get(c, 1.0)) for c in self.channels }
+
+        # Frames seen per channel since we started, and decayed recent counts
+        # driving adaptive dwell
+        self.frames = { c: 0 for c in self.channels }
+        self.recent = { c: 0.0 for c in self.channels }
+
+        self.pos = -1
+        self.current = None
+        self.deadline = None
+
+        self.dwell = {}
+        self.compute_dwell()
+
+    def base_dwell(self):
+        return 1.0 / self.hop_rate
+
+    def __normalize(self, w):
+        mean = sum(w.values()) / len(w)
+        return { c: max(self.min_weight, v / mean) for c, v in w.items() }
+
+    def compute_dwell(self):
+        w = dict(self.weights)
+
+        total = sum(self.recent.values())
+
+        if self.adaptive and total > 0:
+            n = len(self.channels)
+
+            for c in self.channels:
+                busy = self.recent[c] * n / total
+                w[c] = w[c] * ((1 - self.adapt_share) + self.adapt_share * busy)
+
+        # Normalize twice; once to apply the floor, and once more so the floor
+        # doesn't change the overall hop rate
+        w = self.__normalize(self.__normalize(w))
+
+        base = self.base_dwell()
+        self.dwell = { c: base * w[c] for c in self.channels }
+
+    def next_hop(self, now):
+        """
+        Advance to the next channel; returns (channel, deadline) where deadline is
+        the monotonic time to leave the channel
+        """
+        self.pos = (self.pos + 1) % len(self.channels)
+
+        if self.pos == 0 and self.adaptive:
+            self.compute_dwell()
+
+            for c in self.recent:
+                self.recent[c] = self.recent[c] / 2
+
+        c = self.channels[self.pos]
+
+        # Keep to the schedule, but don't try to catch up in a burst of short
+        # dwells if we fell well behind
+        if self.deadline is None or now - self.deadline > self.base_dwell():
+            start = now
+        else:
+            start = self.deadline
+
+        self.current = c
+        self.deadline = start + self.dwell[c]
+
+        return (c, self.deadline)
+
+    def count_frames(self, count):
+        """
+        Record frames received on the current channel
+        """
+        if self.current is None:
+            return
+
+        self.frames[self.current] += count
+        self.recent[self.current] += count
+
+    def stats(self):
+        return { c: { 'frames': self.frames[c], 'dwell': self.dwell[c] } for c in self.channels }
+
 class SerialInputHandler(object):
     def __init__(self, port, baudrate):
         self.__sensniff_magic_legacy = struct.pack('BBBB', 0x53, 0x6E, 0x69, 0x66)
         self.__sensniff_magic = struct.pack('BBBB', 0xC1, 0x1F, 0xFE, 0x72)
         self._current_channel = -1
 
+        self.parser = SensniffParser((self.__sensniff_magic, self.__sensniff_magic_legacy))
+
+        # Frames read while waiting synchronously for a channel response, handed
+        # out by the next read
+        self.backlog = []
+
+        # Futures waiting on the next channel response
+        self.channel_waiters = []
+
         try:
             self.port = serial.Serial(port = port,
                                       baudrate = baudrate,
@@ -93,83 +324,62 @@ class SerialInputHandler(object):
                                       timeout = 0.1)
             self.port.flushInput()
             self.port.flushOutput()
+
+            # pyserial configures the tty; after that we read the fd directly,
+            # without blocking, whenever the event loop says it's readable
+            self.fd = self.port.fileno()
+            os.set_blocking(self.fd, False)
         except (serial.SerialException, ValueError, IOError, OSError) as e:
             raise FreaklabException("Could not open freaklabs device: {}".format(e))
 
-    def read_frame(self):
+    def close(self):
+        try:
+            self.port.close()
+        except (serial.SerialException, IOError, OSError):
+            pass
+
+    def __read_available(self):
         try:
-            # Read the magic + 1 more byte
-            b = self.port.read(5)
-            size = len(b)
+            b = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
         except (IOError, OSError) as e:
             raise FreaklabException("Error reading port: {}".format(e))
 
-        if size == 0:
-            return b
-        if size < 5:
-            self.port.flushInput()
-            return ''
-
-        if b[0:4] not in (self.__sensniff_magic, self.__sensniff_magic_legacy):
-            # Peripheral UART output - print it
-            per_out = self.port.readline().rstrip()
-            return ''
-
-        # If we reach here:
-        # Next byte == 1: Proto version 1, header follows
-        # Next Byte != 1 && < 128. Old proto version. Frame follows, length == the byte
-        b = bytearray(b)
-        if b[4] != SNIFFER_PROTO_VERSION:
-            # Legacy contiki sniffer support. Will slowly fade away
-            size = b[4]
-            try:
-                b = self.port.read(size)
-            except (IOError, OSError) as e:
-                raise FreaklabException("Error reading port: {}".format(e))
-                return
-
-            if len(b) != size:
-                # We got the magic right but subsequent bytes did not match
-                # what we expected to receive
-                self.port.flushInput()
-                return ''
+        # The fd is non-blocking, so no data is EAGAIN; an empty read is a
+        # hangup, such as a USB serial device being unplugged, and the fd stays
+        # readable forever after
+        if len(b) == 0:
+            raise FreaklabException("Device disconnected")
 
-            return b
+        return self.handle_frames(self.parser.feed(b))
 
-        # If we reach here, we have a packet of proto ver SNIFFER_PROTO_VERSION
-        # Read CMD and LEN
-        try:
-            b = self.port.read(2)
+    def read_frames(self):
+        """
+        Read everything the device has buffered without blocking and return the
+        list of complete frames.  Channel responses are consumed here.
+        """
+        frames = self.backlog + self.__read_available()
+        self.backlog = []
 
-        except (IOError, OSError) as e:
-            raise FreaklabException("Error reading port: {}".format(e))
-            return
+        return frames
 
-        if size < 2:
-            self.port.flushInput()
-            return ''
+    def handle_frames(self, frames):
+        packets = []
 
-        b = bytearray(b)
-        cmd = b[0]
-        length = b[1]
+        for (cmd, payload) in frames:
+            if cmd == CMD_FRAME:
+                packets.append(payload)
+            elif cmd == CMD_CHANNEL and len(payload):
+                self._current_channel = payload[0]
 
-        # Read the frame or command response
-        b = self.port.read(length)
-        if len(b) != length:
-            # We got the magic right but subsequent bytes did not match
-            # what we expected to receive
-            self.port.flushInput()
-            return ''
+                for w in self.channel_waiters:
+                    if not w.done():
+                        w.set_result(payload[0])
 
-        # If we reach here, b holds a frame or a command response of length len
-        if cmd == CMD_FRAME:
-            return b
+                self.channel_waiters = []
 
-        # If we reach here, we have a command response
-        b = bytearray(b)
-        if cmd == CMD_CHANNEL:
-             self._current_channel = b[0]
-        return ''
+        return packets
 
     def __write_command(self, cmd):
         self.port.write(self.__sensniff_magic)
@@ -177,12 +387,50 @@ class SerialInputHandler(object):
         self.port.write(cmd)
         self.port.flush()
 
-    def set_channel(self, channel):
+    def set_channel(self, channel, timeout = 0.1):
+        """
+        Tune and wait for the device to confirm, reading the port directly; only
+        for use before the port is being driven by the event loop
+        """
+        self._current_channel = -1
         self.__write_command(bytearray([CMD_SET_CHANNEL, 1, channel]))
-        # this hardware takes 150us for PLL lock and we need enough time to read the success message
-        time.sleep (0.003)
+
+        # this hardware takes 150us for PLL lock; wait for the success message
+        deadline = time.monotonic() + timeout
+
+        while self._current_channel == -1:
+            wait = deadline - time.monotonic()
+
+            if wait <= 0:
+                break
+
+            select.select([self.fd], [], [], wait)
+            self.backlog += self.__read_available()
+
         if (channel != self._current_channel):
-            raise FreaklabException
+            raise FreaklabException("Device did not confirm channel {}".format(channel))
+
+    async def async_set_channel(self, channel, timeout = 0.1):
+        """
+        Tune and wait for the device to confirm; the response is picked up by the
+        event loop reader
+        """
+        waiter = asyncio.get_event_loop().create_future()
+        self.channel_waiters.append(waiter)
+
+        self._current_channel = -1
+        self.__write_command(bytearray([CMD_SET_CHANNEL, 1, channel]))
+
+        try:
+            confirmed = await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise FreaklabException("Device did not confirm channel {}".format(channel))
+        finally:
+            if waiter in self.channel_waiters:
+                self.channel_waiters.remove(waiter)
+
+        if (channel != confirmed):
+            raise FreaklabException("Device tuned to {} instead of {}".format(confirmed, channel))
 
     def get_channel(self):
         self.__write_command(bytearray([CMD_GET_CHANNEL]))
@@ -237,18 +485,22 @@ class KismetFreaklabsZigbee(object):
         self.defaults['band'] = "auto"
         self.defaults['name'] = None
 
-        self.hop_thread = None
-        self.monitor_thread = None
+        # Channel control runs as a task on the kismetexternal loop, and the
+        # serial fd is read by a loop reader; there are no helper threads
+        self.hop_task = None
+        self.monitoring = False
 
-        self.chan_config_lock = threading.RLock()
         self.chan_config = {}
-        self.chan_config['chan_pos'] = 0
         self.chan_config['hopping'] = True
         self.chan_config['channel'] = "0"
         self.chan_config['hop_channels'] = []
         self.chan_config['hop_rate'] = 1
         self.chan_config['chan_skip'] = 0
         self.chan_config['chan_offset'] = 0
+        self.chan_config['channel_weights'] = {}
+        self.chan_config['adaptive_dwell'] = False
+
+        self.hopper = None
 
         self.serialhandler = None
 
@@ -315,30 +567,54 @@ class KismetFreaklabsZigbee(object):
     def is_running(self):
         return self.kismet.is_running()
 
-    def __start_hopping(self):
-        def hop_func():
-            while self.chan_config['hopping']:
-                wait_usec = 1.0 / self.chan_config['hop_rate']
+    def __make_hopper(self):
+        if not len(self.chan_config['hop_channels']) or self.chan_config['hop_rate'] <= 0:
+            self.hopper = None
+            return
 
-                try:
-                    self.chan_config_lock.acquire()
-                    c = int(self.chan_config['hop_channels'][self.chan_config['chan_pos'] % len(self.chan_config['hop_channels'])])
-                    self.serialhandler.set_channel(c)
-                except FreaklabException as e:
-                    self.kismet.send_datasource_error_report(message = "Could not tune to {}: {}".format(self.chan_config['chan_pos'], e))
-                finally:
-                    self.chan_config_lock.release()
+        self.hopper = HopScheduler(self.chan_config['hop_channels'],
+                self.chan_config['hop_rate'],
+                weights = self.chan_config['channel_weights'],
+                adaptive = self.chan_config['adaptive_dwell'])
 
-                self.chan_config['chan_pos'] = self.chan_config['chan_pos'] + 1
+    def __stop_hopping(self):
+        if self.hop_task is not None:
+            self.hop_task.cancel()
+            self.hop_task = None
 
-            self.hop_thread = None
+    def __start_hopping(self):
+        async def hop_task(hopper):
+            while self.chan_config['hopping']:
+                (c, deadline) = hopper.next_hop(time.monotonic())
 
-        if self.hop_thread:
+                try:
+                    await self.serialhandler.async_set_channel(int(c))
+                    self.chan_config['channel'] = c
+                except (FreaklabException, ValueError) as e:
+                    self.kismet.send_datasource_error_report(message = "Could not tune to {}: {}".format(c, e))
+                except Exception as e:
+                    # The serial device is gone; report it rather than
+                    # silently ending the task and stopping hopping
+                    self.kismet.send_datasource_error_report(message = "Channel hopping failed tuning to {}: {}".format(c, e))
+                    return
+
+                # Dwell until the deadline; reconfiguring cancels us
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+        self.__stop_hopping()
+
+        if self.hopper is None:
             return
 
-        self.hop_thread = threading.Thread(target = hop_func)
-        self.hop_thread.daemon = True
-        self.hop_thread.start()
+        self.hop_task = self.kismet.add_task(hop_task, [self.hopper])
+
+    async def __tune(self, channel):
+        try:
+            await self.serialhandler.async_set_channel(int(channel))
+        except Exception as e:
+            self.kismet.send_datasource_error_report(message = "Could not tune to {}: {}".format(channel, e))
 
     def __detect_band(self, device):
         try:
@@ -355,38 +631,65 @@ class KismetFreaklabsZigbee(object):
         except FreaklabException as e:
             return "unknown"
 
-    def __start_monitor(self):
-        def mon_func():
-            while self.kismet.is_running():
-                try:
-                    raw = self.serialhandler.read_frame()
-                except FreaklabException as e:
-                    self.kismet.send_datasource_error_report(message = "Error reading from zigbee device: {}".format(e))
-                    break
+    def __read_ready(self):
+        """
+        Event loop reader; parse everything the device has sent and report the
+        frames as one batch
+        """
+        try:
+            frames = self.serialhandler.read_frames()
+        except FreaklabException as e:
+            self.__stop_monitor()
+            self.kismet.send_datasource_error_report(message = "Error reading from zigbee device: {}".format(e))
+            return
 
-                if len(raw) == 0:
-                    continue
+        if len(frames) == 0:
+            return
+
+        hopper = self.hopper
+        if hopper is not None:
+            hopper.count_frames(len(frames))
+
+        dt = datetime.now()
+        time_sec = int(time.mktime(dt.timetuple()))
+        time_usec = int(dt.microsecond)
+
+        for raw in frames:
+            packet = kismetexternal.datasource_pb2.SubPacket()
+            packet.time_sec = time_sec
+            packet.time_usec = time_usec
 
-                packet = kismetexternal.datasource_pb2.SubPacket()
-                dt = datetime.now()
-                packet.time_sec = int(time.mktime(dt.timetuple()))
-                packet.time_usec = int(dt.microsecond)
+            packet.dlt = LINKTYPE_IEEE802_15_4_NOFCS
 
-                packet.dlt = LINKTYPE_IEEE802_15_4_NOFCS
+            packet.size = len(raw)
+            packet.data = raw
+
+            self.kismet.send_datasource_data_report(full_packet = packet)
+
+    def __start_monitor(self):
+        if self.monitoring:
+            return
 
-                packet.size = len(raw)
-                packet.data = raw
+        self.kismet.get_loop().add_reader(self.serialhandler.fd, self.__read_ready)
+        self.kismet.add_exit_callback(self.__stop_monitor)
+        self.monitoring = True
 
-                self.kismet.send_datasource_data_report(full_packet = packet)
+        # Anything which arrived while we were detecting the band
+        if len(self.serialhandler.backlog):
+            self.__read_ready()
 
-            self.monitor_thread = None
+    def __stop_monitor(self):
+        self.__stop_hopping()
 
-        if self.monitor_thread:
+        if not self.monitoring:
             return
 
-        self.monitor_thread = threading.Thread(target = mon_func)
-        self.monitor_thread.daemon = True
-        self.monitor_thread.start()
+        self.monitoring = False
+
+        try:
+            self.kismet.get_loop().remove_reader(self.serialhandler.fd)
+        except Exception:
+            pass
 
     # We can't really list interfaces other than to guess about serial ports which
     # seems like a bad idea; maybe we do that, eventually
@@ -417,7 +720,7 @@ class KismetFreaklabsZigbee(object):
         ret['uuid'] = self.__get_uuid(opts)
 
         try:
-            SerialInputHandler(opts['device'], int(opts['baudrate']))
+            SerialInputHandler(opts['device'], int(opts['baudrate'])).close()
         except FreaklabException as e:
             ret['success'] = False
             ret['message'] = "{}".format(e)
@@ -442,6 +745,28 @@ class KismetFreaklabsZigbee(object):
 
         ret['uuid'] = self.__get_uuid(opts)
 
+        # Options are checked before the device is touched, so a bad option
+        # never leaves the serial monitor running
+        if 'channel_weights' in opts:
+            weights = {}
+
+            try:
+                for w in opts['channel_weights'].split(','):
+                    (c, weight) = w.split(':')
+                    weights[c.strip()] = float(weight)
+
+                    if weights[c.strip()] <= 0:
+                        raise ValueError("weights must be positive")
+            except ValueError:
+                ret['success'] = False
+                ret['message'] = "Could not parse channel_weights, expected \"channel:weight,...\""
+                return ret
+
+            self.chan_config['channel_weights'] = weights
+
+        if 'adaptive_dwell' in opts:
+            self.chan_config['adaptive_dwell'] = opts['adaptive_dwell'].lower() == 'true'
+
         try:
             self.serialhandler = SerialInputHandler(opts['device'], int(opts['baudrate']))
             self.serialhandler.get_channel()
@@ -450,9 +775,8 @@ class KismetFreaklabsZigbee(object):
             ret['message'] = "{}".format(e)
             return ret
 
-        # Launch the monitor thread
-        self.__start_monitor()
-
+        # Tuning reads the device directly until the band is known and the
+        # event loop takes over
         while True:
             try:
                 self.serialhandler.set_channel(2)
@@ -482,6 +806,8 @@ class KismetFreaklabsZigbee(object):
 
         band = self.band_map[opts['band']]
 
+        self.__start_monitor()
+
         ret['phy'] = LINKTYPE_IEEE802_15_4_NOFCS
 
         ret['channel'] = band[0]
@@ -498,13 +824,14 @@ class KismetFreaklabsZigbee(object):
         ret = {}
 
         if config.HasField('channel'):
-            self.chan_config_lock.acquire()
             self.chan_config['hopping'] = False
             self.chan_config['channel'] = config.channel.channel
+            self.hopper = None
             ret['channel'] = config.channel.channel
-            self.chan_config_lock.release()
+
+            self.__stop_hopping()
+            self.kismet.add_task(self.__tune, [config.channel.channel])
         elif config.HasField('hopping'):
-            self.chan_config_lock.acquire()
             if config.hopping.HasField('rate'):
                 self.chan_config['hop_rate'] = config.hopping.rate
 
@@ -515,14 +842,14 @@ class KismetFreaklabsZigbee(object):
 
                 self.chan_config['hopping'] = True
 
-            self.chan_config_lock.release()
+            self.__make_hopper()
 
             # Echo its config back at it
             ret['full_hopping'] = config.hopping
 
         ret['success'] = True
 
-        if self.chan_config['hopping'] and not self.hop_thread:
+        if self.chan_config['hopping'] and config.HasField('hopping'):
             self.__start_hopping()
 
         return ret
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Test script for the Freaklabs sensniff serial parser and hop scheduler
+Feeds sensniff frames through the parser split at arbitrary points and mixed
+with peripheral output, benchmarks the serial handler against a fake device
+on a pty, checks the source closes when the device goes away, and checks hop
+dwell timing
+"""
+
+import asyncio
+import os
+import random
+import struct
+import sys
+import termios
+import threading
+import time
+
+from KismetCaptureFreaklabsZigbee import (KismetFreaklabsZigbee, SensniffParser,
+        SerialInputHandler, HopScheduler, CMD_FRAME, CMD_CHANNEL, SNIFFER_PROTO_VERSION)
+
+MAGIC = struct.pack('BBBB', 0xC1, 0x1F, 0xFE, 0x72)
+MAGIC_LEGACY = struct.pack('BBBB', 0x53, 0x6E, 0x69, 0x66)
+
+def frame(payload, cmd=CMD_FRAME):
+    """Encode a proto version 1 sensniff frame"""
+    return MAGIC + bytes([SNIFFER_PROTO_VERSION, cmd, len(payload)]) + payload
+
+def legacy_frame(payload):
+    """Encode a legacy contiki sniffer frame"""
+    return MAGIC_LEGACY + bytes([len(payload)]) + payload
+
+def make_payloads(rng, count):
+    return [bytes(rng.randrange(256) for _ in range(rng.randrange(5, 128))) for _ in range(count)]
+
+def test_split_reads():
+    """Test frames split across reads at every possible point"""
+    print("Testing frames split across reads...")
+
+    rng = random.Random(1)
+    payloads = make_payloads(rng, 20)
+    stream = b''.join(frame(p) for p in payloads)
+
+    for chunk in (1, 2, 3, 5, 7, 64, len(stream)):
+        parser = SensniffParser((MAGIC, MAGIC_LEGACY))
+        frames = []
+
+        for i in range(0, len(stream), chunk):
+            frames += parser.feed(stream[i:i + chunk])
+
+        assert [f[1] for f in frames] == payloads, f"Frames lost with {chunk} byte reads"
+        assert parser.stats['dropped_bytes'] == 0
+
+    print("✅ Split reads: OK")
+
+def test_resync():
+    """Test peripheral output and garbage between frames doesn't cost good frames"""
+    print("Testing resync without flushing...")
+
+    rng = random.Random(2)
+    payloads = make_payloads(rng, 50)
+
+    stream = b''
+    for i, p in enumerate(payloads):
+        if i % 5 == 0:
+            stream += b"chibi: debug output\r\n"
+        if i % 7 == 0:
+            # Partial magic, and a magic followed by a nonsense header
+            stream += MAGIC[:3] + b"xx" + MAGIC + bytes([SNIFFER_PROTO_VERSION, 0x55, 3])
+        if i % 3 == 0:
+            stream += legacy_frame(p)
+        else:
+            stream += frame(p)
+
+    # A channel response mid-stream
+    stream += frame(bytes([15]), CMD_CHANNEL)
+
+    parser = SensniffParser((MAGIC, MAGIC_LEGACY))
+    frames = []
+    for i in range(0, len(stream), 17):
+        frames += parser.feed(stream[i:i + 17])
+
+    packets = [f[1] for f in frames if f[0] == CMD_FRAME]
+    commands = [f for f in frames if f[0] == CMD_CHANNEL]
+
+    assert packets == payloads, f"Got {len(packets)} of {len(payloads)} frames"
+    assert commands == [(CMD_CHANNEL, bytes([15]))]
+    assert parser.stats['resyncs'] > 0
+
+    print(f"📊 {parser.stats['resyncs']} resyncs, {parser.stats['dropped_bytes']} bytes skipped")
+    print("✅ Resync: OK")
+
+def test_pty_benchmark():
+    """Benchmark the serial handler driven by an event loop reader from a fake device on a pty"""
+    print("Benchmarking serial handler on a pty...")
+
+    master, slave = os.openpty()
+    handler = SerialInputHandler(os.ttyname(slave), 115200)
+
+    rng = random.Random(3)
+    payloads = make_payloads(rng, 200)
+    count = 5000
+
+    def device():
+        noise = b"chibi: debug output\r\n"
+        for i in range(count):
+            data = frame(payloads[i % len(payloads)])
+            if i % 50 == 0:
+                data = noise + data
+            os.write(master, data)
+
+    async def capture():
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        received = 0
+
+        def read_ready():
+            nonlocal received
+            received += len(handler.read_frames())
+            if received >= count and not done.done():
+                done.set_result(True)
+
+        loop.add_reader(handler.fd, read_ready)
+
+        writer = threading.Thread(target=device, daemon=True)
+        writer.start()
+
+        try:
+            await asyncio.wait_for(done, 30)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(handler.fd)
+
+        # Tune while frames are flowing; the response comes back through the reader
+        os.write(master, frame(payloads[0]) + frame(bytes([15]), CMD_CHANNEL))
+        loop.add_reader(handler.fd, read_ready)
+        try:
+            await handler.async_set_channel(15)
+        finally:
+            loop.remove_reader(handler.fd)
+
+        return received
+
+    start = time.perf_counter()
+
+    try:
+        received = asyncio.run(capture())
+    finally:
+        elapsed = time.perf_counter() - start
+        handler.close()
+        os.close(master)
+        os.close(slave)
+
+    received = min(received, count)
+    drop = 1.0 - received / count
+
+    print(f"📊 {received}/{count} frames, {received / elapsed:.0f} frames/s, {drop * 100:.2f}% dropped")
+    print(f"📊 Parser: {handler.parser.stats}")
+
+    assert drop == 0, f"Dropped {count - received} frames"
+    print("✅ Pty benchmark: OK")
+
+class FakeKismet(object):
+    """Just enough of the external helper to run the source's reader"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.packets = []
+        self.errors = []
+
+    def get_loop(self):
+        return self.loop
+
+    def add_exit_callback(self, cb):
+        pass
+
+    def send_datasource_data_report(self, full_packet=None):
+        self.packets.append(full_packet.data)
+
+    def send_datasource_error_report(self, message=None):
+        self.errors.append(message)
+
+def test_disconnect():
+    """Test an empty read, as from an unplugged USB serial device, closes the source"""
+    print("Testing device disconnect...")
+
+    master, slave = os.openpty()
+    handler = SerialInputHandler(os.ttyname(slave), 115200)
+
+    # A canonical tty turns the EOF character into a zero byte read while the
+    # fd stays readable, which is how a hung up USB serial device looks
+    attrs = termios.tcgetattr(handler.fd)
+    attrs[3] |= termios.ICANON
+    termios.tcsetattr(handler.fd, termios.TCSANOW, attrs)
+
+    argv = sys.argv
+    sys.argv = [argv[0]]
+    try:
+        source = KismetFreaklabsZigbee()
+    finally:
+        sys.argv = argv
+
+    source.serialhandler = handler
+
+    async def capture():
+        loop = asyncio.get_running_loop()
+        source.kismet = kismet = FakeKismet(loop)
+
+        source._KismetFreaklabsZigbee__start_monitor()
+
+        # A frame, then the hangup
+        os.write(master, frame(b"\x41\x88\x01") + b"\n")
+        os.write(master, bytes([attrs[6][termios.VEOF][0]]))
+
+        for _ in range(100):
+            if kismet.errors:
+                break
+            await asyncio.sleep(0.01)
+
+        return kismet
+
+    try:
+        kismet = asyncio.run(capture())
+    finally:
+        handler.close()
+        os.close(master)
+        os.close(slave)
+
+    assert kismet.packets == [b"\x41\x88\x01"], kismet.packets
+    assert len(kismet.errors) == 1 and "disconnected" in kismet.errors[0], kismet.errors
+    assert not source.monitoring, "Reader still registered"
+
+    print("✅ Device disconnect: OK")
+
+def test_hop_dwell():
+    """Test dwell weights keep the overall hop rate, and deadlines don't drift"""
+    print("Testing hop dwell scheduling...")
+
+    channels = [str(c) for c in range(11, 27)]
+    hopper = HopScheduler(channels, 8, weights={'15': 4, '20': 2})
+
+    # A full pass over the channels still takes len(channels) / hop_rate
+    cycle = sum(hopper.dwell.values())
+    assert abs(cycle - len(channels) / 8) < 1e-9, f"Hop pass takes {cycle}s"
+    assert abs(hopper.dwell['15'] / hopper.dwell['11'] - 4) < 1e-9
+
+    # Deadlines follow the schedule even when each hop starts a little late
+    now = 100.0
+    for _ in range(len(channels) * 10):
+        (c, deadline) = hopper.next_hop(now)
+        now = deadline + 0.002
+
+    assert abs(deadline - (100.0 + 10 * cycle)) < 1e-6, "Hop schedule drifted"
+
+    print("✅ Hop dwell: OK")
+
+def test_adaptive_dwell():
+    """Test adaptive dwell moves time toward busy channels"""
+    print("Testing adaptive dwell...")
+
+    channels = [str(c) for c in range(11, 27)]
+    hopper = HopScheduler(channels, 8, adaptive=True)
+    base = hopper.dwell['11']
+
+    now = 0.0
+    for _ in range(len(channels) * 4):
+        (c, deadline) = hopper.next_hop(now)
+        if c == '25':
+            hopper.count_frames(50)
+        elif c == '11':
+            hopper.count_frames(5)
+        now = deadline
+
+    cycle = sum(hopper.dwell.values())
+
+    print(f"📊 Dwell: busy {hopper.dwell['25'] * 1000:.0f}ms, quiet {hopper.dwell['12'] * 1000:.0f}ms, "
+            f"default {base * 1000:.0f}ms")
+
+    assert hopper.dwell['25'] > hopper.dwell['11'] > hopper.dwell['12']
+    assert hopper.dwell['12'] >= base * HopScheduler.min_weight * 0.99
+    assert abs(cycle - len(channels) / 8) < 0.01 * cycle
+    assert hopper.stats()['25']['frames'] == 200
+
+    print("✅ Adaptive dwell: OK")
+
+def run_all_tests():
+    print("🧪 Running sensniff parser tests\n")
+
+    tests = [
+        test_split_reads,
+        test_resync,
+        test_pty_benchmark,
+        test_disconnect,
+        test_hop_dwell,
+        test_adaptive_dwell,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n📊 Results: {passed}/{len(tests)} tests passed")
+
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if run_all_tests() else 1)
@@ -1,39 +1,261 @@
 """
 ADSB proxy from one kismet server or ADSB hex websocket to another
+
+Requires options:
+    host        upstream Kismet server
+    port        upstream Kismet port
+    apikey      API key for the upstream Kismet server
+
+Additionally accepts:
+    uri_prefix  path prefix of the upstream Kismet server
+    adsb_uuid   proxy a single upstream ADSB datasource instead of the
+                entire RTLADSB phy
+    ssl=true    connect to the upstream server over TLS
+    batch       maximum number of upstream messages decoded per batch
+    queue       maximum number of upstream messages held waiting for decode
+    upstreams   additional upstream Kismet servers to aggregate, as a comma
+                separated list of host:port or host:port:apikey, with IPv6
+                addresses in brackets; for example
+                upstreams="site2:2501,site3:2501:abcdef,[fd00::3]:2501"
+    dedup_window    seconds during which copies of a frame heard by another
+                upstream are dropped (default 0.5 with multiple upstreams)
 """
 
 from __future__ import print_function
 
 import asyncio
 import argparse
+import collections
 import ctypes
 from datetime import datetime
 import json
 import math
 
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("KismetProxyAdsb requires numpy!")
+
 import os
 import pkgutil
 import subprocess
 import sys
 import threading
 import time
+import traceback
 import uuid
 
+import websockets
+
 from . import kismetexternal
 
+# Mode S parity table, ported from the dump1090 C implementation
+MODES_CHECKSUM_TABLE = [
+        0x3935ea, 0x1c9af5, 0xf1b77e, 0x78dbbf, 0xc397db, 0x9e31e9,
+        0xb0e2f0, 0x587178, 0x2c38bc, 0x161c5e, 0x0b0e2f, 0xfa7d13,
+        0x82c48d, 0xbe9842, 0x5f4c21, 0xd05c14, 0x682e0a, 0x341705,
+        0xe5f186, 0x72f8c3, 0xc68665, 0x9cb936, 0x4e5c9b, 0xd8d449,
+        0x939020, 0x49c810, 0x24e408, 0x127204, 0x093902, 0x049c81,
+        0xfdb444, 0x7eda22, 0x3f6d11, 0xe04c8c, 0x702646, 0x381323,
+        0xe3f395, 0x8e03ce, 0x4701e7, 0xdc7af7, 0x91c77f, 0xb719bb,
+        0xa476d9, 0xadc168, 0x56e0b4, 0x2b705a, 0x15b82d, 0xf52612,
+        0x7a9309, 0xc2b380, 0x6159c0, 0x30ace0, 0x185670, 0x0c2b38,
+        0x06159c, 0x030ace, 0x018567, 0xff38b7, 0x80665f, 0xbfc92b,
+        0xa01e91, 0xaff54c, 0x57faa6, 0x2bfd53, 0xea04ad, 0x8af852,
+        0x457c29, 0xdd4410, 0x6ea208, 0x375104, 0x1ba882, 0x0dd441,
+        0xf91024, 0x7c8812, 0x3e4409, 0xe0d800, 0x706c00, 0x383600,
+        0x1c1b00, 0x0e0d80, 0x0706c0, 0x038360, 0x01c1b0, 0x00e0d8,
+        0x00706c, 0x003836, 0x001c1b, 0xfff409, 0x000000, 0x000000,
+        0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 0x000000,
+        0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 0x000000,
+        0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 0x000000,
+        0x000000, 0x000000, 0x000000, 0x000000 ]
+
+class ModesBatchCrc(object):
+    """
+    Vectorized Mode S parity check over a batch of frames of the same length.
+
+    Frames are stacked into a 2D byte matrix and expanded to bits, so the CRC
+    of every frame is a single XOR reduction across the parity table.  Single
+    bit errors are repaired by syndrome lookup instead of re-checking every
+    possible bit flip.
+    """
+    def __init__(self):
+        self.table = np.array(MODES_CHECKSUM_TABLE, dtype=np.uint32)
+
+        # Syndrome to bit position for each frame length; flipping a data bit
+        # changes the computed crc by its table entry, flipping a parity bit
+        # changes the transmitted crc by that single bit
+        self.syndromes = {}
+
+        for bits in (56, 112):
+            offset = 112 - bits
+            syndromes = {}
+
+            for j in range(0, bits - 24):
+                syndromes.setdefault(MODES_CHECKSUM_TABLE[j + offset], j)
+
+            for j in range(bits - 24, bits):
+                syndromes.setdefault(1 << (bits - 1 - j), j)
+
+            self.syndromes[bits] = syndromes
+
+    def syndrome(self, frames, bits):
+        """
+        Compute the parity syndrome of every frame
+
+        frames - N x (bits / 8) uint8 matrix
+        bits - number of bits in each frame
+
+        return - uint32 array of syndromes; 0 means the parity matches
+        """
+        offset = 112 - bits
+        nbytes = int(bits / 8)
+
+        msgbits = np.unpackbits(frames, axis=1)
+        crc = np.bitwise_xor.reduce(msgbits * self.table[offset:offset + bits], axis=1)
+
+        stored = frames[:, nbytes - 3].astype(np.uint32) << 16
+        stored |= frames[:, nbytes - 2].astype(np.uint32) << 8
+        stored |= frames[:, nbytes - 1].astype(np.uint32)
+
+        return crc ^ stored
+
+    def fix_single_bit(self, data, bits, syndrome):
+        """
+        Repair a single bit error identified by its syndrome; returns the
+        repaired bytearray or None
+        """
+        j = self.syndromes[bits].get(int(syndrome), None)
+
+        if j is None:
+            return None
+
+        aux = data[:]
+        aux[int(j / 8)] ^= 1 << (7 - (j % 8))
+
+        return aux
+
+class ExpiringFrameSet(object):
+    """
+    Hash-keyed set of recently forwarded frames and the upstream which sent
+    them.  Each frame is remembered for a fixed window from the first time it
+    was seen, so copies of the same transmission relayed by other receivers
+    inside the window can be dropped.  An upstream repeating a frame itself is
+    a new transmission, such as a squitter, and is never dropped.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.seen = {}
+        self.expiry = collections.deque()
+
+    def __len__(self):
+        return len(self.seen)
+
+    def expire(self, now):
+        while len(self.expiry) and self.expiry[0][0] <= now:
+            (_, key) = self.expiry.popleft()
+            del self.seen[key]
+
+    def add(self, frame, source, now):
+        """
+        Remember a frame from a source; returns False if another source
+        already sent it in the window
+        """
+        key = bytes(frame)
+
+        if key in self.seen:
+            return self.seen[key] == source
+
+        self.seen[key] = source
+        self.expiry.append((now + self.window, key))
+
+        return True
+
+def parse_upstream(spec, apikey):
+    """
+    Split an upstream of host:port or host:port:apikey, where an IPv6 host is
+    written [addr]; returns (host, port, apikey) or None
+    """
+    if spec.startswith('['):
+        (host, sep, rest) = spec[1:].partition(']')
+
+        if not sep or not rest.startswith(':'):
+            return None
+
+        fields = [host] + rest[1:].split(':')
+    else:
+        fields = spec.split(':')
+
+    if len(fields) == 2:
+        fields.append(apikey)
+
+    if len(fields) != 3 or not len(fields[0]) or not fields[1].isdigit():
+        return None
+
+    return tuple(fields)
+
+def format_host(host, port):
+    """
+    host:port, bracketing IPv6 addresses
+    """
+    if ':' in host and not host.startswith('['):
+        return f"[{host}]:{port}"
+
+    return f"{host}:{port}"
+
 class KismetProxyAdsb(object):
     def __init__(self):
         self.opts = {}
 
+        self.opts['debug'] = None
+        self.opts['batch'] = 512
+        self.opts['queue'] = 16384
+        self.opts['dedup_window'] = None
+
         self.kismet = None
 
-        self.proxy_ws = None
-        self.proberet = None
+        self.long_frame = 112
+        self.short_frame = 56
+        self.long_frame_b = int(self.long_frame / 8)
+        self.short_frame_b = int(self.short_frame / 8)
 
-        self.uri = None
+        self.proberet = None
 
-        # Asyncio queue we use to post events from the websocket
-        self.message_queue = asyncio.Queue()
+        # Upstream Kismet servers we subscribe to
+        self.upstreams = []
+
+        # Cross-upstream dedup of identical frames
+        self.dedup = None
+
+        # Asyncio queue we use to post events from the websocket; it is
+        # resized when the source is opened
+        self.message_queue = None
+
+        self.crc = ModesBatchCrc()
+
+        # Reconnect backoff to the upstream Kismet server, in seconds
+        self.backoff_min = 1
+        self.backoff_max = 30
+
+        # Throughput and health counters
+        self.stats = {
+                'upstream_messages': 0,
+                'upstream_bytes': 0,
+                'frames': 0,
+                'duplicates': 0,
+                'crc_valid': 0,
+                'crc_recovered': 0,
+                'crc_invalid': 0,
+                'reports': 0,
+                'batches': 0,
+                'queue_drops': 0,
+                'queue_max': 0,
+                'connects': 0,
+                'disconnects': 0,
+                }
+
+        self.stats_interval = 60
 
         self.driverid = "proxyadsb"
 
@@ -95,15 +317,16 @@ class KismetProxyAdsb(object):
     def is_running(self):
         return self.kismet.is_running()
 
-    def __get_rtlsdr_uuid(self, intnum):
-        devicehash = kismetexternal.Datasource.adler32(self.uri)
+    def __get_proxy_uuid(self):
+        devicehash = kismetexternal.Datasource.adler32("".join([u['uri'] for u in self.upstreams]))
         devicehex = "0000{:02X}".format(devicehash)
 
         return kismetexternal.Datasource.make_uuid("kismet_cap_proxy_adsb", devicehex)
 
     async def __adsb_task(self):
         """
-        asyncio task that consumes the output from the radio
+        asyncio task that decodes upstream messages in batches and forwards
+        the reports to Kismet
         """
         print_stderr = False
 
@@ -112,80 +335,32 @@ class KismetProxyAdsb(object):
 
         try:
             while not self.kismet.kill_ioloop:
-                msg = await self.message_queue.get()
-
-                if not msg:
-                    break
-
-                output = {}
-
-                msgtype = self.adsb_msg_get_type(msg)
-                msgbits = self.adsb_len_by_type(msgtype)
-                msgcrc = self.adsb_msg_get_crc(msg, msgbits)
-                msgcrc2 = self.adsb_crc(msg, msgbits)
-
-                output['adsb_msg_type'] = msgtype
-                output['adsb_raw_msg'] = msg.hex()
-                output['crc_valid'] = False
-
-                if msgcrc != msgcrc2:
-                    if msgtype == 11 or msgtype == 17:
-                        msg2 = self.adsb_msg_fix_single_bit(msg, msgbits)
-     
-                        if msg2 != None:
-                            msg = msg2
-                            output['crc_valid'] = True
-                            output['crc_recovered'] = 1
-                else:
-                    output['crc_valid'] = True
-
-                # Process valid messages
-                if output['crc_valid']:
-                    output['adsb_msg'] = msg.hex()
-
-                    msgicao = self.adsb_msg_get_icao(msg).hex()
-
-                    output['icao'] = msgicao
+                batch = [await self.message_queue.get()]
 
-                    if msgtype == 17:
-                        msgme, msgsubme = self.adsb_msg_get_me_subme(msg)
+                # Take whatever else has already arrived, up to the batch limit
+                while len(batch) < self.opts['batch'] and not self.message_queue.empty():
+                    batch.append(self.message_queue.get_nowait())
 
-                        if msgme >= 1 and msgme <= 4:
-                            msgflight = self.adsb_msg_get_flight(msg)
-                            output['callsign'] = msgflight
+                frames = self.dedup_frames(self.parse_avr(batch))
 
-                        elif msgme >= 9 and msgme <= 18:
-                            msgalt = self.adsb_msg_get_ac12_altitude(msg)
-                            output['altitude'] = msgalt
+                if not len(frames):
+                    continue
 
-                            msgpair, msglat, msglon = self.adsb_msg_get_airborne_position(msg)
-                            output['coordpair_even'] = msgpair
-                            output['raw_lat'] = msglat
-                            output['raw_lon'] = msglon
-
-                        elif msgme == 19 and (msgsubme >= 1 and msgsubme <= 4):
-                            if msgsubme == 1 or msgsubme == 2:
-                                msgvelocity = self.adsb_msg_get_airborne_velocity(msg)
-                                msgheading = self.adsb_msg_get_airborne_heading(msg)
-
-                                output['speed'] = msgvelocity
-                                output['heading'] = msgheading
-                            elif msgsubme == 3 or msgsubme == 4:
-                                msgheadvalid, msgheading = self.adsb_msg_get_airborne_heading(msg)
-                                if msgheadvalid:
-                                    out['heading'] = heading
-            
-                    elif msgtype == 0 or msgtype == 4 or msgtype == 16 or msgtype == 20:
-                        msgalt = self.adsb_msg_get_ac13_altitude(msg)
-                        output['altitude'] = msgalt
+                outputs = self.decode_frames(frames)
 
                 if print_stderr:
-                    print(output, file=sys.stderr)
+                    for output in outputs:
+                        print(output, file=sys.stderr)
 
-                l = json.dumps(output)
-
-                if not self.handle_json(l):
+                if not self.send_reports(outputs):
                     raise RuntimeError('could not process response from rtladsb')
+
+                self.stats['batches'] += 1
+
+                # Let the websocket reader run between batches
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             traceback.print_exc(file=sys.stderr)
             print("An error occurred reading from the proxy websocket")
@@ -195,14 +370,199 @@ class KismetProxyAdsb(object):
             self.kismet.spindown()
             return
 
+    async def __stats_task(self):
+        """
+        asyncio task that reports relay throughput
+        """
+        last = dict(self.stats)
+        last_drops = 0
+
+        while not self.kismet.kill_ioloop:
+            await asyncio.sleep(self.stats_interval)
+
+            rates = {k: (self.stats[k] - last[k]) / self.stats_interval for k in ('upstream_messages', 'frames', 'reports')}
+            last = dict(self.stats)
+
+            if self.opts['debug']:
+                print("ADSB proxy {:.1f} msg/s {:.1f} frames/s {:.1f} reports/s queue {}/{} stats {}".format(
+                    rates['upstream_messages'], rates['frames'], rates['reports'],
+                    self.message_queue.qsize(), self.opts['queue'], self.stats), file=sys.stderr)
+
+                for u in self.upstreams:
+                    print("ADSB proxy upstream {} connected {} stats {}".format(
+                        u['name'], u['websocket'] is not None, u['stats']), file=sys.stderr)
+
+            # Only bother Kismet when we're falling behind the upstream feed
+            if self.stats['queue_drops'] > last_drops:
+                self.kismet.send_message("ADSB proxy is falling behind: dropped {} upstream messages in the last {} seconds ({:.1f} frames/s)".format(
+                    self.stats['queue_drops'] - last_drops, self.stats_interval, rates['frames']),
+                    self.kismet.MSG_ERROR)
+                last_drops = self.stats['queue_drops']
+
+    def parse_avr(self, batch):
+        """
+        Split upstream websocket messages into raw Mode S frames; each message
+        may hold one or more '*hex;' lines.  Returns (upstream name, frame) pairs
+        """
+        frames = []
+
+        for (upstream, data) in batch:
+            nframes = len(frames)
+
+            if isinstance(data, (bytes, bytearray)):
+                data = data.decode('utf-8', errors='ignore')
+
+            for line in data.split('\n'):
+                line = line.strip()
+
+                if len(line) < 4 or line[0] != '*' or line[-1] != ';':
+                    continue
+
+                try:
+                    frame = bytearray.fromhex(line[1:-1])
+                except ValueError:
+                    continue
+
+                if len(frame) == self.short_frame_b or len(frame) == self.long_frame_b:
+                    frames.append((upstream['name'], frame))
+
+            upstream['stats']['frames'] += len(frames) - nframes
+
+        self.stats['frames'] += len(frames)
+
+        return frames
+
+    def dedup_frames(self, frames):
+        """
+        Drop frames already forwarded from another upstream within the dedup window
+        """
+        if self.dedup is None:
+            return [f for (_, f) in frames]
+
+        now = time.monotonic()
+        self.dedup.expire(now)
+
+        unique = [f for (source, f) in frames if self.dedup.add(f, source, now)]
+
+        self.stats['duplicates'] += len(frames) - len(unique)
+
+        return unique
+
+    def decode_frames(self, frames):
+        """
+        Check a batch of frames through the vectorized parity path and decode
+        them to the JSON records Kismet expects
+        """
+        outputs = [None] * len(frames)
+
+        # Group by the length implied by the downlink format, CRC each group in one pass
+        groups = {56: [], 112: []}
+
+        for i, msg in enumerate(frames):
+            msgbits = self.adsb_len_by_type(self.adsb_msg_get_type(msg))
+
+            if len(msg) < int(msgbits / 8):
+                continue
+
+            groups[msgbits].append(i)
+
+        for msgbits, idx in groups.items():
+            if not len(idx):
+                continue
+
+            nbytes = int(msgbits / 8)
+
+            matrix = np.frombuffer(b''.join(bytes(frames[i][:nbytes]) for i in idx), dtype=np.uint8).reshape(len(idx), nbytes)
+            syndromes = self.crc.syndrome(matrix, msgbits)
+
+            for i, syndrome in zip(idx, syndromes):
+                outputs[i] = self.adsb_decode_frame(frames[i][:nbytes], msgbits, syndrome)
+
+        return [o for o in outputs if o is not None]
+
+    def adsb_decode_frame(self, msg, msgbits, syndrome):
+        output = {}
+
+        msgtype = self.adsb_msg_get_type(msg)
+
+        output['adsb_msg_type'] = msgtype
+        output['adsb_raw_msg'] = msg.hex()
+        output['crc_valid'] = False
+
+        if syndrome != 0:
+            if msgtype == 11 or msgtype == 17:
+                msg2 = self.crc.fix_single_bit(msg, msgbits, syndrome)
+
+                if msg2 != None:
+                    msg = msg2
+                    output['crc_valid'] = True
+                    output['crc_recovered'] = 1
+                    self.stats['crc_recovered'] += 1
+        else:
+            output['crc_valid'] = True
+
+        # Process valid messages
+        if output['crc_valid']:
+            self.stats['crc_valid'] += 1
+
+            output['adsb_msg'] = msg.hex()
+
+            msgicao = self.adsb_msg_get_icao(msg).hex()
+
+            output['icao'] = msgicao
+
+            if msgtype == 17:
+                msgme, msgsubme = self.adsb_msg_get_me_subme(msg)
+
+                if msgme >= 1 and msgme <= 4:
+                    msgflight = self.adsb_msg_get_flight(msg)
+                    output['callsign'] = msgflight
+
+                elif msgme >= 9 and msgme <= 18:
+                    msgalt = self.adsb_msg_get_ac12_altitude(msg)
+                    output['altitude'] = msgalt
+
+                    msgpair, msglat, msglon = self.adsb_msg_get_airborne_position(msg)
+                    output['coordpair_even'] = msgpair
+                    output['raw_lat'] = msglat
+                    output['raw_lon'] = msglon
+
+                elif msgme == 19 and (msgsubme >= 1 and msgsubme <= 4):
+                    if msgsubme == 1 or msgsubme == 2:
+                        msgvelocity = self.adsb_msg_get_airborne_velocity(msg)
+                        msgheading = self.adsb_msg_get_airborne_heading(msg)
+
+                        output['speed'] = msgvelocity
+                        output['heading'] = msgheading
+                    elif msgsubme == 3 or msgsubme == 4:
+                        msgheadvalid, msgheading = self.adsb_msg_get_sub3_heading(msg)
+                        if msgheadvalid:
+                            output['heading'] = msgheading
+
+            elif msgtype == 0 or msgtype == 4 or msgtype == 16 or msgtype == 20:
+                msgalt = self.adsb_msg_get_ac13_altitude(msg)
+                output['altitude'] = msgalt
+        else:
+            self.stats['crc_invalid'] += 1
+
+        return output
+
     def kill_proxy(self):
-        try:
-            self.websocket.close()
-        except:
-            pass
+        for u in self.upstreams:
+            try:
+                if not u['websocket'] == None:
+                    self.kismet.add_task(u['websocket'].close)
+            except:
+                pass
 
     def run_proxyadsb(self):
-        self.open_radio(self.opts['device'])
+        self.kismet.add_exit_callback(self.kill_proxy)
+
+        for u in self.upstreams:
+            self.kismet.add_task(self.__ws_io_loop, [u])
+
+        self.kismet.add_task(self.__adsb_task)
+        self.kismet.add_task(self.__stats_task)
 
     # Implement the listinterfaces callback for the datasource api;
     def datasource_listinterfaces(self, seqno):
@@ -252,10 +612,14 @@ class KismetProxyAdsb(object):
         else:
             self.opts['adsb_uuid'] = None
 
-        if ('uuid' in options):
-            ret['uuid'] = options['uuid']
-        else:
-            ret['uuid'] = self.__get_rtlsdr_uuid(intnum)
+        for o in ('batch', 'queue'):
+            if o in options:
+                try:
+                    self.opts[o] = max(1, int(options[o]))
+                except ValueError:
+                    ret['success'] = False
+                    ret['message'] = f"Could not parse '{o}' option, expected a number"
+                    return ret
 
         if 'ssl' in options:
             if options['ssl'] == 'true':
@@ -265,71 +629,164 @@ class KismetProxyAdsb(object):
         else:
             self.opts['proxy_ssl'] = False
 
-        # Build the URI with ws/wss, api keys, and uuid selectors if provided
-        if self.opts['proxy_ssl']:
-            self.uri = f"wss://{self.opts['host']}:{self.opts['port']}/{self.opts['uri_prefix']}"
-        else:
-            self.uri = f"ws://{self.opts['host']}:{self.opts['port']}/{self.opts['uri_prefix']}"
+        self.upstreams = [self.__make_upstream(self.opts['host'], self.opts['port'], self.opts['apikey'])]
 
-        if self.opts['adsb_uuid']:
-            self.uri = f"{self.uri}/datasource/by-uuid/{self.opts['adsb_uuid']}/adsb_raw.ws"
+        if 'upstreams' in options:
+            for u in options['upstreams'].split(','):
+                u = u.strip()
+
+                if not len(u):
+                    continue
+
+                fields = parse_upstream(u, self.opts['apikey'])
+
+                if fields is None:
+                    ret['success'] = False
+                    ret['message'] = f"Could not parse upstream '{u}', expected host:port or host:port:apikey, with IPv6 hosts as [addr]:port"
+                    return ret
+
+                self.upstreams.append(self.__make_upstream(*fields))
+
+        if 'dedup_window' in options:
+            try:
+                self.opts['dedup_window'] = float(options['dedup_window'])
+            except ValueError:
+                ret['success'] = False
+                ret['message'] = "Could not parse dedup_window {}, expected seconds".format(options['dedup_window'])
+                return ret
+
+        # Every upstream hears the same aircraft; by default hold on to frames long
+        # enough to absorb the difference in latency between sites
+        window = self.opts['dedup_window']
+        if window is None:
+            if len(self.upstreams) > 1:
+                window = 0.5
+            else:
+                window = 0
+
+        if window > 0:
+            self.dedup = ExpiringFrameSet(window)
         else:
-            self.uri = f"{self.uri}/phy/RTLADSB/raw.ws"
+            self.dedup = None
 
-        self.uri = f"{self.uri}?KISMET=${self.opts['apikey']}"
+        if ('uuid' in options):
+            ret['uuid'] = options['uuid']
+        else:
+            ret['uuid'] = self.__get_proxy_uuid()
 
         ret['hardware'] = 'adsbproxy'
         ret['capture_interface'] = 'adsbproxy'
 
-        ret['success'] = True
+        self.message_queue = asyncio.Queue(maxsize=self.opts['queue'])
 
-        try:
-            await self.__ws_client_connect()
-        except Exception as e:
-            ret['message'] = f"Could not connect to source websocket: {e}"
-            ret['success'] = False
-            return ret
+        # The upstream connections are made, and remade, by the websocket tasks
+        ret['success'] = True
 
-        self.kismet.add_task(self.__ws_io_loop)
+        self.run_proxyadsb()
 
         return ret
 
-    async def __ws_client_connect(self):
-        self.websocket = await websockets.connect(self.uri)
-
-    async def __ws_io_loop(self):
-        try:
-            while not self.kismet.kill_ioloop and not self.websocket == None:
-                data = self.websocket.recv()
+    def __make_upstream(self, host, port, apikey):
+        # Build the URI with ws/wss, api keys, and uuid selectors if provided
+        name = format_host(host, port)
 
-                if len(data) == 0:
-                    raise BufferError("Connection lost to source Kismet server")
+        if self.opts['proxy_ssl']:
+            uri = f"wss://{name}/{self.opts['uri_prefix']}"
+        else:
+            uri = f"ws://{name}/{self.opts['uri_prefix']}"
 
-                self.__handle_adsb(data)
-        except Exception as e:
-            print("FATAL:  Encountered an error receiving data from the source Kismet server", e, file=sys.stderr)
-            self.kismet.kill()
+        if self.opts['adsb_uuid']:
+            uri = f"{uri}/datasource/by-uuid/{self.opts['adsb_uuid']}/adsb_raw.ws"
+        else:
+            uri = f"{uri}/phy/RTLADSB/raw.ws"
+
+        uri = f"{uri}?KISMET={apikey}"
+
+        return {
+                'name': name,
+                'uri': uri,
+                'websocket': None,
+                'stats': {
+                    'messages': 0,
+                    'frames': 0,
+                    'connects': 0,
+                    'disconnects': 0,
+                    },
+                }
+
+    async def __ws_io_loop(self, upstream):
+        backoff = self.backoff_min
+
+        while not self.kismet.kill_ioloop:
+            try:
+                upstream['websocket'] = await websockets.connect(upstream['uri'])
+                upstream['stats']['connects'] += 1
+                self.stats['connects'] += 1
+
+                if upstream['stats']['connects'] > 1:
+                    self.kismet.send_message(f"ADSB proxy reconnected to {upstream['name']}")
+
+                backoff = self.backoff_min
+
+                async for data in upstream['websocket']:
+                    self.__queue_upstream(upstream, data)
+
+                raise BufferError("Connection lost to source Kismet server")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                upstream['stats']['disconnects'] += 1
+                self.stats['disconnects'] += 1
+                print(f"ADSB proxy error receiving from the source Kismet server {upstream['name']}, reconnecting in {backoff}s:", e, file=sys.stderr)
+                self.kismet.send_message(f"ADSB proxy lost connection to {upstream['name']} ({e}), reconnecting in {backoff} seconds",
+                        self.kismet.MSG_ERROR)
+            finally:
+                if not upstream['websocket'] == None:
+                    try:
+                        await upstream['websocket'].close()
+                    except Exception:
+                        pass
+                    upstream['websocket'] = None
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def __queue_upstream(self, upstream, data):
+        upstream['stats']['messages'] += 1
+
+        self.stats['upstream_messages'] += 1
+        self.stats['upstream_bytes'] += len(data)
+
+        # Never block the readers; when decode can't keep up shed the oldest data
+        if self.message_queue.full():
+            self.message_queue.get_nowait()
+            self.stats['queue_drops'] += 1
+
+        self.message_queue.put_nowait((upstream, data))
+
+        self.stats['queue_max'] = max(self.stats['queue_max'], self.message_queue.qsize())
 
     def datasource_configure(self, seqno, config):
         return {"success": True}
 
-    def handle_json(self, injson):
+    def send_reports(self, outputs):
         try:
-            j = json.loads(injson)
-            r = json.dumps(j)
+            dt = datetime.now()
+            time_sec = int(time.mktime(dt.timetuple()))
+            time_usec = int(dt.microsecond)
 
-            report = kismetexternal.datasource_pb2.SubJson()
+            for output in outputs:
+                report = kismetexternal.datasource_pb2.SubJson()
 
-            dt = datetime.now()
-            report.time_sec = int(time.mktime(dt.timetuple()))
-            report.time_usec = int(dt.microsecond)
+                report.time_sec = time_sec
+                report.time_usec = time_usec
 
-            report.type = "RTLadsb"
-            report.json = r
+                report.type = "RTLadsb"
+                report.json = json.dumps(output)
 
-            # print("python sending json report", r);
+                self.kismet.send_datasource_data_report(full_json=report)
 
-            self.kismet.send_datasource_data_report(full_json=report)
+            self.stats['reports'] += len(outputs)
         except ValueError as e:
             self.kismet.send_datasource_error_report(message = "Could not handle JSON output")
             return False
@@ -339,84 +796,7 @@ class KismetProxyAdsb(object):
 
         return True
 
-    def rtl_data_cb(self, buf, buflen, ctx):
-        self._iq_magnitude(buf, buflen)
-        self._manchester()
-        return 
-
-    def __async_radio_thread(self):
-        # This function blocks forever until cancelled
-        try:
-            self.rtlsdr.read_samples(self.rtl_data_cb, 12, self.usb_buf_sz)
-        except rtlsdr.RadioOperationalError as e:
-            if not self.kismet.inSpindown():
-                self.kismet.send_datasource_error_report(message = f"Error reading from RTLSDR: {e}")
-        except Exception as e:
-            self.kismet.send_datasource_error_report(message = f"Error reading from RTLSDR: {e}")
-
-        # Always make sure we die
-        self.kill_adsb()
-        self.kismet.spindown()
-
-    def open_radio(self, rnum):
-        try:
-            self.rtlsdr.open_radio(rnum, self.frequency, self.rate, gain=self.opts['gain'], autogain=True, ppm=self.opts['ppm'], biastee=self.opts['biastee'])
-        except Exception as e:
-            self.kismet.send_datasource_error_report(message = "Error opening RTLSDR for ADSB: {}".format(e.args[0]))
-            self.kill_adsb()
-            self.kismet.spindown()
-
-        self.rtl_thread = threading.Thread(target=self.__async_radio_thread)
-        self.rtl_thread.daemon = True
-        self.rtl_thread.start()
-
     # ADSB parsing functions ported from the dump1090 C implementation
-    def adsb_crc(self, data, bits):
-        """
-        Compute the checksum a message *should* have
-    
-        data - bytearray 
-        bits - number of bits in message
-    
-        return - 24-bit checksum
-        """
-        modes_checksum_table = [
-                0x3935ea, 0x1c9af5, 0xf1b77e, 0x78dbbf, 0xc397db, 0x9e31e9, 
-                0xb0e2f0, 0x587178, 0x2c38bc, 0x161c5e, 0x0b0e2f, 0xfa7d13, 
-                0x82c48d, 0xbe9842, 0x5f4c21, 0xd05c14, 0x682e0a, 0x341705, 
-                0xe5f186, 0x72f8c3, 0xc68665, 0x9cb936, 0x4e5c9b, 0xd8d449,
-                0x939020, 0x49c810, 0x24e408, 0x127204, 0x093902, 0x049c81, 
-                0xfdb444, 0x7eda22, 0x3f6d11, 0xe04c8c, 0x702646, 0x381323, 
-                0xe3f395, 0x8e03ce, 0x4701e7, 0xdc7af7, 0x91c77f, 0xb719bb, 
-                0xa476d9, 0xadc168, 0x56e0b4, 0x2b705a, 0x15b82d, 0xf52612,
-                0x7a9309, 0xc2b380, 0x6159c0, 0x30ace0, 0x185670, 0x0c2b38, 
-                0x06159c, 0x030ace, 0x018567, 0xff38b7, 0x80665f, 0xbfc92b, 
-                0xa01e91, 0xaff54c, 0x57faa6, 0x2bfd53, 0xea04ad, 0x8af852, 
-                0x457c29, 0xdd4410, 0x6ea208, 0x375104, 0x1ba882, 0x0dd441,
-                0xf91024, 0x7c8812, 0x3e4409, 0xe0d800, 0x706c00, 0x383600, 
-                0x1c1b00, 0x0e0d80, 0x0706c0, 0x038360, 0x01c1b0, 0x00e0d8, 
-                0x00706c, 0x003836, 0x001c1b, 0xfff409, 0x000000, 0x000000, 
-                0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 0x000000,
-                0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 
-                0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 0x000000, 
-                0x000000, 0x000000, 0x000000, 0x000000 ]
-    
-        crc = 0
-        offset = 0
-    
-        if bits != 112:
-            offset = 112 - 56
-    
-        for j in range(0, bits):
-            byte = int(j / 8)
-            bit = j % 8
-            bitmask = 1 << (7 - bit)
-    
-            if data[byte] & bitmask:
-                crc ^= modes_checksum_table[j + offset]
-    
-        return crc & 0x00FFFFFF
-    
     def adsb_len_by_type(self, type):
         """
         Get expected length of message in bits based on the type
@@ -427,93 +807,6 @@ class KismetProxyAdsb(object):
     
         return 56
     
-    def adsb_msg_get_crc(self, data, bits):
-        """
-        Extract the crc encoded in a message
-    
-        data - bytearray of message input
-        bits - number of bits in message
-    
-        return - 24bit checksum as encoded in message
-        """
-    
-        crc = (data[int(bits / 8) - 3] << 16)
-        crc |= (data[int(bits / 8) - 2] << 8) 
-        crc |= (data[int(bits / 8) - 1])
-    
-        return crc
-    
-    def adsb_msg_fix_single_bit(self, data, bits):
-        """
-        Try to fix single bit errors using the checksum.  On success
-        returns modified bytearray
-    
-        data - bytearray of message input
-        bits - length in bits
-        """
-    
-        for j in range(0, bits):
-            byte = int(j / 8)
-            bitmask = 1 << (7 - (j % 8))
-    
-            aux = data[:]
-    
-            # Flip the j-th bit
-            aux[byte] ^= bitmask
-    
-            crc1 = (aux[int(bits / 8) - 3] << 16)
-            crc1 |= (aux[int(bits / 8) - 2] << 8) 
-            crc1 |= (aux[int(bits / 8) - 1])
-    
-            crc2 = self.adsb_crc(aux, bits)
-    
-            if crc1 == crc2:
-                # The error is fixed; return the new buffer
-                return aux
-    
-        return None
-    
-    def adsb_msg_fix_double_bit(self, data, bits):
-        """
-        Try to fix double bit errors using the checksum, like fix_single_bit.
-        This is very slow and should only be tried against DF17 messages.
-        
-        If successful returns the modified bytearray.
-    
-        data - bytearray of message input
-        bits - length in bits
-        """
-    
-        for j in range(0, bits):
-            byte1 = int(j / 8)
-            bitmask1 = 1 << (7 - (j % 8))
-    
-            # Don't check the same pairs multiple times, so i starts from j+1
-            for i in range(j + 1, bits):
-                byte2 = int(i / 8)
-                bitmask2 = 1 << (7 - (i % 8))
-    
-                aux = data[:]
-    
-                # Flip the jth bit
-                aux[byte1] ^= bitmask1
-                # Flip the ith bit
-                aux[byte2] ^= bitmask2
-    
-                crc1 = (aux[int(bits / 8) - 3] << 16)
-                crc1 |= (aux[int(bits / 8) - 2] << 8) 
-                crc1 |= (aux[int(bits / 8) - 1])
-    
-                crc2 = self.adsb_crc(aux, bits)
-    
-                if crc1 == crc2:
-                    # The error is fixed; return the new buffer
-                    return aux
-    
-        return None
-    
-    
-        
     def adsb_msg_get_type(self, data):
         """
         Get message type
@@ -681,81 +974,3 @@ class KismetProxyAdsb(object):
         heading = heading * (360.0 / 128)
     
         return valid, heading
-    
-    def adsb_process_msg(self, msg):
-        output = {}
-     
-        msgtype = self.adsb_msg_get_type(msg)
-        msgbits = self.adsb_len_by_type(msgtype)
-        msgcrc = self.adsb_msg_get_crc(msg, msgbits)
-        msgcrc2 = self.adsb_crc(msg, msgbits)
-     
-        output['adsb_msg_type'] = msgtype
-        output['adsb_raw_msg'] = msg.hex()
-        output['crc_valid'] = False
-     
-        # Skip invalid CRC types; in the future, add 1bit recovery from dump1090
-        if msgcrc != msgcrc2:
-            if msgtype == 11 or msgtype == 17:
-                msg2 = self.adsb_msg_fix_single_bit(msg, msgbits)
-     
-                if msg2 != None:
-                    msg = msg2
-                    output['crc_valid'] = True
-                    output['crc_recovered'] = 1
-     
-        else:
-            output['crc_valid'] = True
-     
-        # Process valid messages
-        if output['crc_valid']:
-            output['adsb_msg'] = msg.hex()
-     
-            msgicao = self.adsb_msg_get_icao(msg).hex()
-     
-            output['icao'] = msgicao
-     
-            if msgtype == 17:
-                msgme, msgsubme = self.adsb_msg_get_me_subme(msg)
-     
-                if msgme >= 1 and msgme <= 4:
-                    msgflight = self.adsb_msg_get_flight(msg)
-                    output['callsign'] = msgflight
-     
-                elif msgme >= 9 and msgme <= 18:
-                    msgalt = self.adsb_msg_get_ac12_altitude(msg)
-                    output['altitude'] = msgalt
-     
-                    msgpair, msglat, msglon = self.adsb_msg_get_airborne_position(msg)
-                    output['coordpair_even'] = msgpair
-                    output['raw_lat'] = msglat
-                    output['raw_lon'] = msglon
-     
-                elif msgme == 19 and (msgsubme >= 1 and msgsubme <= 4):
-                    msgpair, msglat, msglon = self.adsb_msg_get_airborne_position(msg)
-                    output['coordpair_even'] = msgpair
-                    output['raw_lat'] = msglat
-                    output['raw_lon'] = msglon
-     
-                    msgalt = self.adsb_msg_get_ac12_altitude(msg)
-                    output['altitude'] = msgalt
-     
-                    if msgsubme == 1 or msgsubme == 2:
-                        msgvelocity = self.adsb_msg_get_airborne_velocity(msg)
-                        msgheading = self.adsb_msg_get_airborne_heading(msg)
-     
-                        output['speed'] = msgvelocity
-                        output['heading'] = msgheading
-                    elif msgsubme == 3 or msgsubme == 4:
-                        msgheadvalid, msgheading = self.adsb_msg_get_airborne_heading(msg)
-                        if msgheadvalid:
-                            out['heading'] = msgheading
-     
-            elif msgtype == 0 or msgtype == 4 or msgtype == 16 or msgtype == 20:
-                msgalt = self.adsb_msg_get_ac13_altitude(msg)
-                output['altitude'] = msgalt
-     
-        if output['crc_valid']:
-            print(output, file=sys.stderr)
-
-
@@ -6,7 +6,7 @@ setup(name='KismetCaptureProxyAdsb',
       author='Mike Kershaw / @kismetwireless',
       author_email='dragorn@kismetwireless.net',
       url='https://www.kismetwireless.net/',
-      install_requires=['protobuf', 'websockets'],
+      install_requires=['numpy', 'protobuf', 'websockets'],
       python_requires='>=3.2',
       packages=find_packages(),
       entry_points={
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Test script for the ADSB proxy ingest path
+Checks the batched Mode S parity check and single bit repair against a
+scalar reference, AVR parsing of upstream messages, shedding the oldest
+messages when decode falls behind, cross-upstream dedup, and parsing of
+upstream addresses
+"""
+
+import asyncio
+import random
+import sys
+
+import numpy as np
+
+from KismetCaptureProxyAdsb import (KismetProxyAdsb, ModesBatchCrc, ExpiringFrameSet,
+        MODES_CHECKSUM_TABLE, parse_upstream, format_host)
+
+# DF17 identification from KLM1023, a well known valid frame
+KNOWN_FRAME = bytearray.fromhex("8D4840D6202CC371C32CE0576098")
+
+def reference_crc(frame, bits):
+    """The scalar dump1090 checksum over all but the parity bits"""
+    offset = 112 - bits
+    crc = 0
+
+    for j in range(bits - 24):
+        if frame[j // 8] & (1 << (7 - j % 8)):
+            crc ^= MODES_CHECKSUM_TABLE[j + offset]
+
+    return crc
+
+def make_frame(rng, bits, df):
+    """A random frame of a downlink format with valid parity"""
+    nbytes = bits // 8
+    frame = bytearray(rng.randrange(256) for _ in range(nbytes))
+    frame[0] = (df << 3) | (frame[0] & 0x07)
+
+    crc = reference_crc(frame, bits)
+    frame[nbytes - 3:] = crc.to_bytes(3, "big")
+
+    return frame
+
+def make_proxy(queue=16384):
+    """A proxy with its defaults, as built before the source is opened"""
+    argv = sys.argv
+    sys.argv = [argv[0]]
+    try:
+        proxy = KismetProxyAdsb()
+    finally:
+        sys.argv = argv
+
+    proxy.opts.update({'proxy_ssl': False, 'uri_prefix': "", 'adsb_uuid': None, 'queue': queue})
+
+    return proxy
+
+def test_batch_crc():
+    """Test the batched syndrome matches the scalar checksum"""
+    print("Testing batched parity check...")
+
+    crc = ModesBatchCrc()
+    rng = random.Random(1)
+
+    matrix = np.frombuffer(bytes(KNOWN_FRAME), dtype=np.uint8).reshape(1, 14)
+    assert crc.syndrome(matrix, 112)[0] == 0, "Known good frame failed parity"
+
+    for (bits, df) in ((112, 17), (56, 11)):
+        frames = [make_frame(rng, bits, df) for _ in range(200)]
+
+        # Corrupt every other frame's parity
+        for f in frames[::2]:
+            f[-1] ^= 0x5A
+
+        matrix = np.frombuffer(b''.join(bytes(f) for f in frames), dtype=np.uint8).reshape(len(frames), bits // 8)
+        syndromes = crc.syndrome(matrix, bits)
+
+        for (f, s) in zip(frames, syndromes):
+            stored = int.from_bytes(f[-3:], "big")
+            assert s == reference_crc(f, bits) ^ stored, f"Syndrome mismatch for {f.hex()}"
+
+        assert not syndromes[1::2].any(), "Valid frames failed parity"
+        assert syndromes[::2].all(), "Corrupt frames passed parity"
+
+    print("✅ Batched parity: OK")
+
+def test_single_bit_repair():
+    """Test every single bit error is repaired from its syndrome"""
+    print("Testing single bit repair...")
+
+    crc = ModesBatchCrc()
+    rng = random.Random(2)
+
+    for (bits, df) in ((112, 17), (56, 11)):
+        frame = make_frame(rng, bits, df)
+
+        for j in range(bits):
+            damaged = frame[:]
+            damaged[j // 8] ^= 1 << (7 - j % 8)
+
+            matrix = np.frombuffer(bytes(damaged), dtype=np.uint8).reshape(1, bits // 8)
+            syndrome = crc.syndrome(matrix, bits)[0]
+
+            assert crc.fix_single_bit(damaged, bits, syndrome) == frame, f"Bit {j} of {bits} not repaired"
+
+    # Two flipped bits are not a single bit syndrome
+    damaged = KNOWN_FRAME[:]
+    damaged[5] ^= 0x03
+    matrix = np.frombuffer(bytes(damaged), dtype=np.uint8).reshape(1, 14)
+    assert crc.fix_single_bit(damaged, 112, crc.syndrome(matrix, 112)[0]) is None
+
+    print("✅ Single bit repair: OK")
+
+def test_parse_avr():
+    """Test frames are split out of AVR messages and counted per upstream"""
+    print("Testing AVR parsing...")
+
+    proxy = make_proxy()
+    a = {'name': "a:2501", 'stats': {'frames': 0}}
+    b = {'name': "b:2501", 'stats': {'frames': 0}}
+
+    short = "5D4840D6F1D0B7"
+
+    batch = [
+        (a, "*{};\n*{};\n".format(KNOWN_FRAME.hex().upper(), short)),
+        # Bytes, junk, a bad hex line, and an odd length frame are skipped
+        (b, "*{};\r\nnoise\n*ZZ12;\n*8D4840;\n".format(KNOWN_FRAME.hex()).encode()),
+        (a, ""),
+    ]
+
+    frames = proxy.parse_avr(batch)
+
+    assert frames == [("a:2501", KNOWN_FRAME), ("a:2501", bytearray.fromhex(short)),
+            ("b:2501", KNOWN_FRAME)], frames
+    assert (a['stats']['frames'], b['stats']['frames']) == (2, 1)
+    assert proxy.stats['frames'] == 3
+
+    outputs = proxy.decode_frames([f for (_, f) in frames])
+    assert outputs[0]['crc_valid'] and outputs[0]['callsign'].strip() == "KLM1023", outputs[0]
+
+    print("✅ AVR parsing: OK")
+
+def test_queue_drop_oldest():
+    """Test a full queue sheds the oldest messages without blocking readers"""
+    print("Testing queue shedding...")
+
+    async def run():
+        proxy = make_proxy(queue=4)
+        proxy.message_queue = asyncio.Queue(maxsize=4)
+        upstream = proxy._KismetProxyAdsb__make_upstream("a", 2501, "key")
+
+        for i in range(10):
+            proxy._KismetProxyAdsb__queue_upstream(upstream, f"*{i:02x};")
+
+        queued = [proxy.message_queue.get_nowait()[1] for _ in range(proxy.message_queue.qsize())]
+        return (proxy, upstream, queued)
+
+    (proxy, upstream, queued) = asyncio.run(run())
+
+    assert queued == ["*06;", "*07;", "*08;", "*09;"], queued
+    assert proxy.stats['queue_drops'] == 6
+    assert proxy.stats['queue_max'] == 4
+    assert upstream['stats']['messages'] == 10
+
+    print("✅ Queue shedding: OK")
+
+def test_dedup():
+    """Test copies from other upstreams are dropped, repeats from one upstream aren't"""
+    print("Testing cross-upstream dedup...")
+
+    frames = ExpiringFrameSet(0.5)
+    other = bytearray.fromhex("5D4840D6F1D0B7")
+
+    assert frames.add(KNOWN_FRAME, "a", 10.0)
+    assert not frames.add(KNOWN_FRAME, "b", 10.1), "Copy from another upstream forwarded"
+    assert frames.add(KNOWN_FRAME, "a", 10.2), "Repeat from the same upstream dropped"
+    assert frames.add(other, "b", 10.2)
+
+    frames.expire(10.5)
+    assert len(frames) == 1, "First frame not expired"
+    assert frames.add(KNOWN_FRAME, "b", 10.6), "Expired frame still dropped"
+
+    proxy = make_proxy()
+    proxy.dedup = ExpiringFrameSet(0.5)
+    unique = proxy.dedup_frames([("a", KNOWN_FRAME), ("b", KNOWN_FRAME), ("a", KNOWN_FRAME), ("b", other)])
+
+    assert unique == [KNOWN_FRAME, KNOWN_FRAME, other], unique
+    assert proxy.stats['duplicates'] == 1
+
+    print("✅ Dedup: OK")
+
+def test_upstreams():
+    """Test upstream addresses, including IPv6"""
+    print("Testing upstream parsing...")
+
+    assert parse_upstream("site2:2501", "key") == ("site2", "2501", "key")
+    assert parse_upstream("site3:2501:abcdef", "key") == ("site3", "2501", "abcdef")
+    assert parse_upstream("[fd00::3]:2501", "key") == ("fd00::3", "2501", "key")
+    assert parse_upstream("[::1]:2501:abcdef", "key") == ("::1", "2501", "abcdef")
+
+    for bad in ("site2", "fd00::3:2501", "[fd00::3]", "[fd00::3]2501", ":2501", "site2:port"):
+        assert parse_upstream(bad, "key") is None, f"Parsed '{bad}'"
+
+    assert format_host("fd00::3", "2501") == "[fd00::3]:2501"
+    assert format_host("site2", 2501) == "site2:2501"
+
+    proxy = make_proxy()
+    upstream = proxy._KismetProxyAdsb__make_upstream("fd00::3", "2501", "key")
+    assert upstream['uri'] == "ws://[fd00::3]:2501//phy/RTLADSB/raw.ws?KISMET=key", upstream['uri']
+
+    print("✅ Upstreams: OK")
+
+def run_all_tests():
+    print("🧪 Running ADSB proxy tests\n")
+
+    tests = [
+        test_batch_crc,
+        test_single_bit_repair,
+        test_parse_avr,
+        test_queue_drop_oldest,
+        test_dedup,
+        test_upstreams,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n📊 Results: {passed}/{len(tests)} tests passed")
+
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
@@ -13,14 +13,29 @@ Accepts standard options:
     channel=freqKHz   (in khz)
     channel=freq      (in raw hz to rtl_433)
 
-    channels="a,b,c"  Pass hopping list to rtl433_bin
+    channels="a,b,c"  Monitor several bands; with more than one dongle
+                      (see 'devices') each dongle gets its own bands,
+                      dongles with more than one band hop between them
+
+Additionally accepts:
+    gain        fixed gain
+    ppm_error   frequency error offset
+    devices         additional rtlsdr dongles (index or serial) to spread
+                    the channels across, for instance devices="1,2"
+    hop_interval    seconds a hopping dongle spends on each band (default 60)
+    restart_max     maximum seconds to wait between restarts of a failed
+                    rtl_433 process (default 30)
+    dedup_window    seconds to collapse repeated transmissions of the same
+                    reading into one report (default 0.5, 0 to disable)
+    debug=true      print rtl_433 output, and per-band and per-dongle
+                    counters every minute, to stderr
 """
 from __future__ import print_function
 
 import asyncio
 import argparse
+import collections
 import ctypes
-from datetime import datetime
 import json
 import os
 import subprocess
@@ -32,20 +47,185 @@ import uuid
 
 from . import kismetexternal
 
+class BurstTable(object):
+    """
+    Collapse the repeated copies of a transmission most 433MHz sensors send.
+
+    Records are held for the dedup window after the first copy arrives; copies
+    with the same model, id, channel and payload are folded in, and when the
+    window closes a single record is released carrying the repeat count and
+    the level fields of the strongest copy.
+    """
+
+    # Fields which vary between copies of the same transmission
+    volatile_fields = ('time', 'rssi', 'snr', 'noise', 'freq', 'freq1', 'freq2', 'mod')
+
+    # rtl_433 -M level fields, taken from the strongest copy
+    level_fields = ('rssi', 'snr', 'noise')
+
+    def __init__(self, window):
+        self.window = window
+
+        # key -> burst, in arrival order of the first copy
+        self.bursts = collections.OrderedDict()
+
+        self.stats = {
+                'bursts': 0,
+                'duplicates': 0,
+                }
+
+    def burst_key(self, j):
+        payload = { k: v for k, v in j.items() if k not in self.volatile_fields }
+
+        return (j.get('model'), j.get('id'), j.get('channel'),
+                hash(json.dumps(payload, sort_keys=True)))
+
+    def add(self, record, now):
+        """
+        Add a (text, json) record; returns the list of records now ready to send
+        """
+        if self.window <= 0:
+            return [record]
+
+        ready = self.expire(now)
+
+        key = self.burst_key(record[1])
+
+        burst = self.bursts.get(key)
+
+        if burst is None:
+            self.bursts[key] = {
+                    'start': now,
+                    'record': record,
+                    'best': record[1],
+                    'repeats': 1,
+                    }
+            return ready
+
+        burst['repeats'] += 1
+        self.stats['duplicates'] += 1
+
+        rssi = record[1].get('rssi')
+        best_rssi = burst['best'].get('rssi')
+
+        if rssi is not None and (best_rssi is None or rssi > best_rssi):
+            burst['best'] = record[1]
+
+        return ready
+
+    def expire(self, now):
+        """
+        Release every burst whose window has closed
+        """
+        ready = []
+
+        while len(self.bursts):
+            key, burst = next(iter(self.bursts.items()))
+
+            if now - burst['start'] < self.window:
+                break
+
+            del self.bursts[key]
+            ready.append(self.collapse(burst))
+
+        return ready
+
+    def flush(self):
+        ready = [self.collapse(b) for b in self.bursts.values()]
+        self.bursts.clear()
+        return ready
+
+    def collapse(self, burst):
+        self.stats['bursts'] += 1
+
+        if burst['repeats'] == 1:
+            return burst['record']
+
+        j = burst['record'][1]
+
+        for f in self.level_fields:
+            if f in burst['best']:
+                j[f] = burst['best'][f]
+
+        j['repeats'] = burst['repeats']
+
+        return (json.dumps(j), j)
+
+    def next_timeout(self, now):
+        """
+        Seconds until the oldest burst must be released, or None
+        """
+        if not len(self.bursts):
+            return None
+
+        burst = next(iter(self.bursts.values()))
+
+        return max(0, burst['start'] + self.window - now)
+
+def build_schedule(channels, devices):
+    """
+    Assign channels to rtlsdr devices.  With at least as many devices as
+    channels each channel gets a dedicated device; otherwise channels are
+    dealt out round-robin and devices with more than one channel hop.
+
+    Returns a list of (device, [channels]); devices with nothing to do are left
+    out.
+    """
+    if not len(devices):
+        raise ValueError("no rtlsdr devices to schedule")
+
+    assignments = [ (d, []) for d in devices ]
+
+    for i, c in enumerate(channels):
+        assignments[i % len(assignments)][1].append(c)
+
+    return [ a for a in assignments if len(a[1]) ]
+
 class KismetRtl433(object):
     def __init__(self):
         self.opts = {}
 
         self.opts['rtlbin'] = 'rtl_433'
         self.opts['channel'] = "433.920MHz"
+        self.opts['channels'] = None
+        self.opts['devices'] = []
+        self.opts['hop_interval'] = 60
         self.opts['gain'] = None
         self.opts['device'] = None
         self.opts['uuid'] = None
         self.opts['ppm'] = None
         self.opts['debug'] = None
+        self.opts['restart_max'] = 30
+        self.opts['dedup_window'] = 0.5
+
+        # The rtl_433 processes, one per scheduled dongle
+        self.rtl_procs = {}
+
+        # [{ 'device', 'channels', 'freqs', 'bursts' }] once the source is open
+        self.schedule = []
+
+        # How much we read from the rtl_433 pipe at a time
+        self.read_chunk = 65536
 
-        # The subprocess
-        self.rtl_proc = None
+        # Restart backoff for the rtl_433 process, and how long it must run
+        # before we consider it healthy again
+        self.restart_min = 1
+        self.restart_healthy = 60
+
+        # Give up when rtl_433 keeps dying without ever producing output; the
+        # radio is most likely gone
+        self.restart_fail_limit = 5
+
+        self.stats = {
+                'lines': 0,
+                'invalid': 0,
+                'reports': 0,
+                'batches': 0,
+                'restarts': 0,
+                'bands': {},
+                }
+
+        self.stats_interval = 60
 
         # The task so we can kill it during reconfigure
         self.rtl_task = None
@@ -209,83 +389,277 @@ class KismetRtl433(object):
 
         return True
 
-    async def __rtl_433_task(self):
-        """
-        asyncio task for consuming output from the rtl_433 process
-        """
+    def rtl_433_cmd(self, assignment):
+        cmd = [ self.opts['rtlbin'], '-F', 'json', '-M', 'level' ]
 
-        try:
-            self.kill_433()
+        if assignment['device'] is not None:
+            cmd.append('-d')
+            cmd.append("{}".format(assignment['device']))
 
-            cmd = [ self.opts['rtlbin'], '-F', 'json', '-M', 'level' ]
+        if self.opts['gain'] is not None:
+            cmd.append('-g')
+            cmd.append("{}".format(self.opts['gain']))
 
-            if self.opts['device'] is not None:
-                cmd.append('-d')
-                cmd.append("{}".format(self.opts['device']))
+        for c in assignment['channels']:
+            cmd.append('-f')
+            cmd.append("{}".format(c))
 
-            if self.opts['gain'] is not None:
-                cmd.append('-g')
-                cmd.append("{}".format(self.opts['gain']))
+        # rtl_433 hops between multiple -f frequencies every -H seconds
+        if len(assignment['channels']) > 1:
+            cmd.append('-H')
+            cmd.append("{}".format(self.opts['hop_interval']))
 
-            if self.opts['channel'] is not None:
-                cmd.append('-f')
-                cmd.append("{}".format(self.opts['channel']))
+        if self.opts['ppm'] is not None:
+            cmd.append('-p')
+            cmd.append("{}".format(self.opts['ppm']))
 
-            if self.opts['ppm'] is not None:
-                cmd.append('-p')
-                cmd.append("{}".format(self.opts['ppm']))
+        return cmd
 
-            seen_any_valid = False
-            failed_once = False
-            print_stderr = False
-
-            if self.opts['debug'] is not None and self.opts['debug']:
-                print_stderr = True
+    async def __rtl_433_task(self, assignment):
+        """
+        asyncio task supervising the rtl_433 process for one scheduled dongle; when
+        rtl_433 exits it is restarted with a backoff, and only a process which
+        repeatedly dies without producing anything takes the dongle out.  The
+        source spins down once no dongle is left running.
+        """
+        device = assignment['device']
 
-            self.rtl_proc = await asyncio.create_subprocess_exec(*cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.DEVNULL)
+        backoff = self.restart_min
+        failures = 0
 
+        try:
             while not self.kismet.kill_ioloop:
-                line = await self.rtl_proc.stdout.readline()
+                self.kill_433_device(device)
+
+                start = time.monotonic()
+
+                try:
+                    proc = await asyncio.create_subprocess_exec(*self.rtl_433_cmd(assignment),
+                            stdout=asyncio.subprocess.PIPE,
+                            stderr=asyncio.subprocess.DEVNULL)
+                    self.rtl_procs[device] = proc
+
+                    lines = await self.__rtl_433_reader(assignment, proc)
 
-                if not line:
+                    await proc.wait()
+                    err = "rtl_433 process on device {} exited with code {}".format(device, proc.returncode)
+                except OSError as e:
+                    lines = 0
+                    err = "could not launch rtl_433 on device {}: {}".format(device, e)
+
+                if self.kismet.kill_ioloop or self.rtl_reconfigure:
                     break
 
-                msg = line.decode('UTF-8').strip()
+                # A process which ran for a while or produced output was healthy;
+                # start the backoff over
+                if lines or time.monotonic() - start > self.restart_healthy:
+                    backoff = self.restart_min
+                    failures = 0
+                else:
+                    failures += 1
 
-                if print_stderr:
-                    print("RTL433", msg, file=sys.stderr)
+                if failures >= self.restart_fail_limit:
+                    raise RuntimeError("{}, giving up after {} attempts".format(err, failures))
 
-                if not self.handle_json(msg):
-                    raise RuntimeError('could not process response from rtl_433')
+                self.stats['restarts'] += 1
 
-                seen_any_valid = True
+                print("rtl_433 stopped ({}), restarting in {} seconds".format(err, backoff), file=sys.stderr)
+                self.kismet.send_message("{}, restarting in {} seconds".format(err, backoff),
+                        self.kismet.MSG_ERROR)
 
-            raise RuntimeError('rtl_433 process exited')
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.opts['restart_max'])
+
+        except asyncio.CancelledError:
+            raise
 
         except Exception as e:
             if not self.rtl_reconfigure:
-                trackeback.print_exc(file=sys.stderr)
+                traceback.print_exc(file=sys.stderr)
                 print("An error occurred in rtl_433; is your USB device plugged in?  Try running rtl_433 in a terminal and confirm it can connect to your device.  Make sure that no other programs are using this rtlsdr radio.", file=sys.stderr)
 
-                self.kismet.send_datasource_error_report(message="Error handling data from rtl_433: {}".format(e))
+                if len(self.rtl_procs) > 1:
+                    self.kismet.send_message("Error handling data from rtl_433 on device {}, "
+                            "continuing with the remaining devices: {}".format(device, e),
+                            self.kismet.MSG_ERROR)
+                else:
+                    self.kismet.send_datasource_error_report(message="Error handling data from rtl_433: {}".format(e))
 
         finally:
-            self.kill_433()
-            if not self.rtl_configure:
+            self.kill_433_device(device)
+            self.rtl_procs.pop(device, None)
+
+            if not self.rtl_reconfigure and not len(self.rtl_procs):
                 self.kismet.spindown()
 
-    def kill_433(self):
+    async def __rtl_433_reader(self, assignment, proc):
+        """
+        Read rtl_433 output in large chunks and split out every complete line,
+        returning the number of lines seen once the process closes its output
+        """
+        print_stderr = False
+
+        if self.opts['debug'] is not None and self.opts['debug']:
+            print_stderr = True
+
+        buf = bytearray()
+        lines = 0
+
+        # Kept across restarts so the dongle's counters add up
+        bursts = assignment['bursts']
+
+        if bursts is None:
+            bursts = BurstTable(self.opts['dedup_window'])
+            assignment['bursts'] = bursts
+
+        while not self.kismet.kill_ioloop:
+            try:
+                chunk = await asyncio.wait_for(proc.stdout.read(self.read_chunk),
+                        bursts.next_timeout(time.monotonic()))
+            except asyncio.TimeoutError:
+                chunk = None
+
+            if chunk is None:
+                # Nothing new arrived before the oldest burst closed
+                if not self.send_reports(assignment, bursts.expire(time.monotonic())):
+                    raise RuntimeError('could not process response from rtl_433')
+                continue
+
+            if not chunk:
+                break
+
+            buf += chunk
+
+            records = []
+
+            view = memoryview(buf)
+            start = 0
+
+            try:
+                while True:
+                    end = buf.find(b'\n', start)
+
+                    if end < 0:
+                        break
+
+                    with view[start:end] as line:
+                        if print_stderr:
+                            print("RTL433", bytes(line).decode('UTF-8', errors='replace').strip(), file=sys.stderr)
+
+                        record = self.parse_json(line)
+
+                    start = end + 1
+
+                    if record is not None:
+                        records.append(record)
+            finally:
+                view.release()
+
+            # Keep the trailing partial line for the next read
+            del buf[:start]
+
+            lines += len(records)
+
+            now = time.monotonic()
+            ready = bursts.expire(now)
+
+            for r in records:
+                ready.extend(bursts.add(r, now))
+
+            if not self.send_reports(assignment, ready):
+                raise RuntimeError('could not process response from rtl_433')
+
+        # Don't lose the last readings when rtl_433 goes away
+        self.send_reports(assignment, bursts.flush())
+
+        return lines
+
+    async def __stats_task(self):
+        """
+        asyncio task that reports per-band and per-dongle counters; Kismet is
+        told once when a band goes quiet while the rest of the source doesn't,
+        and once when it's heard from again
+        """
+        last = dict(self.stats)
+        last_bands = {c: b['reports'] for (c, b) in self.stats['bands'].items()}
+        quiet = set()
+
+        while not self.kismet.kill_ioloop:
+            await asyncio.sleep(self.stats_interval)
+
+            rates = {k: (self.stats[k] - last[k]) / self.stats_interval for k in ('lines', 'reports')}
+            bands = {c: max(b['reports'] - last_bands.get(c, 0), 0) for (c, b) in self.stats['bands'].items()}
+
+            last = dict(self.stats)
+            last_bands = {c: b['reports'] for (c, b) in self.stats['bands'].items()}
+
+            for (c, n) in bands.items():
+                self.stats['bands'][c]['interval_reports'] = n
+
+            if self.opts['debug']:
+                print("RTL433 {:.1f} lines/s {:.1f} reports/s stats {}".format(
+                    rates['lines'], rates['reports'],
+                    {k: v for (k, v) in self.stats.items() if k != 'bands'}), file=sys.stderr)
+
+                for assignment in self.schedule:
+                    bursts = assignment['bursts']
+
+                    print("RTL433 device {} running {} reports {} last {}s {} bursts {}".format(
+                        assignment['device'],
+                        self.rtl_procs.get(assignment['device']) is not None,
+                        {c: self.stats['bands'][c]['reports'] for c in assignment['channels']},
+                        self.stats_interval,
+                        {c: bands.get(c, 0) for c in assignment['channels']},
+                        bursts.stats if bursts is not None else None), file=sys.stderr)
+
+            self.quiet_bands(bands, quiet)
+
+    def quiet_bands(self, bands, quiet):
+        """
+        Tell Kismet about bands which went quiet or came back since the last
+        interval; bands maps each band to its reports in the interval, and quiet
+        is the set of bands already reported quiet, which is updated
+        """
+        # A source where nothing at all was heard isn't a band problem
+        if not any(bands.values()):
+            return
+
+        went_quiet = [c for (c, n) in bands.items() if n == 0 and c not in quiet]
+        recovered = [c for (c, n) in bands.items() if n > 0 and c in quiet]
+
+        if len(went_quiet):
+            quiet.update(went_quiet)
+            self.kismet.send_message("rtl_433 heard nothing on {} in the last {} seconds".format(
+                ", ".join(went_quiet), self.stats_interval))
+
+        if len(recovered):
+            quiet.difference_update(recovered)
+            self.kismet.send_message("rtl_433 is hearing {} again".format(", ".join(recovered)))
+
+    def kill_433_device(self, device):
         try:
-            if not self.rtl_proc == None:
-                self.rtl_proc.kill()
+            proc = self.rtl_procs.get(device)
+            if not proc == None:
+                proc.kill()
         except Exception as e:
             pass
 
+    def kill_433(self):
+        for device in list(self.rtl_procs):
+            self.kill_433_device(device)
+
     def run_rtl433(self):
         self.kismet.add_exit_callback(self.kill_433)
-        self.kismet.add_task(self.__rtl_433_task)
+
+        # Claim every device up front so one failing early doesn't spin the source
+        # down before the others have started
+        for assignment in self.schedule:
+            self.rtl_procs[assignment['device']] = None
+
+        for assignment in self.schedule:
+            self.kismet.add_task(self.__rtl_433_task, [assignment])
+
+        self.kismet.add_task(self.__stats_task)
 
     # Implement the listinterfaces callback for the datasource api;
     def datasource_listinterfaces(self, seqno):
@@ -324,6 +698,26 @@ class KismetRtl433(object):
             return float(freq) / 1000.0
 
 
+    def __find_device(self, devselector):
+        """
+        Resolve a device index or serial number to a librtlsdr index, or -1
+        """
+        # Try to find the device as an index
+        try:
+            intnum = int(devselector)
+
+            # Abort if we're not w/in the range
+            if intnum < self.rtl_get_device_count():
+                return intnum
+
+        # Do nothing with exceptions; they just mean we need to look at it like a 
+        # serial number
+        except ValueError:
+            pass
+
+        # Try it as a serial number
+        return self.rtl_get_index_by_serial(devselector.encode('utf-8'))
+
     def __get_rtlsdr_uuid(self, intnum):
         # Get the USB info
         (manuf, product, serial) = self.get_rtl_usb_info(intnum)
@@ -384,6 +778,14 @@ class KismetRtl433(object):
 
         ret['channel'] = self.opts['channel']
         ret['channels'] = [self.opts['channel']]
+
+        if 'channels' in options:
+            channels = [c.strip() for c in options['channels'].split(',') if len(c.strip())]
+
+            if len(channels):
+                ret['channel'] = channels[0]
+                ret['channels'] = channels
+
         ret['success'] = True
         return ret
 
@@ -405,28 +807,7 @@ class KismetRtl433(object):
 
         # Device selector could be integer position, or it could be a serial number
         devselector = source[7:]
-        found_interface = False
-        intnum = -1
-
-        # Try to find the device as an index
-        try:
-            intnum = int(devselector)
-
-            # Abort if we're not w/in the range
-            if intnum >= self.rtl_get_device_count():
-                raise ValueError("n/a")
-
-            # Otherwise we've found a device
-            found_interface = True
-
-        # Do nothing with exceptions; they just mean we need to look at it like a 
-        # serial number
-        except ValueError:
-            pass
-
-        # Try it as a serial number
-        if not found_interface:
-            intnum = self.rtl_get_index_by_serial(devselector.encode('utf-8'))
+        intnum = self.__find_device(devselector)
 
         # We've failed as both a serial and as an index, give up
         if intnum < 0:
@@ -443,6 +824,56 @@ class KismetRtl433(object):
                 ret['message'] = "Could not parse the supplied channel, make sure that your channel is of the format nnn.nnKhz, nnn.nnMhz, or nnn.nn for basic Hz"
                 return ret
 
+        channels = [self.opts['channel']]
+
+        if 'channels' in options:
+            channels = [c.strip() for c in options['channels'].split(',') if len(c.strip())]
+
+            if not len(channels):
+                ret['success'] = False
+                ret['message'] = "No channels in the 'channels' option"
+                return ret
+
+            self.opts['channels'] = channels
+
+        freqs = {}
+        for c in channels:
+            try:
+                freqs[c] = self.__parse_human_frequency(c)
+            except ValueError:
+                ret['success'] = False
+                ret['message'] = "Could not parse channel {}, make sure that your channel is of the format nnn.nnKhz, nnn.nnMhz, or nnn.nn for basic Hz".format(c)
+                return ret
+
+        devices = [intnum]
+
+        if 'devices' in options:
+            for d in options['devices'].split(','):
+                d = d.strip()
+
+                if not len(d):
+                    continue
+
+                devnum = self.__find_device(d)
+
+                if devnum < 0:
+                    ret['success'] = False
+                    ret['message'] = "Could not find rtl-sdr device {}".format(d)
+                    return ret
+
+                if devnum not in devices:
+                    devices.append(devnum)
+
+            self.opts['devices'] = devices[1:]
+
+        if 'hop_interval' in options:
+            try:
+                self.opts['hop_interval'] = max(1, int(options['hop_interval']))
+            except ValueError:
+                ret['success'] = False
+                ret['message'] = "Could not parse 'hop_interval' option, expected seconds"
+                return ret
+
         if 'gain' in options:
             self.opts['gain'] = options['gain']
 
@@ -453,6 +884,22 @@ class KismetRtl433(object):
             if options['debug'] == 'True' or options['debug'] == 'true':
                 self.opts['debug'] = True
 
+        if 'dedup_window' in options:
+            try:
+                self.opts['dedup_window'] = float(options['dedup_window'])
+            except ValueError:
+                ret['success'] = False
+                ret['message'] = "Could not parse 'dedup_window' option, expected seconds"
+                return ret
+
+        if 'restart_max' in options:
+            try:
+                self.opts['restart_max'] = max(self.restart_min, int(options['restart_max']))
+            except ValueError:
+                ret['success'] = False
+                ret['message'] = "Could not parse 'restart_max' option, expected seconds"
+                return ret
+
         ret['hardware'] = self.rtl_get_device_name(intnum)
         if ('uuid' in options):
             ret['uuid'] = options['uuid']
@@ -460,9 +907,25 @@ class KismetRtl433(object):
             ret['uuid'] = self.__get_rtlsdr_uuid(intnum)
 
         ret['capture_interface'] = f"rtl-{devselector}"
+        ret['channel'] = channels[0]
+        ret['channels'] = channels
 
         self.opts['device'] = intnum
 
+        self.schedule = []
+        self.stats['bands'] = {}
+
+        for (device, chans) in build_schedule(channels, devices):
+            self.schedule.append({
+                'device': device,
+                'channels': chans,
+                'freqs': [ (freqs[c], c) for c in chans ],
+                'bursts': None,
+                })
+
+            for c in chans:
+                self.stats['bands'][c] = { 'device': device, 'reports': 0, 'interval_reports': 0 }
+
         ret['success'] = True
 
         self.run_rtl433()
@@ -472,30 +935,88 @@ class KismetRtl433(object):
     def datasource_configure(self, seqno, config):
         return {"success": True}
 
-    def handle_json(self, injson):
+    def parse_json(self, line):
+        """
+        Validate one line of rtl_433 output; returns (text, record) or None
+        """
+        self.stats['lines'] += 1
+
         try:
-            j = json.loads(injson)
-            r = json.dumps(j)
+            text = bytes(line).decode('UTF-8').strip()
 
-            report = kismetexternal.datasource_pb2.SubJson()
+            if not len(text):
+                return None
 
-            dt = datetime.now()
-            report.time_sec = int(time.mktime(dt.timetuple()))
-            report.time_usec = int(dt.microsecond)
+            j = json.loads(text)
 
-            report.type = "RTL433"
-            report.json = r
+            if not isinstance(j, dict):
+                raise ValueError("not a JSON object")
+        except ValueError:
+            # rtl_433 occasionally interleaves non-JSON status output; count it
+            # rather than failing the source
+            self.stats['invalid'] += 1
+            return None
 
-            signal = kismetexternal.datasource_pb2.SubSignal()
-            signal.freq_khz = self.freq_khz 
-            signal.channel = self.opts['channel']
+        return (text, j)
 
-            # print("python sending json report", r);
+    def record_band(self, assignment, j):
+        """
+        Work out which of a dongle's bands a record was heard on; rtl_433 reports
+        the tuned frequency in MHz in the -M level 'freq' field
+        """
+        freqs = assignment['freqs']
 
-            self.kismet.send_datasource_data_report(full_json=report, full_signal=signal)
-        except ValueError as e:
-            self.kismet.send_datasource_error_report(message = "Could not parse JSON output of rtl_433")
-            return False
+        if len(freqs) == 1:
+            return freqs[0]
+
+        try:
+            freq_khz = float(j['freq']) * 1000
+        except (KeyError, TypeError, ValueError):
+            return freqs[0]
+
+        return min(freqs, key=lambda f: abs(f[0] - freq_khz))
+
+    def send_reports(self, assignment, records):
+        """
+        Send a batch of validated rtl_433 records from one dongle to Kismet,
+        sharing one timestamp and a signal record per band.  The original JSON
+        text is forwarded as-is; it has already been validated.
+        """
+        if not len(records):
+            return True
+
+        try:
+            now = time.time()
+            time_sec = int(now)
+            time_usec = int((now - time_sec) * 1000000)
+
+            signals = {}
+
+            for (text, j) in records:
+                (freq_khz, channel) = self.record_band(assignment, j)
+
+                signal = signals.get(channel)
+
+                if signal is None:
+                    signal = kismetexternal.datasource_pb2.SubSignal()
+                    signal.freq_khz = freq_khz
+                    signal.channel = channel
+                    signals[channel] = signal
+
+                report = kismetexternal.datasource_pb2.SubJson()
+
+                report.time_sec = time_sec
+                report.time_usec = time_usec
+
+                report.type = "RTL433"
+                report.json = text
+
+                self.kismet.send_datasource_data_report(full_json=report, full_signal=signal)
+
+                self.stats['bands'][channel]['reports'] += 1
+
+            self.stats['reports'] += len(records)
+            self.stats['batches'] += 1
         except Exception as e:
             self.kismet.send_datasource_error_report(message = "Could not process output of rtl_433")
             return False
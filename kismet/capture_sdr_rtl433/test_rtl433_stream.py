@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Test script for the rtl_433 output path
+Feeds scripted rtl_433 output through the chunked line reader, including a
+JSON line split across a 64 KiB read, checks the supervisor's restart backoff
+and fail limit against a real failing process, and checks repeat collapsing,
+channel scheduling and quiet band messages
+"""
+
+import asyncio
+import json
+import os
+import stat
+import sys
+import tempfile
+
+from KismetCaptureRtl433 import KismetRtl433, BurstTable, build_schedule
+
+class FakeKismet(object):
+    """Just enough of the external helper to record what the source sends"""
+    MSG_ERROR = 'ERROR'
+
+    def __init__(self):
+        self.kill_ioloop = False
+        self.reports = []
+        self.messages = []
+        self.errors = []
+        self.spun_down = False
+
+    def send_datasource_data_report(self, full_json=None, full_signal=None):
+        self.reports.append((full_json.json, full_signal.channel))
+
+    def send_message(self, message, msgtype=None):
+        self.messages.append((message, msgtype))
+
+    def send_datasource_error_report(self, message=None):
+        self.errors.append(message)
+
+    def spindown(self):
+        self.spun_down = True
+
+class FakeStdout(object):
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.sizes = []
+
+    async def read(self, n):
+        self.sizes.append(n)
+
+        if not len(self.chunks):
+            return b''
+
+        return self.chunks.pop(0)
+
+class FakeProc(object):
+    def __init__(self, chunks):
+        self.stdout = FakeStdout(chunks)
+
+def make_source(dedup_window=0.5, channels=("433.920MHz",)):
+    """A source with its defaults and one dongle scheduled, as after open"""
+    argv = sys.argv
+    sys.argv = [argv[0]]
+    try:
+        rtl = KismetRtl433()
+    finally:
+        sys.argv = argv
+
+    rtl.kismet = FakeKismet()
+    rtl.opts['dedup_window'] = dedup_window
+
+    rtl.schedule = [{
+        'device': 0,
+        'channels': list(channels),
+        'freqs': [ (433920 + 1000 * i, c) for (i, c) in enumerate(channels) ],
+        'bursts': None,
+        }]
+    rtl.stats['bands'] = { c: { 'device': 0, 'reports': 0 } for c in channels }
+
+    return rtl
+
+def reading(i, **extra):
+    j = { 'time': "2026-01-01 00:00:00", 'model': "Acurite-Tower", 'id': i,
+            'channel': "A", 'temperature_C': 20.5, 'rssi': -10.0 }
+    j.update(extra)
+    return j
+
+def test_reader_chunks():
+    """Test lines are split out of 64 KiB reads, including across reads"""
+    print("Testing chunked line reader...")
+
+    rtl = make_source()
+    reader = rtl._KismetRtl433__rtl_433_reader
+
+    # Fill the first read with whole lines, leaving a record cut in half at
+    # exactly the read size
+    lines = []
+    size = 0
+    i = 0
+    while True:
+        line = (json.dumps(reading(i)) + "\n").encode()
+        if size + len(line) > rtl.read_chunk:
+            break
+        lines.append(line)
+        size += len(line)
+        i += 1
+
+    split = (json.dumps(reading(i, note="x" * 200)) + "\n").encode()
+    head = rtl.read_chunk - size
+    first = b''.join(lines) + split[:head]
+    assert len(first) == rtl.read_chunk
+
+    tail = [
+        split[head:],
+        # Status output and blank lines are counted, not fatal
+        b"rtl_433 version 23.11\n\n",
+        # The newline of this record arrives on its own
+        json.dumps(reading(i + 1)).encode(),
+        b"\n",
+        # No trailing newline; never a complete line
+        b'{"model": "partial"',
+    ]
+
+    proc = FakeProc([first] + tail)
+    count = asyncio.run(reader(rtl.schedule[0], proc))
+
+    assert count == i + 2, count
+    assert set(proc.stdout.sizes) == {rtl.read_chunk}
+
+    sent = [json.loads(r) for (r, _) in rtl.kismet.reports]
+    assert [j['id'] for j in sent] == list(range(i + 2)), "Records lost or reordered"
+    assert sent[i]['note'] == "x" * 200, "Split record damaged"
+
+    assert rtl.stats['lines'] == i + 4, rtl.stats
+    assert rtl.stats['invalid'] == 1, rtl.stats
+    assert rtl.stats['reports'] == i + 2
+    assert rtl.stats['bands']["433.920MHz"]['reports'] == i + 2
+    assert not rtl.kismet.errors
+
+    # The burst table outlives the process so the counters keep adding up
+    bursts = rtl.schedule[0]['bursts']
+    asyncio.run(reader(rtl.schedule[0], FakeProc([(json.dumps(reading(0)) + "\n").encode()])))
+    assert rtl.schedule[0]['bursts'] is bursts
+    assert bursts.stats['bursts'] == i + 3
+
+    print(f"📊 {i + 2} records across {len(tail) + 1} reads")
+    print("✅ Chunked line reader: OK")
+
+def make_rtlbin(tmpdir, body):
+    """A stand-in rtl_433 which ignores its arguments"""
+    path = os.path.join(tmpdir, "rtl_433")
+
+    with open(path, 'w') as f:
+        f.write("#!/bin/sh\n" + body + "\n")
+
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+    return path
+
+def test_supervisor_fail_limit():
+    """Test a process which keeps dying with no output backs off, then gives up"""
+    print("Testing supervisor backoff and fail limit...")
+
+    rtl = make_source()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rtl.opts['rtlbin'] = make_rtlbin(tmpdir, "exit 3")
+        rtl.opts['restart_max'] = 0.04
+        rtl.restart_min = 0.01
+        rtl.restart_fail_limit = 4
+
+        rtl.rtl_procs[0] = None
+        asyncio.run(rtl._KismetRtl433__rtl_433_task(rtl.schedule[0]))
+
+    backoffs = [m.split("restarting in ")[1] for (m, _) in rtl.kismet.messages]
+
+    assert backoffs == ["0.01 seconds", "0.02 seconds", "0.04 seconds"], backoffs
+    assert all(t == FakeKismet.MSG_ERROR for (_, t) in rtl.kismet.messages)
+    assert "exited with code 3" in rtl.kismet.messages[0][0]
+    assert rtl.stats['restarts'] == 3
+
+    assert len(rtl.kismet.errors) == 1 and "giving up after 4 attempts" in rtl.kismet.errors[0], rtl.kismet.errors
+    assert rtl.kismet.spun_down, "Source not spun down with no dongle left"
+    assert not len(rtl.rtl_procs)
+
+    print("✅ Supervisor backoff and fail limit: OK")
+
+def test_supervisor_healthy_restart():
+    """Test a process which produced output restarts without backing off"""
+    print("Testing supervisor restart of a healthy process...")
+
+    rtl = make_source()
+
+    # Stop once the process has been restarted a few times
+    class Messages(list):
+        def append(self, m):
+            list.append(self, m)
+            if len(self) == 3:
+                rtl.kismet.kill_ioloop = True
+
+    rtl.kismet.messages = Messages()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rtl.opts['rtlbin'] = make_rtlbin(tmpdir, "echo '{}'".format(json.dumps(reading(1))))
+        rtl.restart_min = 0.01
+        rtl.restart_fail_limit = 2
+
+        rtl.rtl_procs[0] = None
+        asyncio.run(rtl._KismetRtl433__rtl_433_task(rtl.schedule[0]))
+
+    backoffs = [m.split("restarting in ")[1] for (m, _) in rtl.kismet.messages]
+
+    assert backoffs == ["0.01 seconds"] * 3, backoffs
+    assert not rtl.kismet.errors, rtl.kismet.errors
+    assert len(rtl.kismet.reports) == 3, rtl.kismet.reports
+
+    print("✅ Supervisor healthy restart: OK")
+
+def test_burst_collapse():
+    """Test repeats collapse into one record carrying the strongest copy's levels"""
+    print("Testing repeat collapsing...")
+
+    bursts = BurstTable(0.5)
+
+    copies = [
+        reading(7, rssi=-12.0, snr=8.0, noise=-20.0, freq=433.91, time="00:00:00.1"),
+        reading(7, rssi=-4.5, snr=15.0, noise=-19.5, freq=433.93, time="00:00:00.2"),
+        reading(7, rssi=-9.0, snr=11.0, noise=-20.5, freq=433.92, time="00:00:00.3"),
+    ]
+
+    ready = []
+    for (n, j) in enumerate(copies):
+        ready += bursts.add((json.dumps(j), j), 10.0 + n * 0.05)
+
+    # A different reading from the same sensor is its own burst
+    other = reading(7, temperature_C=21.0)
+    ready += bursts.add((json.dumps(other), other), 10.2)
+
+    assert not ready, "Released before the window closed"
+    assert abs(bursts.next_timeout(10.2) - 0.3) < 1e-9
+
+    ready = bursts.expire(10.5)
+    assert len(ready) == 1, ready
+
+    (text, j) = ready[0]
+    assert json.loads(text) == j
+    assert j['repeats'] == 3
+    assert (j['rssi'], j['snr'], j['noise']) == (-4.5, 15.0, -19.5), j
+    assert j['time'] == "00:00:00.1", "Not the first copy"
+
+    ready = bursts.flush()
+    assert len(ready) == 1 and ready[0][1]['temperature_C'] == 21.0
+    assert 'repeats' not in ready[0][1], "Single copy marked as repeated"
+    assert bursts.next_timeout(11.0) is None
+
+    assert bursts.stats == { 'bursts': 2, 'duplicates': 2 }, bursts.stats
+
+    # A zero window passes everything straight through
+    bursts = BurstTable(0)
+    assert bursts.add(("a", copies[0]), 0) == [("a", copies[0])]
+    assert bursts.add(("b", copies[1]), 0) == [("b", copies[1])]
+
+    print("✅ Repeat collapsing: OK")
+
+def test_build_schedule():
+    """Test channels are dealt out round-robin and idle dongles left out"""
+    print("Testing channel scheduling...")
+
+    assert build_schedule(["a", "b"], [0, 1, 2]) == [(0, ["a"]), (1, ["b"])]
+    assert build_schedule(["a", "b", "c", "d", "e"], [0, "SN1"]) == [(0, ["a", "c", "e"]), ("SN1", ["b", "d"])]
+    assert build_schedule(["a", "b", "c"], [None]) == [(None, ["a", "b", "c"])]
+
+    try:
+        build_schedule(["a"], [])
+        assert False, "Scheduled with no dongles"
+    except ValueError:
+        pass
+
+    print("✅ Channel scheduling: OK")
+
+def test_quiet_bands():
+    """Test Kismet hears once when a band goes quiet, and once when it's back"""
+    print("Testing quiet band messages...")
+
+    rtl = make_source()
+    quiet = set()
+
+    intervals = [
+        { '433': 5, '915': 2 },
+        { '433': 4, '915': 0 },
+        { '433': 6, '915': 0 },
+        { '433': 0, '915': 0 },
+        { '433': 3, '915': 0 },
+        { '433': 3, '915': 1 },
+        { '433': 2, '915': 1 },
+    ]
+
+    sent = []
+    for bands in intervals:
+        rtl.quiet_bands(bands, quiet)
+        sent.append([m for (m, _) in rtl.kismet.messages])
+        rtl.kismet.messages = []
+
+    assert sent == [
+        [],
+        ["rtl_433 heard nothing on 915 in the last 60 seconds"],
+        [],
+        # Nothing heard anywhere isn't reported as a band going quiet
+        [],
+        [],
+        ["rtl_433 is hearing 915 again"],
+        [],
+    ], sent
+    assert not quiet
+
+    print("✅ Quiet band messages: OK")
+
+def run_all_tests():
+    print("🧪 Running rtl_433 stream tests\n")
+
+    tests = [
+        test_reader_chunks,
+        test_supervisor_fail_limit,
+        test_supervisor_healthy_restart,
+        test_burst_collapse,
+        test_build_schedule,
+        test_quiet_bands,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n📊 Results: {passed}/{len(tests)} tests passed")
+
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
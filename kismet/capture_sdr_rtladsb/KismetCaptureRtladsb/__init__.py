@@ -9,6 +9,12 @@ Accepts standard options:
 Additionally accepts:
     ppm     error offset 
     gain    fixed gain 
+    devices comma separated list of additional rtl radios (index or serial)
+            to open in this same helper, for antenna diversity; for example
+            rtladsb-0:devices="1,2".  The radios share one Python process, so
+            busy sites with many radios may be better off with a source each
+    dedup_window    seconds to hold a frame while waiting for copies from
+            other radios (default 0.1 with multiple radios, 0 with one)
 
 """
 
@@ -16,6 +22,7 @@ from __future__ import print_function
 
 import asyncio
 import argparse
+import collections
 import ctypes
 from datetime import datetime
 import json
@@ -32,11 +39,305 @@ import subprocess
 import sys
 import threading
 import time
+import traceback
 import uuid
 
 from . import rtlsdr
 from . import kismetexternal
 
+class AdsbFrameDedup(object):
+    """
+    Expiring table of frames seen by one or more receivers.  The first copy of
+    a frame opens an entry; copies heard by other receivers inside the window
+    only add their signal level to it.  A receiver can't hear one transmission
+    twice, so a frame it already reported is a new transmission, such as a
+    repeated all-call reply, and opens an entry of its own.  Entries are
+    released once the window has passed, in the order they were first seen.
+    """
+    def __init__(self, window):
+        self.window = window
+
+        # Entries in the order they were first seen, by frame number
+        self.pending = collections.OrderedDict()
+
+        # Latest entry for each frame, which copies are added to
+        self.latest = {}
+
+        self.frames = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, frame, receiver, level, ts):
+        key = bytes(frame)
+
+        entry = self.latest.get(key, None)
+
+        if entry is None or receiver in entry["signals"]:
+            self.frames += 1
+            entry = {
+                    "key": key,
+                    "frame": frame,
+                    "first_seen": ts,
+                    "signals": {receiver: level},
+                    }
+            self.pending[self.frames] = entry
+            self.latest[key] = entry
+            return True
+
+        self.duplicates += 1
+
+        entry["signals"][receiver] = level
+
+        return False
+
+    def expire(self, now):
+        ready = []
+
+        while len(self.pending):
+            entry = next(iter(self.pending.values()))
+
+            if now - entry["first_seen"] < self.window:
+                break
+
+            self.pending.popitem(last=False)
+
+            if self.latest.get(entry["key"]) is entry:
+                del self.latest[entry["key"]]
+
+            ready.append(entry)
+
+        return ready
+
+class RtladsbReceiver(object):
+    """
+    A single rtlsdr radio opened by the rtladsb helper.  Each receiver has its
+    own librtlsdr handle and demodulates on its own capture thread, then hands
+    completed frames back to the helper for deduplication and reporting.
+
+    Demodulation is done in numpy a buffer or a frame at a time, but what
+    Python is left still holds the GIL, so the radios of one helper share a
+    single core for it; run a helper per radio where that isn't enough.
+    """
+    def __init__(self, adsb, intnum, name):
+        self.adsb = adsb
+        self.intnum = intnum
+        self.name = name
+
+        self.rtlsdr = rtlsdr.RtlSdr()
+
+        self.rtl_thread = None
+        self.running = False
+
+        self.magnitude_buf = None
+
+        self.frames = 0
+
+    def open_radio(self):
+        opts = self.adsb.opts
+
+        self.rtlsdr.open_radio(self.intnum, self.adsb.frequency, self.adsb.rate, gain=opts['gain'], autogain=True, ppm=opts['ppm'], biastee=opts['biastee'])
+
+        self.running = True
+
+        self.rtl_thread = threading.Thread(target=self.__async_radio_thread)
+        self.rtl_thread.daemon = True
+        self.rtl_thread.start()
+
+    def kill(self):
+        try:
+            self.rtlsdr.cancel()
+        except:
+            pass
+
+    def __async_radio_thread(self):
+        # This function blocks forever until cancelled
+        try:
+            self.rtlsdr.read_samples(self.rtl_data_cb, 12, self.adsb.usb_buf_sz)
+        except rtlsdr.RadioOperationalError as e:
+            if not self.adsb.kismet.inSpindown():
+                self.adsb.receiver_error(self, e)
+        except Exception as e:
+            self.adsb.receiver_error(self, e)
+
+        self.running = False
+        self.kill()
+
+        self.adsb.receiver_stopped(self)
+
+    def rtl_data_cb(self, buf, buflen, ctx):
+        self._iq_magnitude(buf, buflen)
+        self._manchester()
+        return
+
+    # Raw ADSB decode of the IQ data and manchester encoded data,
+    # turning it into packets.  Referenced from the rtl_adsb implementation
+    # but rewritten for numpy and other python semantics
+    def _iq_magnitude(self, buf, buflen):
+        """
+        Convert IQ to magnitude
+        """
+
+        nb = np.ctypeslib.as_array(buf, shape=(buflen,)).astype(np.uint8)
+
+        self.magnitude_buf = np.add(self.adsb.square_lut[nb[::2]], self.adsb.square_lut[nb[1::2]])
+        # self.magnitude_buf = ((np.abs(127 - nb[::2]) ** 2) + (np.abs(127 - nb[1::2]) ** 2))
+
+    def _single_manchester(self, a, b, c, d):
+        bit_p = a > b
+        bit = c > d
+
+        if bit and bit_p and c > b:
+            return 1
+        if bit and not bit_p and d < b:
+            return 1
+        if not bit and bit_p and d > b:
+            return 0
+        if not bit and not bit_p and c < b:
+            return 0
+
+        return None
+
+    def _adsb_preamble(self, buf, i):
+        low = 0
+        high = 65535
+
+        for i2 in range(0, self.adsb.preamble_len):
+            if i2 == 0 or i2 == 2 or i2 == 7 or i2 == 9:
+                high = buf[i + i2]
+            else:
+                low = buf[i + i2]
+
+            if high <= low:
+                return 0
+
+        return 1
+
+    # Mode S preamble at 2 samples per microsecond, zero mean-ish for correlation
+    np_preamble = np.array([1, 0, 1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0]) - 0.25
+
+    def _adsb_np_preamble(self, corr, i):
+        """
+        Strongest preamble at or after sample i, from the preamble correlation of
+        the whole buffer; the same as correlating buf[i:] but done once a buffer
+        """
+        return np.argmax(corr[i:]) + i
+
+    def _manchester_bits(self, p, i):
+        """
+        Slice the manchester bits following the preamble at p, starting from
+        sample i; returns (message, bits, i) where bits is how many bits were
+        sliced and i is the sample after the last pair looked at.  The message
+        is padded out to a long frame unless too many pairs failed to decode.
+
+        This is the rtl_adsb bit loop done a whole frame at a time.  Every bit
+        _single_manchester accepts, and the guess made for a pair it rejects,
+        is c > d.  After a rejected pair the previous samples are reset to
+        (0, 65535), which accepts any pair since magnitudes never exceed
+        2 * 128^2, so within a run of rejected pairs every other one is an
+        error.
+        """
+        buf = self.magnitude_buf
+        long_frame = self.adsb.long_frame
+
+        n = min((len(buf) - i) // 2, long_frame)
+
+        if n <= 0:
+            return (bytearray(b'\xFF' * long_frame), 0, i)
+
+        c = buf[i:i + 2 * n:2]
+        d = buf[i + 1:i + 2 * n:2]
+
+        a = np.empty(n, dtype=buf.dtype)
+        b = np.empty(n, dtype=buf.dtype)
+        a[0] = buf[p]
+        b[0] = buf[p + 1]
+        a[1:] = c[:-1]
+        b[1:] = d[:-1]
+
+        bit = c > d
+        bit_p = a > b
+
+        valid = ((bit & bit_p & (c > b)) |
+                (bit & ~bit_p & (d < b)) |
+                (~bit & bit_p & (d > b)) |
+                (~bit & ~bit_p & (c < b)))
+
+        # Position of each rejected pair within its run of rejected pairs
+        idx = np.arange(n)
+        rejected = ~valid
+        run_start = rejected.copy()
+        run_start[1:] &= valid[:-1]
+        run_start = np.maximum.accumulate(np.where(run_start, idx, 0))
+
+        errors = np.cumsum(rejected & ((idx - run_start) % 2 == 0))
+
+        over = np.flatnonzero(errors > self.adsb.allowed_errors)
+
+        if len(over):
+            m = int(over[0])
+            return (bytearray(bit[:m].astype(np.uint8).tobytes()), m, i + 2 * m + 1)
+
+        message_buf = bytearray(b'\xFF' * long_frame)
+        message_buf[:n] = bit.astype(np.uint8).tobytes()
+
+        return (message_buf, n, i + 2 * n - 1)
+
+    def _manchester(self):
+        preamble_len = self.adsb.preamble_len
+        short_frame = self.adsb.short_frame
+
+        corr = np.correlate(self.magnitude_buf, self.np_preamble)
+
+        i = 0
+        while True:
+            if i >= len(self.magnitude_buf) - 1 or i >= len(corr):
+                break
+
+            p = self._adsb_np_preamble(corr, i)
+
+            if p + preamble_len >= len(self.magnitude_buf):
+                break
+
+            (message_buf, bits, i) = self._manchester_bits(p, p + preamble_len)
+
+            if bits < short_frame:
+                continue
+
+            self._adsb_message(message_buf, p)
+
+    def _adsb_message(self, message_buf, start):
+        msg_hdr = np.packbits(message_buf[0])
+        if msg_hdr == 0:
+            return
+
+        adsb_frame = None
+        frame_len = self.adsb.long_frame
+
+        if msg_hdr & 0x80:
+            frame_len = self.adsb.long_frame
+        else:
+            frame_len = self.adsb.short_frame
+
+        if len(message_buf) < frame_len:
+            return
+
+        adsb_frame = bytearray(np.packbits(message_buf[:frame_len]).tobytes())
+
+        if frame_len > self.adsb.short_frame:
+            # print("*{};".format(adsb_frame.hex()))
+
+            # Rough signal level over the preamble and frame, in dB relative to
+            # full scale; magnitude is I^2 + Q^2 so full scale is 2 * 128^2
+            end = start + self.adsb.preamble_len + (frame_len * 2)
+            power = max(float(np.mean(self.magnitude_buf[start:end])), 1.0)
+            level = round(10 * math.log10(power / 32768.0), 1)
+
+            self.frames = self.frames + 1
+
+            self.adsb.post_frame(self, adsb_frame, level)
+
 class KismetRtladsb(object):
     def __init__(self):
         self.opts = {}
@@ -47,6 +348,7 @@ class KismetRtladsb(object):
         self.opts['device'] = None
         self.opts['debug'] = None
         self.opts['biastee'] = -1
+        self.opts['dedup_window'] = None
 
         self.kismet = None
 
@@ -68,6 +370,10 @@ class KismetRtladsb(object):
             self.square_lut[i] = abs(127 - i)
             self.square_lut[i] *= self.square_lut[i]
 
+        # Radios opened by this helper, and the cross-receiver frame dedup
+        self.receivers = []
+        self.dedup = None
+
         # We're usually not remote
         self.proberet = None
 
@@ -160,7 +466,7 @@ class KismetRtladsb(object):
 
     async def __rtl_adsb_task(self):
         """
-        asyncio task that consumes the output from the radio
+        asyncio task that consumes the output from the radios
         """
         print_stderr = False
 
@@ -169,96 +475,143 @@ class KismetRtladsb(object):
 
         try:
             while not self.kismet.kill_ioloop:
-                msg = await self.message_queue.get()
+                # Only wake on a timer while frames are waiting out the dedup window
+                timeout = None
+                if len(self.dedup):
+                    timeout = self.dedup.window
 
-                if not msg:
-                    break
+                try:
+                    msg = await asyncio.wait_for(self.message_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    msg = None
 
-                output = {}
+                if msg is not None:
+                    (receiver, frame, level, ts) = msg
+                    self.dedup.add(frame, receiver, level, ts)
 
-                msgtype = self.adsb_msg_get_type(msg)
-                msgbits = self.adsb_len_by_type(msgtype)
-                msgcrc = self.adsb_msg_get_crc(msg, msgbits)
-                msgcrc2 = self.adsb_crc(msg, msgbits)
+                for entry in self.dedup.expire(time.monotonic()):
+                    output = self.adsb_decode_frame(entry['frame'])
 
-                output['adsb_msg_type'] = msgtype
-                output['adsb_raw_msg'] = msg.hex()
-                output['crc_valid'] = False
+                    signal = max(entry['signals'].values())
+                    output['signal'] = signal
 
-                if msgcrc != msgcrc2:
-                    if msgtype == 11 or msgtype == 17:
-                        msg2 = self.adsb_msg_fix_single_bit(msg, msgbits)
+                    if len(self.receivers) > 1:
+                        output['receivers'] = entry['signals']
      
-                        if msg2 != None:
-                            msg = msg2
-                            output['crc_valid'] = True
-                            output['crc_recovered'] = 1
-                else:
+                    if print_stderr:
+                        print(output, file=sys.stderr)
+
+                    l = json.dumps(output)
+
+                    if not self.handle_json(l, signal):
+                        raise RuntimeError('could not process response from rtladsb')
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            print("An error occurred reading from the rtlsdr; is your USB device plugged in?  Make sure that no other programs are using this rtlsdr radio.", file=sys.stderr);
+
+            self.kismet.send_datasource_error_report(message = "Error handling ADSB: {}".format(e))
+
+        finally:
+            self.kill_adsb()
+            self.kismet.spindown()
+            return
+
+    def adsb_decode_frame(self, msg):
+        """
+        Decode a raw frame into the JSON record Kismet expects from rtladsb
+        """
+        output = {}
+
+        msgtype = self.adsb_msg_get_type(msg)
+        msgbits = self.adsb_len_by_type(msgtype)
+        msgcrc = self.adsb_msg_get_crc(msg, msgbits)
+        msgcrc2 = self.adsb_crc(msg, msgbits)
+
+        output['adsb_msg_type'] = msgtype
+        output['adsb_raw_msg'] = msg.hex()
+        output['crc_valid'] = False
+
+        if msgcrc != msgcrc2:
+            if msgtype == 11 or msgtype == 17:
+                msg2 = self.adsb_msg_fix_single_bit(msg, msgbits)
+
+                if msg2 != None:
+                    msg = msg2
                     output['crc_valid'] = True
+                    output['crc_recovered'] = 1
+        else:
+            output['crc_valid'] = True
 
-                # Process valid messages
-                if output['crc_valid']:
-                    output['adsb_msg'] = msg.hex()
+        # Process valid messages
+        if output['crc_valid']:
+            output['adsb_msg'] = msg.hex()
 
-                    msgicao = self.adsb_msg_get_icao(msg).hex()
+            msgicao = self.adsb_msg_get_icao(msg).hex()
 
-                    output['icao'] = msgicao
+            output['icao'] = msgicao
 
-                    if msgtype == 17:
-                        msgme, msgsubme = self.adsb_msg_get_me_subme(msg)
+            if msgtype == 17:
+                msgme, msgsubme = self.adsb_msg_get_me_subme(msg)
 
-                        if msgme >= 1 and msgme <= 4:
-                            msgflight = self.adsb_msg_get_flight(msg)
-                            output['callsign'] = msgflight
+                if msgme >= 1 and msgme <= 4:
+                    msgflight = self.adsb_msg_get_flight(msg)
+                    output['callsign'] = msgflight
 
-                        elif msgme >= 9 and msgme <= 18:
-                            msgalt = self.adsb_msg_get_ac12_altitude(msg)
-                            output['altitude'] = msgalt
+                elif msgme >= 9 and msgme <= 18:
+                    msgalt = self.adsb_msg_get_ac12_altitude(msg)
+                    output['altitude'] = msgalt
 
-                            msgpair, msglat, msglon = self.adsb_msg_get_airborne_position(msg)
-                            output['coordpair_even'] = msgpair
-                            output['raw_lat'] = msglat
-                            output['raw_lon'] = msglon
+                    msgpair, msglat, msglon = self.adsb_msg_get_airborne_position(msg)
+                    output['coordpair_even'] = msgpair
+                    output['raw_lat'] = msglat
+                    output['raw_lon'] = msglon
 
-                        elif msgme == 19 and (msgsubme >= 1 and msgsubme <= 4):
-                            if msgsubme == 1 or msgsubme == 2:
-                                msgvelocity = self.adsb_msg_get_airborne_velocity(msg)
-                                msgheading = self.adsb_msg_get_airborne_heading(msg)
+                elif msgme == 19 and (msgsubme >= 1 and msgsubme <= 4):
+                    if msgsubme == 1 or msgsubme == 2:
+                        msgvelocity = self.adsb_msg_get_airborne_velocity(msg)
+                        msgheading = self.adsb_msg_get_airborne_heading(msg)
 
-                                output['speed'] = msgvelocity
-                                output['heading'] = msgheading
-                            elif msgsubme == 3 or msgsubme == 4:
-                                msgheadvalid, msgheading = self.adsb_msg_get_airborne_heading(msg)
-                                if msgheadvalid:
-                                    out['heading'] = heading
-            
-                    elif msgtype == 0 or msgtype == 4 or msgtype == 16 or msgtype == 20:
-                        msgalt = self.adsb_msg_get_ac13_altitude(msg)
-                        output['altitude'] = msgalt
+                        output['speed'] = msgvelocity
+                        output['heading'] = msgheading
+                    elif msgsubme == 3 or msgsubme == 4:
+                        msgheadvalid, msgheading = self.adsb_msg_get_sub3_heading(msg)
+                        if msgheadvalid:
+                            output['heading'] = msgheading
 
-                if print_stderr:
-                    print(output, file=sys.stderr)
+            elif msgtype == 0 or msgtype == 4 or msgtype == 16 or msgtype == 20:
+                msgalt = self.adsb_msg_get_ac13_altitude(msg)
+                output['altitude'] = msgalt
 
-                l = json.dumps(output)
+        return output
 
-                if not self.handle_json(l):
-                    raise RuntimeError('could not process response from rtladsb')
-        except Exception as e:
-            traceback.print_exc(file=sys.stderr)
-            print("An error occurred reading from the rtlsdr; is your USB device plugged in?  Make sure that no other programs are using this rtlsdr radio.", file=sys.stderr);
+    def post_frame(self, receiver, frame, level):
+        # Called from the capture thread of a receiver; the dedup table lives
+        # on the asyncio loop so hand the frame across safely
+        try:
+            self.kismet.get_loop().call_soon_threadsafe(self.message_queue.put_nowait,
+                    (receiver.name, frame, level, time.monotonic()))
+        except RuntimeError:
+            # Loop is already closed, we're shutting down
+            pass
 
-            self.kismet.send_datasource_error_report(message = "Error handling ADSB: {}".format(e))
+    def receiver_error(self, receiver, e):
+        # Losing one radio of several is not fatal to the source
+        if len([r for r in self.receivers if r.running]) > 1:
+            self.kismet.send_message(f"Error reading from RTLSDR {receiver.name}: {e}", self.kismet.MSG_ERROR)
+        else:
+            self.kismet.send_datasource_error_report(message = f"Error reading from RTLSDR {receiver.name}: {e}")
 
-        finally:
-            self.kill_adsb()
-            self.kismet.spindown()
+    def receiver_stopped(self, receiver):
+        if len([r for r in self.receivers if r.running]):
             return
 
+        # Always make sure we die when the last radio is gone
+        self.kill_adsb()
+        self.kismet.spindown()
+
     def kill_adsb(self):
-        try:
-            self.rtlsdr.rtl_cancel_async(self.rtlradio)
-        except:
-            pass
+        for r in self.receivers:
+            r.kill()
 
     def run_rtladsb(self):
         self.kismet.add_exit_callback(self.kill_adsb)
@@ -339,6 +692,28 @@ class KismetRtladsb(object):
         ret['success'] = True
         return ret
 
+    def __find_rtl_device(self, devselector):
+        """
+        Find a radio by index or serial number; returns the device index or -1
+        """
+        # Try to find the device as an index
+        try:
+            intnum = int(devselector)
+
+            # Abort if we're not w/in the range
+            if intnum >= self.rtlsdr.rtl_get_device_count():
+                raise ValueError("n/a")
+
+            # Otherwise we've found a device
+            return intnum
+
+        except ValueError:
+            # A value error means we just need to look at it as a serial number
+            pass
+
+        # Try it as a serial number
+        return self.rtlsdr.rtl_get_index_by_serial(devselector.encode('utf-8'))
+
     def datasource_opensource(self, source, options):
         ret = {}
 
@@ -355,40 +730,37 @@ class KismetRtladsb(object):
             ret["message"] = "could not find librtlsdr, unable to configure rtlsdr interfaces"
             return ret
 
-        # Device selector could be integer position, or it could be a serial number
+        # Device selector could be integer position, or it could be a serial number;
+        # additional radios for this helper come from the 'devices' option
         devselector = source[8:]
-        found_interface = False
-        intnum = -1
 
-        # Try to find the device as an index
-        try:
-            intnum = int(devselector)
+        devselectors = [devselector]
 
-            # Abort if we're not w/in the range
-            if intnum >= self.rtlsdr.rtl_get_device_count():
-                raise ValueError("n/a")
+        if 'devices' in options:
+            for d in options['devices'].split(','):
+                d = d.strip()
+                if len(d) and not d in devselectors:
+                    devselectors.append(d)
 
-            # Otherwise we've found a device
-            found_interface = True
+        devices = []
 
-        except ValueError:
-            # A value error means we just need to look at it as a device num
-            pass
-        except:
-            # Otherwise something failed in querying the hw at a deeper level
-            ret["success"] = False
-            ret["message"] = "could not find rtlsdr device"
-            return ret
+        for d in devselectors:
+            try:
+                intnum = self.__find_rtl_device(d)
+            except:
+                # Otherwise something failed in querying the hw at a deeper level
+                ret["success"] = False
+                ret["message"] = "could not find rtlsdr device"
+                return ret
 
-        # Try it as a serial number
-        if not found_interface:
-            intnum = self.rtlsdr.rtl_get_index_by_serial(devselector.encode('utf-8'))
+            # We've failed as both a serial and as an index, give up
+            if intnum < 0:
+                ret['success'] = False
+                ret['message'] = "Could not find rtl-sdr device {}".format(d)
+                return ret
 
-        # We've failed as both a serial and as an index, give up
-        if intnum < 0:
-            ret['success'] = False
-            ret['message'] = "Could not find rtl-sdr device {}".format(devselector)
-            return ret
+            if not intnum in [x[1] for x in devices]:
+                devices.append((d, intnum))
 
         if 'debug' in options:
             if options['debug'] == 'True' or options['debug'] == 'true':
@@ -407,6 +779,16 @@ class KismetRtladsb(object):
         if 'gain' in options:
             self.opts['gain'] = options['gain']
 
+        if 'dedup_window' in options:
+            try:
+                self.opts['dedup_window'] = float(options['dedup_window'])
+            except ValueError:
+                ret['success'] = False
+                ret['message'] = "Could not parse dedup_window {}, expected seconds".format(options['dedup_window'])
+                return ret
+
+        (devselector, intnum) = devices[0]
+
         ret['hardware'] = self.rtlsdr.rtl_get_device_name(intnum)
         if ('uuid' in options):
             ret['uuid'] = options['uuid']
@@ -417,7 +799,21 @@ class KismetRtladsb(object):
 
         self.opts['device'] = intnum
 
-        (ret['success'], ret['message']) = self.open_radio(self.opts['device'])
+        # Copies of a frame from multiple radios arrive within a few ms of each
+        # other; with a single radio there is nothing to wait for
+        window = self.opts['dedup_window']
+        if window is None:
+            if len(devices) > 1:
+                window = 0.1
+            else:
+                window = 0
+
+        self.dedup = AdsbFrameDedup(window)
+
+        for (d, i) in devices:
+            self.receivers.append(RtladsbReceiver(self, i, f"rtl-{d}"))
+
+        (ret['success'], ret['message']) = self.open_radios()
 
         if not ret['success']:
             return ret
@@ -431,7 +827,7 @@ class KismetRtladsb(object):
 
         return {"success": True}
 
-    def handle_json(self, injson):
+    def handle_json(self, injson, signal_dbm=None):
         try:
             j = json.loads(injson)
             r = json.dumps(j)
@@ -447,7 +843,13 @@ class KismetRtladsb(object):
 
             # print("python sending json report", r);
 
-            self.kismet.send_datasource_data_report(full_json=report)
+            if signal_dbm is not None:
+                signal = kismetexternal.datasource_pb2.SubSignal()
+                signal.signal_dbm = signal_dbm
+
+                self.kismet.send_datasource_data_report(full_json=report, full_signal=signal)
+            else:
+                self.kismet.send_datasource_data_report(full_json=report)
         except ValueError as e:
             self.kismet.send_datasource_error_report(message = "Could handle JSON output")
             return False
@@ -457,171 +859,13 @@ class KismetRtladsb(object):
 
         return True
 
-    # Raw ADSB decode of the IQ data and manchester encoded data,
-    # turning it into packets.  Referenced from the rtl_adsb implementation
-    # but rewritten for numpy and other python semantics
-    def _iq_magnitude(self, buf, buflen):
-        """
-        Convert IQ to magnitude
-        """
-
-        nb = np.ctypeslib.as_array(buf, shape=(buflen,)).astype(np.uint8)
-
-        self.magnitude_buf = np.add(self.square_lut[nb[::2]], self.square_lut[nb[1::2]])
-        # self.magnitude_buf = ((np.abs(127 - nb[::2]) ** 2) + (np.abs(127 - nb[1::2]) ** 2))
-
-    def _single_manchester(self, a, b, c, d):
-        bit_p = a > b
-        bit = c > d
-
-        if bit and bit_p and c > b:
-            return 1
-        if bit and not bit_p and d < b:
-            return 1
-        if not bit and bit_p and d > b:
-            return 0
-        if not bit and not bit_p and c < b:
-            return 0
-
-        return None
-
-    def _adsb_preamble(self, buf, i):
-        low = 0
-        high = 65535
-
-        for i2 in range(0, self.preamble_len):
-            if i2 == 0 or i2 == 2 or i2 == 7 or i2 == 9:
-                high = buf[i + i2]
-            else:
-                low = buf[i + i2]
-
-            if high <= low:
-                return 0
-
-        return 1
-
-    def _adsb_np_preamble(self, buf, i):
-        preamble = np.array([1, 0, 1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0]) - 0.25 
-        corr = np.correlate(buf[i:], preamble)
-        return np.argmax(corr) + i
-
-    def _manchester(self):
-        a = 0
-        b = 0
-
-        i = 0
-        while True:
-            if i >= len(self.magnitude_buf) - 1:
-                break
-
-            p = self._adsb_np_preamble(self.magnitude_buf, i)
-
-            if p + self.preamble_len >= len(self.magnitude_buf):
-                break
-
-            a = self.magnitude_buf[p]
-            b = self.magnitude_buf[p + 1]
-            i = p + self.preamble_len
-
-            # # Look for a preamble
-            # for ix in range(i, (len(self.magnitude_buf) - self.preamble_len)):
-            #     if not self._adsb_preamble(self.magnitude_buf, ix):
-            #         i = ix
-            #         continue
-
-            #     a = self.magnitude_buf[ix]
-            #     b = self.magnitude_buf[ix + 1]
-            #     i = ix + self.preamble_len
-            #     break
-
-            errors = 0
-            m_i = 0
-
-            message_buf = bytearray(b'\xFF' * self.long_frame)
-
-            # Read the message until we get errors
-            for ix in range(i, len(self.magnitude_buf) - 1, 2):
-                i = ix + 1
-
-                bit = self._single_manchester(a, b, self.magnitude_buf[ix], self.magnitude_buf[ix + 1])
-
-                a = self.magnitude_buf[ix]
-                b = self.magnitude_buf[ix + 1]
-
-                if bit == None:
-                    errors += 1
-
-                    if errors > self.allowed_errors:
-                        message_buf = message_buf[:m_i]
-                        break
-                    else:
-                        if a > b:
-                            bit = 1
-                        else:
-                            bit = 0
-                        a = 0
-                        b = 65535
-
-                message_buf[m_i] = bit
-                m_i = m_i + 1
-
-                if m_i >= self.long_frame:
-                    break
-
-            if m_i < self.short_frame:
-                continue
-            self._adsb_message(message_buf)
-
-    def _adsb_message(self, message_buf):
-        msg_hdr = np.packbits(message_buf[0])
-        if msg_hdr == 0:
-            return
-
-        adsb_frame = None
-        frame_len = self.long_frame
-
-        if msg_hdr & 0x80:
-            frame_len = self.long_frame
-        else:
-            frame_len = self.short_frame
-
-        if len(message_buf) < frame_len:
-            return
-
-        adsb_frame = bytearray(np.packbits(message_buf[:frame_len]).tobytes())
-        
-        if frame_len > self.short_frame:
-            # print("*{};".format(adsb_frame.hex()))
-            self.kismet.add_task(self.message_queue.put, [adsb_frame])
-
-    def rtl_data_cb(self, buf, buflen, ctx):
-        self._iq_magnitude(buf, buflen)
-        self._manchester()
-        return 
-
-    def __async_radio_thread(self):
-        # This function blocks forever until cancelled
-        try:
-            self.rtlsdr.read_samples(self.rtl_data_cb, 12, self.usb_buf_sz)
-        except rtlsdr.RadioOperationalError as e:
-            if not self.kismet.inSpindown():
-                self.kismet.send_datasource_error_report(message = f"Error reading from RTLSDR: {e}")
-        except Exception as e:
-            self.kismet.send_datasource_error_report(message = f"Error reading from RTLSDR: {e}")
-
-        # Always make sure we die
-        self.kill_adsb()
-        self.kismet.spindown()
-
-    def open_radio(self, rnum):
-        try:
-            self.rtlsdr.open_radio(rnum, self.frequency, self.rate, gain=self.opts['gain'], autogain=True, ppm=self.opts['ppm'], biastee=self.opts['biastee'])
-        except Exception as e:
-            return [False, f"Error opening RTLSDR device: {e.args[0]}"]
-
-        self.rtl_thread = threading.Thread(target=self.__async_radio_thread)
-        self.rtl_thread.daemon = True
-        self.rtl_thread.start()
+    def open_radios(self):
+        for r in self.receivers:
+            try:
+                r.open_radio()
+            except Exception as e:
+                self.kill_adsb()
+                return [False, f"Error opening RTLSDR device {r.name}: {e.args[0]}"]
 
         return [True, ""]
 
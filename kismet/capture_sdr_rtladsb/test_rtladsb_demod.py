@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Test script for the rtladsb demodulator
+Synthesizes Mode S frames as magnitude samples, with noise and damaged bits,
+and checks the whole-frame bit slicer hands exactly the same messages on as
+the per-sample rtl_adsb loop it replaced; also checks frames are deduplicated
+across receivers but not within one
+"""
+
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from KismetCaptureRtladsb import RtladsbReceiver, AdsbFrameDedup
+
+# DF17 identification from KLM1023, a well known valid frame
+KNOWN_FRAME = bytes.fromhex("8D4840D6202CC371C32CE0576098")
+
+PREAMBLE = [1, 0, 1, 0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0]
+
+def make_receiver():
+    """A receiver without a radio, recording what it would decode"""
+    adsb = SimpleNamespace(preamble_len=16, long_frame=112, short_frame=56, allowed_errors=5)
+
+    receiver = RtladsbReceiver.__new__(RtladsbReceiver)
+    receiver.adsb = adsb
+    receiver.frames = 0
+    receiver.messages = []
+    receiver._adsb_message = lambda message_buf, start: receiver.messages.append((bytes(message_buf), start))
+
+    return receiver
+
+def reference_preamble(buf, i):
+    """Strongest preamble correlation in what's left of the buffer"""
+    preamble = np.array(PREAMBLE) - 0.25
+    corr = np.correlate(buf[i:], preamble)
+    return np.argmax(corr) + i
+
+def reference_manchester(receiver):
+    """The per-sample rtl_adsb bit loop, searching for each preamble afresh"""
+    preamble_len = receiver.adsb.preamble_len
+    long_frame = receiver.adsb.long_frame
+    short_frame = receiver.adsb.short_frame
+    buf = receiver.magnitude_buf
+
+    messages = []
+
+    i = 0
+    while True:
+        if i >= len(buf) - 1:
+            break
+
+        p = reference_preamble(buf, i)
+
+        if p + preamble_len >= len(buf):
+            break
+
+        a = buf[p]
+        b = buf[p + 1]
+        i = p + preamble_len
+
+        errors = 0
+        m_i = 0
+
+        message_buf = bytearray(b'\xFF' * long_frame)
+
+        for ix in range(i, len(buf) - 1, 2):
+            i = ix + 1
+
+            bit = receiver._single_manchester(a, b, buf[ix], buf[ix + 1])
+
+            a = buf[ix]
+            b = buf[ix + 1]
+
+            if bit == None:
+                errors += 1
+
+                if errors > receiver.adsb.allowed_errors:
+                    message_buf = message_buf[:m_i]
+                    break
+                else:
+                    if a > b:
+                        bit = 1
+                    else:
+                        bit = 0
+                    a = 0
+                    b = 65535
+
+            message_buf[m_i] = bit
+            m_i = m_i + 1
+
+            if m_i >= long_frame:
+                break
+
+        if m_i < short_frame:
+            continue
+
+        messages.append((bytes(message_buf), p))
+
+    return messages
+
+def frame_samples(frame, rng, high=9000.0, flips=0):
+    """Preamble and manchester coded bits of a frame, at 2 samples per bit"""
+    bits = np.unpackbits(np.frombuffer(frame, dtype=np.uint8))
+
+    chips = list(PREAMBLE)
+    for bit in bits:
+        chips += [1, 0] if bit else [0, 1]
+
+    samples = np.array(chips, dtype=np.float64) * high
+
+    # Make some chip pairs ambiguous
+    for j in rng.choice(len(bits), size=flips, replace=False):
+        pos = 16 + 2 * j
+        samples[pos] = samples[pos + 1] = high / 2
+
+    return samples
+
+def build_buffer(rng, frames, gap=600, noise=400.0):
+    """Frames separated by noise, as magnitudes of I^2 + Q^2"""
+    parts = []
+
+    for f in frames:
+        parts.append(rng.uniform(0, noise, gap))
+        parts.append(f + rng.uniform(0, noise, len(f)))
+
+    parts.append(rng.uniform(0, noise, gap))
+
+    return np.minimum(np.concatenate(parts), 32768.0)
+
+def check_same(receiver, label):
+    receiver.messages = []
+    receiver._manchester()
+
+    expected = reference_manchester(receiver)
+
+    assert receiver.messages == expected, f"{label}: {len(receiver.messages)} messages, expected {len(expected)}"
+
+    return expected
+
+def test_clean_frames():
+    """Test clean frames decode, and match the per-sample loop"""
+    print("Testing clean frames...")
+
+    rng = np.random.default_rng(1)
+    receiver = make_receiver()
+
+    receiver.magnitude_buf = build_buffer(rng, [frame_samples(KNOWN_FRAME, rng)])
+    messages = check_same(receiver, "clean")
+
+    assert len(messages) >= 1
+    assert bytes(np.packbits(np.frombuffer(messages[0][0], dtype=np.uint8))) == KNOWN_FRAME
+
+    print("✅ Clean frames: OK")
+
+def test_damaged_frames():
+    """Test frames with ambiguous bits, within and beyond the error limit"""
+    print("Testing damaged frames...")
+
+    rng = np.random.default_rng(2)
+    receiver = make_receiver()
+
+    for flips in (1, 3, 5, 6, 20):
+        frames = [frame_samples(KNOWN_FRAME, rng, flips=flips) for _ in range(3)]
+        receiver.magnitude_buf = build_buffer(rng, frames)
+        check_same(receiver, f"{flips} flipped")
+
+    print("✅ Damaged frames: OK")
+
+def test_noise_and_edges():
+    """Test pure noise, and frames cut off by the end of the buffer"""
+    print("Testing noise and buffer edges...")
+
+    rng = np.random.default_rng(3)
+    receiver = make_receiver()
+
+    for seed in range(20):
+        receiver.magnitude_buf = rng.uniform(0, 32768, 4096)
+        check_same(receiver, f"noise {seed}")
+
+    frame = frame_samples(KNOWN_FRAME, rng)
+
+    for cut in (10, 16, 17, 60, 127, 128, 200, len(frame) - 1):
+        receiver.magnitude_buf = np.concatenate([rng.uniform(0, 400, 300), frame[:cut]])
+        check_same(receiver, f"cut at {cut}")
+
+    print("✅ Noise and buffer edges: OK")
+
+def test_speed():
+    """Report how much faster demodulating a USB buffer is"""
+    print("Testing demodulator speed...")
+
+    rng = np.random.default_rng(4)
+    receiver = make_receiver()
+
+    # One USB transfer worth of magnitudes, busy with traffic
+    frames = [frame_samples(KNOWN_FRAME, rng, flips=rng.integers(0, 4)) for _ in range(80)]
+    receiver.magnitude_buf = build_buffer(rng, frames, gap=1400)[:131072]
+
+    start = time.perf_counter()
+    receiver._manchester()
+    fast = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = reference_manchester(receiver)
+    slow = time.perf_counter() - start
+
+    assert receiver.messages == expected
+
+    print(f"📊 {len(expected)} messages: {slow * 1000:.1f}ms per-sample, {fast * 1000:.1f}ms whole-frame")
+    print("✅ Demodulator speed: OK")
+
+def test_dedup():
+    """Test copies from other receivers merge, and repeats from one receiver don't"""
+    print("Testing receiver dedup...")
+
+    dedup = AdsbFrameDedup(0.1)
+    all_call = bytearray.fromhex("5D4840D6F1D0B7")
+
+    assert dedup.add(KNOWN_FRAME, "rtl0", -20.0, 10.00)
+    assert not dedup.add(KNOWN_FRAME, "rtl1", -12.0, 10.01), "Copy from another receiver reported"
+    assert dedup.add(all_call, "rtl0", -20.0, 10.02)
+
+    # The same receiver hearing a frame again is a new transmission, and the
+    # other receiver's copy of it joins the new entry
+    assert dedup.add(all_call, "rtl0", -21.0, 10.05), "Repeat from the same receiver dropped"
+    assert not dedup.add(all_call, "rtl1", -15.0, 10.06)
+    assert dedup.add(KNOWN_FRAME, "rtl1", -13.0, 10.07), "Repeat from the second receiver dropped"
+
+    assert len(dedup) == 4 and (dedup.frames, dedup.duplicates) == (4, 2)
+
+    ready = dedup.expire(10.125)
+    assert [(bytes(e['frame']), e['signals']) for e in ready] == [
+            (bytes(KNOWN_FRAME), {"rtl0": -20.0, "rtl1": -12.0}),
+            (bytes(all_call), {"rtl0": -20.0})], ready
+
+    ready = dedup.expire(10.2)
+    assert [(bytes(e['frame']), e['signals']) for e in ready] == [
+            (bytes(all_call), {"rtl0": -21.0, "rtl1": -15.0}),
+            (bytes(KNOWN_FRAME), {"rtl1": -13.0})], ready
+
+    assert not len(dedup) and not len(dedup.latest), "Expired frames still tracked"
+    assert dedup.add(KNOWN_FRAME, "rtl0", -20.0, 10.3)
+
+    print("✅ Receiver dedup: OK")
+
+def run_all_tests():
+    print("🧪 Running rtladsb demodulator tests\n")
+
+    tests = [
+        test_clean_frames,
+        test_damaged_frames,
+        test_noise_and_edges,
+        test_speed,
+        test_dedup,
+    ]
+
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+
+    print(f"\n📊 Results: {passed}/{len(tests)} tests passed")
+
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    sys.exit(0 if run_all_tests() else 1)
@@ -9,6 +9,15 @@ Accepts standard options:
 Additionally accepts:
     ppm     error offset 
     gain    fixed gain 
+    protocols   comma separated list of meter protocols to decode, from
+                scm, scm+, and idm (default all); for example
+                protocols="scm,scm+"
+    heartbeat   seconds between reports of a meter whose readings haven't
+                changed (default 300, 0 reports every message)
+    meter_expire    seconds after which a meter we no longer hear is
+                forgotten (default 3600)
+    invalid_interval    seconds between summaries of messages which failed
+                their checksum (default 60, 0 reports every message)
 
 """
 
@@ -33,73 +42,875 @@ import subprocess
 import sys
 import threading
 import time
+import traceback
 import uuid
 
 from . import rtlsdr
 from . import kismetexternal
 
-class KismetRtlamr(object):
-    def __init__(self):
-        self.opts = {}
-
-        self.opts['channel'] = "912.600MHz"
-        self.opts['gain'] = -1
-        self.opts['ppm'] = 0
-        self.opts['device'] = None
-        self.opts['debug'] = None
-        self.opts['biastee'] = -1
+class AmrProtocol(object):
+    """
+    One ERT message format, matched against the bitstream shared by every
+    protocol.  Subclasses describe the sync word and message length and decode
+    a batch of candidate messages.
+    """
 
-        self.kismet = None
+    # Name used in the protocols= option and the report type
+    name = None
 
-        self.frequency = 912600000
-        self.rate = 2359000
-        self.usb_buf_sz = 16 * 16384
+    # Sync word and its length in bits, before manchester encoding
+    sync = 0
+    sync_bits = 0
 
-        # At our given rate, we're 72 samples per symbol
-        self.symbol_len = 72
+    # Bits decoded per message
+    message_bits = 0
 
-        # Messages are 12 bytes
-        self.message_len_b = 12
+    # Symbols of the preamble used for the correlation search; the rest are
+    # compared after
+    search_symbols = None
 
-        # With manchester doubling the bits, get the len in samples
-        self.message_len_s = 2 * self.message_len_b * self.symbol_len
+    def __init__(self, demod):
+        syncbits = [(self.sync >> (self.sync_bits - 1 - b)) & 1 for b in range(self.sync_bits)]
 
         # Preamble taken before the manchester decode
-        self.scm_preamble = np.array([1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 0, 1, 0, 1, 1, 0, 0, 1, 1, 0, 0, 1, 1, 0, 0, 1, 0, 1, 1, 0, 1, 0, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, ])
-        self.scm_preamble_len = len(self.scm_preamble)
-        self.scm_preamble_len_s = self.scm_preamble_len * self.symbol_len
+        self.preamble = np.array([c for b in syncbits for c in ((1, 0) if b else (0, 1))])
+        self.preamble_len = len(self.preamble)
+        self.reduced_preamble_l = demod.reduced_w * self.preamble_len
+
+        # Symbols (pre-manchester, one per symbol) we decode for each message, and
+        # the span of the reduced bitstream they occupy
+        self.frame_bits = 2 * self.message_bits
+        self.frame_span = self.frame_bits * demod.reduced_w
+
+        search = self.preamble
+        if self.search_symbols is not None:
+            search = search[:self.search_symbols]
+
+        # Search template in +/-1 form, reversed for correlation.  Only the
+        # center sample of each symbol is weighted (the same sample reduce_bits
+        # takes), so an exact match of every search symbol correlates to the
+        # number of symbols no matter how noisy the samples on the edges are
+        template = np.zeros(len(search) * demod.reduced_w)
+        template[int(demod.reduced_w / 2)::demod.reduced_w] = 2.0 * search - 1.0
+        self.search_template = template[::-1]
+        self.search_template_l = len(self.search_template)
+        self.search_template_bits = len(search)
+
+        # Template spectra, cached by FFT size
+        self.search_template_fft = {}
+
+        self.demod = demod
+
+    def template_fft(self, nfft):
+        template_fft = self.search_template_fft.get(nfft)
+
+        if template_fft is None:
+            template_fft = np.fft.rfft(self.search_template, nfft)
+            self.search_template_fft[nfft] = template_fft
+
+        return template_fft
+
+    def decode(self, msgbytes):
+        """
+        Decode a batch of messages, one per row of msgbytes.  Returns a list
+        with a report dict per row, or None for fragments too broken to report.
+        """
+        raise NotImplementedError
+
+class ScmProtocol(AmrProtocol):
+    """
+    Standard Consumption Message, 96 bits with a BCH checksum
+    """
+    name = "scm"
+    sync = 0x1F2A60
+    sync_bits = 21
+    message_bits = 14 * 8
+    search_symbols = 16
+
+    def decode(self, msgbytes):
+        # SCM frame format
+        # [  0 : 21 ] 21 Sync / RF Preamble 1F2A60
+        # [ 21 : 23 ] 2  ID MSB
+        # [ 23      ] 1  Reserved
+        # [ 24 : 26 ] 2  Physical tamper
+        # [ 26 : 30 ] 4  Endpoint type
+        # [ 30 : 32 ] 2  Endpoint tamper
+        # [ 32 : 56 ] 24 Consumption value
+        # [ 56 : 80 ] 24 ID LSB
+        # [ 80 : 96 ] 16 Checksum
+
+        checksum = self.demod.bytes_to_int(msgbytes, 10, 12)
+        calc_checksum = self.demod.bch_checksum(msgbytes[:, 2:10])
+        valid = checksum == calc_checksum
+
+        # The checksummed span as one integer per message; every field lives in
+        # it so they can all be extracted with shifts across the whole batch
+        body = self.demod.bytes_to_int(msgbytes, 2, 10)
+
+        def field(start, end):
+            return (body >> np.uint64(80 - end)) & np.uint64((1 << (end - start)) - 1)
+
+        meterid = (field(21, 23) << np.uint64(24)) | field(56, 80)
+        metertype = field(26, 30)
+        consumption = field(32, 56)
+        phytamper = field(24, 26)
+        endptamper = field(30, 32)
+
+        reports = []
+
+        for m in range(len(msgbytes)):
+            # Anything with a checksum of 0 is summarily useless, don't even report it, it's
+            # a malformed fragment
+            if checksum[m] == 0:
+                reports.append(None)
+                continue
+
+            report_msg = {
+                    "amr_scm": msgbytes[m].tobytes().hex(),
+                    "valid": False,
+                    "type": "SCM",
+                    }
+
+            # Bounce invalid messages but report the signal anyhow
+            if valid[m]:
+                report_msg["valid"] = True
+                report_msg["meterid"] = int(meterid[m])
+                report_msg["metertype"] = int(metertype[m])
+                report_msg["consumption"] = int(consumption[m])
+                report_msg["phytamper"] = int(phytamper[m])
+                report_msg["endptamper"] = int(endptamper[m])
+
+            reports.append(report_msg)
+
+        return reports
+
+class ScmPlusProtocol(AmrProtocol):
+    """
+    SCM+, 128 bits with a CRC-16
+    """
+    name = "scm+"
+    sync = 0x16A3
+    sync_bits = 16
+    message_bits = 16 * 8
+
+    protocol_id = 0x1E
+
+    def decode(self, msgbytes):
+        # SCM+ frame format, in bytes
+        # [  0 :  2 ] Sync 16A3
+        # [  2      ] Protocol ID 1E
+        # [  3      ] Endpoint type
+        # [  4 :  8 ] Endpoint ID
+        # [  8 : 12 ] Consumption value
+        # [ 12 : 14 ] Tamper
+        # [ 14 : 16 ] CRC-16
+
+        valid = self.demod.crc16_residue(msgbytes[:, 2:16])
+
+        endpointid = self.demod.bytes_to_int(msgbytes, 4, 8)
+        consumption = self.demod.bytes_to_int(msgbytes, 8, 12)
+        tamper = self.demod.bytes_to_int(msgbytes, 12, 14)
+
+        reports = []
+
+        for m in range(len(msgbytes)):
+            # The sync word alone is short and also starts IDM; anything without
+            # the SCM+ protocol ID is a fragment
+            if msgbytes[m, 2] != self.protocol_id:
+                reports.append(None)
+                continue
+
+            report_msg = {
+                    "amr_scmplus": msgbytes[m].tobytes().hex(),
+                    "valid": False,
+                    "type": "SCM+",
+                    }
+
+            if valid[m]:
+                report_msg["valid"] = True
+                report_msg["meterid"] = int(endpointid[m])
+                report_msg["metertype"] = int(msgbytes[m, 3])
+                report_msg["consumption"] = int(consumption[m])
+                report_msg["tamper"] = int(tamper[m])
+
+            reports.append(report_msg)
+
+        return reports
+
+class IdmProtocol(AmrProtocol):
+    """
+    Interval Data Message, 92 bytes with a CRC-16
+    """
+    name = "idm"
+    sync = 0x555516A3
+    sync_bits = 32
+    message_bits = 92 * 8
+
+    packet_type = 0x1C
+
+    # Differential consumption intervals, packed 9 bits each from byte 33
+    intervals = 47
+    interval_bits = 9
+
+    def decode(self, msgbytes):
+        # IDM frame format, in bytes
+        # [  0 :  4 ] Sync 555516A3
+        # [  4      ] Packet type 1C
+        # [  5      ] Packet length
+        # [  6      ] Hamming code
+        # [  7      ] Application version
+        # [  8      ] ERT type (low nibble)
+        # [  9 : 13 ] ERT serial number
+        # [ 13      ] Consumption interval count
+        # [ 14      ] Module programming state
+        # [ 15 : 21 ] Tamper counters
+        # [ 21 : 23 ] Asynchronous counters
+        # [ 23 : 29 ] Power outage flags
+        # [ 29 : 33 ] Last consumption count
+        # [ 33 : 86 ] Differential consumption intervals, 47 x 9 bits
+        # [ 86 : 88 ] Transmit time offset
+        # [ 88 : 90 ] Serial number CRC
+        # [ 90 : 92 ] Packet CRC-16
+
+        valid = self.demod.crc16_residue(msgbytes[:, 4:92])
+
+        serial = self.demod.bytes_to_int(msgbytes, 9, 13)
+        consumption = self.demod.bytes_to_int(msgbytes, 29, 33)
+        txoffset = self.demod.bytes_to_int(msgbytes, 86, 88)
+
+        # Unpack the 9 bit intervals for the whole batch at once
+        interval_bits = np.unpackbits(msgbytes[:, 33:86], axis=1)[:, :self.intervals * self.interval_bits]
+        weights = 1 << np.arange(self.interval_bits - 1, -1, -1)
+        intervals = (interval_bits.reshape(-1, self.intervals, self.interval_bits) * weights).sum(axis=2)
+
+        reports = []
+
+        for m in range(len(msgbytes)):
+            if msgbytes[m, 4] != self.packet_type:
+                reports.append(None)
+                continue
+
+            report_msg = {
+                    "amr_idm": msgbytes[m].tobytes().hex(),
+                    "valid": False,
+                    "type": "IDM",
+                    }
+
+            if valid[m]:
+                report_msg["valid"] = True
+                report_msg["meterid"] = int(serial[m])
+                report_msg["metertype"] = int(msgbytes[m, 8] & 0x0F)
+                report_msg["consumption"] = int(consumption[m])
+                report_msg["intervalcount"] = int(msgbytes[m, 13])
+                report_msg["tampercounters"] = msgbytes[m, 15:21].tobytes().hex()
+                report_msg["poweroutageflags"] = msgbytes[m, 23:29].tobytes().hex()
+                report_msg["intervals"] = intervals[m].tolist()
+                report_msg["txtimeoffset"] = int(txoffset[m])
+
+            reports.append(report_msg)
+
+        return reports
+
+# Protocols the demod can match, by protocols= option name
+AMR_PROTOCOLS = {
+        ScmProtocol.name: ScmProtocol,
+        ScmPlusProtocol.name: ScmPlusProtocol,
+        IdmProtocol.name: IdmProtocol,
+        }
+
+class AmrDsp(object):
+    """
+    Magnitude, filter, and quantize stages of the demod, run in place in
+    float32 work buffers allocated once and sized for the USB buffer plus the
+    history carried between buffers.
+
+    The bitstream is only ever sampled at the decimated positions, so only the
+    magnitudes feeding the symbol filter at those positions are computed; the
+    filtered, decimated magnitude is the stream state carried across buffers.
+    """
+    def __init__(self, decimation, filter_w, average_w, history, buf_sz):
+        self.decimation = decimation
+        self.filter_w = filter_w
+
+        # IQ bytes per decimated sample
+        self.block_b = 2 * decimation
+
+        # Message-width average, in decimated samples
+        self.average_d = max(1, int(average_w / decimation))
+
+        # Decimated samples we may carry between buffers
+        self.history = history + self.average_d
 
         # Generate the normalized squares for converting IQ via lookup
-        self.square_lut = np.zeros(256)
+        self.square_lut = np.zeros(256, dtype=np.float32)
         for i in range(0, 256):
             self.square_lut[i] = (127.5 - float(i)) / 127.5
             self.square_lut[i] *= self.square_lut[i]
 
+        # Partial block left over from the previous buffer
+        self.carry = np.zeros(self.block_b, dtype=np.uint8)
+        self.carry_len = 0
+
+        self.capacity = 0
+        self._allocate(self.history + int(buf_sz / self.block_b) + 1)
+
+        self.reset()
+
+    def _allocate(self, capacity):
+        old = None
+        if self.capacity:
+            old = self.mag[:self.length]
+
+        self.capacity = capacity
+
+        # IQ bytes feeding each decimated sample, widened once to index the
+        # lookup table, and their squares
+        self.index = np.zeros((capacity, 2 * self.filter_w), dtype=np.intp)
+        self.squares = np.zeros((capacity, 2 * self.filter_w), dtype=np.float32)
+
+        # Filtered magnitude at each decimated position, the message-width
+        # average ahead of it, and the running sum used to compute that average.
+        # The sum only ever spans one buffer plus history, well inside float32
+        # precision for a threshold.
+        self.mag = np.zeros(capacity, dtype=np.float32)
+        self.average = np.zeros(capacity, dtype=np.float32)
+        self.csum = np.zeros(capacity + 1, dtype=np.float32)
+
+        self.bits = np.zeros(capacity, dtype=np.bool_)
+
+        if old is not None:
+            self.mag[:len(old)] = old
+
+    def reset(self):
+        self.length = 0
+        self.carry_len = 0
+
+    def _filter_blocks(self, blocks):
+        """
+        Symbol filter at the start of each block of IQ, appended to the
+        decimated magnitude
+        """
+        n = len(blocks)
+
+        if self.length + n > self.capacity:
+            self._allocate(self.length + n + self.history)
+
+        index = self.index[:n]
+        squares = self.squares[:n]
+        out = self.mag[self.length:self.length + n]
+
+        # Bytes always index inside the table; mode='clip' lets take() write
+        # straight into out instead of buffering
+        np.copyto(index, blocks[:, :2 * self.filter_w])
+        np.take(self.square_lut, index, out=squares, mode='clip')
+        np.sum(squares, axis=1, out=out)
+        np.multiply(out, 1.0 / self.filter_w, out=out)
+
+        self.length += n
+
+    def push(self, buf):
+        """
+        Add a buffer of raw rtlsdr IQ bytes to the stream
+        """
+        offt = 0
+
+        # Finish the block left over from the last buffer
+        if self.carry_len:
+            offt = min(self.block_b - self.carry_len, len(buf))
+            self.carry[self.carry_len:self.carry_len + offt] = buf[:offt]
+            self.carry_len += offt
+
+            if self.carry_len < self.block_b:
+                return
+
+            self._filter_blocks(self.carry.reshape(1, self.block_b))
+            self.carry_len = 0
+
+        nblocks = int((len(buf) - offt) / self.block_b)
+
+        if nblocks:
+            end = offt + nblocks * self.block_b
+            self._filter_blocks(buf[offt:end].reshape(nblocks, self.block_b))
+            offt = end
+
+        self.carry_len = len(buf) - offt
+        self.carry[:self.carry_len] = buf[offt:]
+
+    def quantize(self):
+        """
+        Quantize the decimated stream against the average of the half message
+        following each sample; returns a view of the bitstream, or None until
+        there is enough of the stream to fill the average
+        """
+        n = self.length - self.average_d + 1
+
+        if n <= 0:
+            return None
+
+        np.cumsum(self.mag[:self.length], out=self.csum[1:self.length + 1])
+
+        average = self.average[:n]
+        np.subtract(self.csum[self.average_d:self.length + 1], self.csum[:n], out=average)
+        np.multiply(average, 1.0 / self.average_d, out=average)
+
+        np.greater(self.mag[:n], average, out=self.bits[:n])
+
+        return self.bits[:n]
+
+    def power(self, offsets, length):
+        """
+        Rough power of a span of the stream at each offset, in dBFS; valid
+        after quantize()
+        """
+        # Take a rough power estimate, we get it in dBFS; db relative to full scale.
+        # This will get treated as dbm elsewhere in kismet which is fundamentally
+        # wrong, but no more wrong than some other power measurements from other
+        # cards.  we do our best.
+        powr = (self.csum[offsets + length] - self.csum[offsets]) / length
+
+        return np.where(powr > 0, 10 * np.log10(np.maximum(powr, 1e-10)), -100).astype(int)
+
+    def consume(self, n):
+        """
+        Drop the first n decimated samples, keeping the rest for the next buffer
+        """
+        n = min(n, self.length)
+
+        if n <= 0:
+            return
+
+        self.mag[:self.length - n] = self.mag[n:self.length]
+        self.length -= n
+
+class AmrStreamDemod(object):
+    """
+    Streaming multi-protocol ERT demodulator.
+
+    The rtlsdr hands us fixed size USB buffers with no regard for where meter
+    messages fall.  Rather than demodulating each buffer on its own (losing the
+    filter warm-up at the start of every buffer and any message which straddles
+    a boundary), the demod keeps the tail of the filtered stream - enough to
+    prime the message-width average and to hold one complete message - and
+    prepends it to the next buffer, overlap-save style.  Preamble search runs
+    continuously over the stream and every message is decoded exactly once, from
+    the buffer it completes in.
+
+    Every protocol is matched against the same quantized bitstream, so a single
+    pass over the samples decodes every meter type in range.
+    """
+    def __init__(self, symbol_len = 72, decimation = 24, protocols = None, buf_sz = 16 * 16384):
+        # At our given rate, we're 72 samples per symbol
+        self.symbol_len = symbol_len
+
+        # SCM messages are 12 bytes
+        self.message_len_b = 12
+
+        # With manchester doubling the bits, get the len in samples
+        self.message_len_s = 2 * self.message_len_b * self.symbol_len
+
         # BCH checksum polynomial
         self.bch_poly = 0x6F63
+        self.bch_table = self._crc_table(self.bch_poly)
 
-        # Generate the polynomial table
-        self.bch_table = np.zeros(256).astype(np.uint16)
+        # CRC-16 CCITT for SCM+ and IDM; running the CRC over a message and its
+        # (inverted) CRC leaves a fixed residue
+        self.crc16_poly = 0x1021
+        self.crc16_init = 0xFFFF
+        self.crc16_residue_v = 0x1D0F
+        self.crc16_table = self._crc_table(self.crc16_poly)
+
+        # The higher the decimation the more CPU we save; we decimate AFTER
+        # quantization and this seems to be consistently usable with a very high
+        # dynamic range of capture
+        self.decimation = decimation
+        self.reduced_w = int(self.symbol_len / self.decimation)
+
+        if protocols is None:
+            protocols = list(AMR_PROTOCOLS.keys())
+
+        self.protocols = [AMR_PROTOCOLS[p](self) for p in protocols]
+
+        # Filter widths, in samples
+        self.filter_w = int(self.symbol_len / 8)
+        self.average_w = int(self.message_len_s * 0.5)
+
+        # The longest message decides how much of the stream we carry
+        self.max_span = max([p.frame_span for p in self.protocols])
+        self.max_template_l = max([p.search_template_l for p in self.protocols])
+
+        self.dsp = AmrDsp(self.decimation, self.filter_w, self.average_w, self.max_span, buf_sz)
+
+        self.reset()
+
+    def reset(self):
+        # How far into the stream carried from the previous buffer each protocol
+        # has already been searched, and the end of the last message decoded
+        self.dsp.reset()
+        self.search_offt = {p.name: 0 for p in self.protocols}
+        self.decoded_offt = 0
+
+    def _crc_table(self, poly):
+        table = np.zeros(256).astype(np.uint16)
         for i in range(0, 256):
             crc = i << 8
             for n in range(0, 8):
                 if not (crc & 0x8000) == 0:
-                    crc = (crc << 1) ^ self.bch_poly
+                    crc = (crc << 1) ^ poly
                 else:
                     crc = crc << 1
 
-            self.bch_table[i] = int(crc)
+            table[i] = int(crc) & 0xFFFF
 
-        # The higher the decimation the more CPU we save; we decimate AFTER
-        # quantization and this seems to be consistently usable with a very high
-        # dynamic range of capture
-        self.decimation = 24
-        self.reduced_w = int(self.symbol_len / self.decimation)
-        self.reduced_preamble_l = self.reduced_w * self.scm_preamble_len
+        return table
 
-        # Expand the preamble to fit the symbol width; we only search for the 
-        # first 16 bits then compare the rest
-        self.search_preamble = np.repeat(self.scm_preamble[:16], self.reduced_w)
+    def _crc(self, table, buf, init):
+        """
+        16 bit CRC of the last axis of buf; a 2d array of messages, one per
+        row, is checksummed in one pass, a byte at a time across every row
+        """
+        buf = np.asarray(buf, dtype=np.uint16)
+        crc = np.full(buf.shape[:-1], init, dtype=np.uint16)
+
+        for c in range(buf.shape[-1]):
+            crc = (crc << 8) ^ table[(crc >> 8) ^ buf[..., c]]
+
+        return crc
+
+    def bch_checksum(self, buf, init = 0):
+        return self._crc(self.bch_table, buf, init)
+
+    def crc16(self, buf):
+        return self._crc(self.crc16_table, buf, self.crc16_init)
+
+    def crc16_residue(self, buf):
+        """
+        Check messages which end in their CRC-16
+        """
+        return self.crc16(buf) == self.crc16_residue_v
+
+    def bytes_to_int(self, msgbytes, start, end):
+        """
+        Big endian integer from bytes [start:end] of every message in a batch
+        """
+        v = np.zeros(len(msgbytes), dtype=np.uint64)
+        for c in range(start, end):
+            v = (v << np.uint64(8)) | msgbytes[:, c].astype(np.uint64)
+
+        return v
+
+    def find_preambles(self, rs, searches):
+        """
+        Correlate the whole quantized bitstream against every protocol's
+        preamble template; the bitstream is transformed once and shared by all
+        of them.  searches is a list of (protocol, start, end), and for each a
+        list of every offset in [start, end) where the search symbols match
+        exactly is returned.
+        """
+        nfft = 1 << (len(rs) + self.max_template_l - 1).bit_length()
+        rs_fft = np.fft.rfft(2.0 * rs - 1.0, nfft)
+
+        results = []
+
+        for (proto, start, end) in searches:
+            end = min(end, len(rs) - proto.search_template_l + 1)
+
+            if end <= start:
+                results.append((proto, np.zeros(0, dtype=np.int64)))
+                continue
+
+            corr = np.fft.irfft(rs_fft * proto.template_fft(nfft), nfft)
+
+            # Full overlap of the template starts at the end of the template
+            corr = corr[proto.search_template_l - 1 + start:proto.search_template_l - 1 + end]
+
+            hits = np.flatnonzero(corr > proto.search_template_bits - 0.5)
+
+            if len(hits) < 2:
+                results.append((proto, hits + start))
+                continue
+
+            # A clean preamble matches at several adjacent offsets; take the middle
+            # of each run, the sampling phase furthest from the symbol edges
+            breaks = np.diff(hits) > 1
+            run_start = hits[np.concatenate(([True], breaks))]
+            run_end = hits[np.concatenate((breaks, [True]))]
+
+            results.append((proto, (run_start + run_end) // 2 + start))
+
+        return results
+
+    def reduce_bits(self, bits, offsets, sz):
+        """
+        Reduce the bitstream to one bit per symbol for a message at each offset,
+        returning a 2d matrix with one message per row
+        """
+        index = np.arange(sz) * self.reduced_w + int(self.reduced_w / 2)
+        return bits[offsets[:, np.newaxis] + index]
+
+    def manchester(self, bits):
+        """
+        Manchester decode a matrix of symbols, one message per row, and pack
+        it to bytes.  A 1 is sent high-low and a 0 low-high, equal halves are a
+        symbol error and come out as a 0
+        """
+        return np.packbits(bits[:, 0::2] > bits[:, 1::2], axis=1)
+
+    def process(self, buf):
+        """
+        Demodulate a buffer of raw rtlsdr IQ bytes, returning a list of report
+        dicts for the messages which completed in it
+        """
+        self.dsp.push(buf)
+
+        reports = []
+
+        # 'decimate' and quantize to a stream of bits; the bitstream returned
+        # is still expanded by the sample multiplier / the bit width
+        rs = self.dsp.quantize()
+
+        # Not enough of the stream to run the filters yet, keep accumulating
+        if rs is None:
+            return reports
+
+        # Only search offsets where the whole message is already in the buffer;
+        # anything later is picked up from the tail on the next pass
+        searches = [(p, self.search_offt[p.name], len(rs) - p.frame_span) for p in self.protocols]
+
+        candidates = []
+
+        # One correlation over the whole buffer per protocol finds every candidate;
+        # only those offsets go on to bit extraction
+        for (proto, offsets) in self.find_preambles(rs, searches):
+            if not len(offsets):
+                continue
+
+            # Convert to one bit per symbol, one candidate message per row
+            bits = self.reduce_bits(rs, offsets, proto.frame_bits)
+
+            # Compare the full preamble when we only search part of it
+            match = np.all(bits[:, :proto.preamble_len] == proto.preamble, axis=1)
+            offsets = offsets[match]
+            bits = bits[match]
+
+            if not len(offsets):
+                continue
+
+            batch = proto.decode(self.manchester(bits))
+            signal = self.dsp.power(offsets, proto.frame_span)
+
+            candidates += [(p, proto, r, pwr) for (p, r, pwr) in zip(offsets, batch, signal) if r is not None]
+
+        # Walk the candidates from every protocol in stream order, so the sync of
+        # one protocol seen inside a message of another is skipped
+        candidates.sort(key=lambda c: c[0])
+
+        i = self.decoded_offt
+
+        for (p, proto, report_msg, pwr) in candidates:
+            # Inside a message we've already decoded
+            if p < i:
+                continue
+
+            report_msg["signal"] = int(pwr)
+            reports.append(report_msg)
+
+            if report_msg["valid"]:
+                i = p + proto.frame_span
+            else:
+                i = p + proto.reduced_preamble_l
+
+        # Carry the end of the stream not yet searched for the longest message,
+        # plus the filter history it needs, into the next buffer
+        keep = max(0, len(rs) - self.max_span)
+        self.dsp.consume(keep)
+        self.decoded_offt = max(0, i - keep)
+
+        for (proto, start, end) in searches:
+            self.search_offt[proto.name] = max(0, max(start, end) - keep)
+
+        return reports
+
+class MeterTable(object):
+    """
+    Meters heard recently, keyed by protocol and meter id.
+
+    Meters repeat their consumption every few seconds; a valid message is only
+    passed on when its consumption or tamper fields have changed, or when
+    the meter hasn't been reported for the heartbeat interval.  Invalid
+    messages carry nothing but a signal level, so they're folded into one
+    summary per protocol per summary interval.
+
+    Meters we stop hearing are swept once per expire interval rather than on
+    every message, so they're forgotten between one and two intervals later.
+    """
+
+    # Fields which say something new about a meter; IDM also carries a
+    # transmit time offset and interval history which change every message
+    STATE_FIELDS = {
+            "SCM": ("metertype", "consumption", "phytamper", "endptamper"),
+            "SCM+": ("metertype", "consumption", "tamper"),
+            "IDM": ("metertype", "consumption", "tampercounters"),
+            }
+
+    def __init__(self, heartbeat, expire, summary_interval):
+        self.heartbeat = heartbeat
+        self.expire_time = expire
+        self.summary_interval = summary_interval
+
+        self.meters = {}
+        self.invalid = {}
+
+        self.last_summary = None
+        self.last_expire = None
+
+        self.stats = {
+                'valid': 0,
+                'invalid': 0,
+                'reported': 0,
+                'suppressed': 0,
+                }
+
+    def __len__(self):
+        return len(self.meters)
+
+    def meter_state(self, msg):
+        fields = self.STATE_FIELDS.get(msg["type"])
+
+        if fields is not None:
+            return tuple(msg.get(k) for k in fields)
+
+        # Everything the meter told us, minus the signal and the raw frame
+        return tuple(sorted([(k, v if not isinstance(v, list) else tuple(v))
+            for (k, v) in msg.items() if k != "signal" and not k.startswith("amr_")]))
+
+    def update(self, msg, now):
+        """
+        Add a message from the demod; returns the list of reports to send now
+        """
+        if not msg["valid"]:
+            self.stats['invalid'] += 1
+
+            if self.summary_interval <= 0:
+                self.stats['reported'] += 1
+                return [msg]
+
+            summary = self.invalid.get(msg["type"])
+
+            if summary is None:
+                summary = {"count": 0, "min": msg["signal"], "max": msg["signal"], "total": 0}
+                self.invalid[msg["type"]] = summary
+
+            summary["count"] += 1
+            summary["total"] += msg["signal"]
+            summary["min"] = min(summary["min"], msg["signal"])
+            summary["max"] = max(summary["max"], msg["signal"])
+
+            return []
+
+        self.stats['valid'] += 1
+
+        key = (msg["type"], msg["meterid"])
+        state = self.meter_state(msg)
+        meter = self.meters.get(key)
+
+        if meter is not None and meter["state"] == state and now - meter["reported"] < self.heartbeat:
+            meter["seen"] = now
+            meter["repeats"] += 1
+            self.stats['suppressed'] += 1
+            return []
+
+        if meter is not None:
+            msg["repeats"] = meter["repeats"]
+
+        self.meters[key] = {"state": state, "seen": now, "reported": now, "repeats": 0}
+        self.stats['reported'] += 1
+
+        return [msg]
+
+    def expire(self, now):
+        """
+        Forget meters we haven't heard from, and return any invalid message
+        summaries which are due
+        """
+        if self.last_expire is None:
+            self.last_expire = now
+
+        if now - self.last_expire >= self.expire_time:
+            self.last_expire = now
+
+            for key in [k for (k, m) in self.meters.items() if now - m["seen"] > self.expire_time]:
+                del self.meters[key]
+
+        if self.last_summary is None:
+            self.last_summary = now
+
+        if now - self.last_summary < self.summary_interval:
+            return []
+
+        self.last_summary = now
+
+        reports = []
+
+        for (msgtype, summary) in self.invalid.items():
+            reports.append({
+                "type": msgtype,
+                "valid": False,
+                "invalid_count": summary["count"],
+                "signal": summary["max"],
+                "signal_min": summary["min"],
+                "signal_avg": int(summary["total"] / summary["count"]),
+                })
+
+        self.invalid = {}
+        self.stats['reported'] += len(reports)
+
+        return reports
+
+    def next_timeout(self, now):
+        """
+        Seconds until expire() next has something to do
+        """
+        timeouts = []
+
+        if self.expire_time > 0:
+            if self.last_expire is None:
+                timeouts.append(self.expire_time)
+            else:
+                timeouts.append(max(0, self.last_expire + self.expire_time - now))
+
+        if self.summary_interval > 0:
+            if self.last_summary is None:
+                timeouts.append(self.summary_interval)
+            else:
+                timeouts.append(max(0, self.last_summary + self.summary_interval - now))
+
+        return min(timeouts) if timeouts else None
+
+class KismetRtlamr(object):
+    def __init__(self):
+        self.opts = {}
+
+        self.opts['channel'] = "912.600MHz"
+        self.opts['gain'] = -1
+        self.opts['ppm'] = 0
+        self.opts['device'] = None
+        self.opts['debug'] = None
+        self.opts['biastee'] = -1
+        self.opts['heartbeat'] = 300
+        self.opts['meter_expire'] = 3600
+        self.opts['invalid_interval'] = 60
+
+        self.kismet = None
+
+        # Recently heard meters, for suppressing repeated reports
+        self.meters = None
+
+        self.frequency = 912600000
+        self.rate = 2359000
+        self.usb_buf_sz = 16 * 16384
+
+        # Streaming demodulator, carries state across USB buffers
+        self.demod = AmrStreamDemod(buf_sz = self.usb_buf_sz)
 
         # We're usually not remote
         self.proberet = None
@@ -193,7 +1004,7 @@ class KismetRtlamr(object):
 
     def kill_amr(self):
         try:
-            self.rtlsdr.rtl_cancel_async(self.rtlradio)
+            self.rtlsdr.cancel()
         except:
             pass
 
@@ -345,6 +1156,33 @@ class KismetRtlamr(object):
         if 'gain' in options:
             self.opts['gain'] = options['gain']
 
+        for o in ('heartbeat', 'meter_expire', 'invalid_interval'):
+            if o in options:
+                try:
+                    self.opts[o] = float(options[o])
+                except ValueError:
+                    ret['success'] = False
+                    ret['message'] = f"Could not parse '{o}' option, expected seconds"
+                    return ret
+
+        self.meters = MeterTable(self.opts['heartbeat'], self.opts['meter_expire'], self.opts['invalid_interval'])
+
+        if 'protocols' in options:
+            protocols = [p.strip().lower() for p in options['protocols'].split(',') if len(p.strip())]
+
+            for p in protocols:
+                if not p in AMR_PROTOCOLS:
+                    ret['success'] = False
+                    ret['message'] = "Unknown meter protocol '{}', expected one of {}".format(p, ", ".join(AMR_PROTOCOLS.keys()))
+                    return ret
+
+            if not len(protocols):
+                ret['success'] = False
+                ret['message'] = "No meter protocols in 'protocols' option"
+                return ret
+
+            self.demod = AmrStreamDemod(protocols = protocols, buf_sz = self.usb_buf_sz)
+
         ret['hardware'] = self.rtlsdr.rtl_get_device_name(intnum)
         if ('uuid' in options):
             ret['uuid'] = options['uuid']
@@ -432,18 +1270,32 @@ class KismetRtlamr(object):
 
         try:
             while not self.kismet.kill_ioloop:
-                msg = await self.message_queue.get()
+                now = time.monotonic()
+
+                # Wake up for the next invalid message summary even if the band is quiet
+                try:
+                    msg = await asyncio.wait_for(self.message_queue.get(), self.meters.next_timeout(now))
+                except asyncio.TimeoutError:
+                    msg = None
+                else:
+                    if not msg:
+                        break
 
-                if not msg:
-                    break
+                now = time.monotonic()
 
-                if print_stderr:
-                    print(msg, file=sys.stderr)
+                reports = self.meters.expire(now)
 
-                l = json.dumps(msg)
+                if msg is not None:
+                    reports += self.meters.update(msg, now)
 
-                if not self.handle_json(l):
-                    raise RuntimeError('could not send rtlamr data')
+                for r in reports:
+                    if print_stderr:
+                        print(r, file=sys.stderr)
+
+                    l = json.dumps(r)
+
+                    if not self.handle_json(l):
+                        raise RuntimeError('could not send rtlamr data')
         except Exception as e:
             traceback.print_exc(file=sys.stderr)
             print("An error occurred reading from the rtlsdr; is your USB device plugged in?  Make sure that no other programs are using this rtlsdr radio.", file=sys.stderr);
@@ -459,221 +1311,22 @@ class KismetRtlamr(object):
         if buflen == 0:
             raise RuntimeError("received empty data from rtlsdr")
 
-        nb = np.ctypeslib.as_array(buf, shape=(buflen,)).astype(np.uint8)
-        self.process(nb)
-        return 
-
-    def bch_checksum(self, buf, init = 0):
-        crc = init
-
-        for b in buf:
-            crc &= 0xFFFF
-            crc = crc << 8 ^ self.bch_table[crc >> 8 ^ b]
-
-        return crc & 0xFFFF
-
-    def cumsum(self, data, w):
-        ret = np.cumsum(data)
-        ret[w:] = ret[w:] - ret[:-w]
-        return ret[w - 1:] / w
-
-    def moving_average(self, data, w):
-        return self.cumsum(data, w)
-
-    def _resample_quantize(self, buf):
-        # Trim trailing byte if we don't have even I/Q pairs
-        if len(buf) % 2 != 0:
-            buf = buf[:-1]
-
-        # Compute the magnitude and remove the DC offset using the lookup table;
-        # buf is now a real magnitude
-        buf = np.add(self.square_lut[buf[::2]], self.square_lut[buf[1::2]])
-
-        # Filter with a sub-width of the message - because we decimate AFTER
-        # quantization, we window on the original symbol length
-        r = self.moving_average(buf, int(self.symbol_len / 8))
-
-        # Sliding average across the half the message width
-        rm = self.moving_average(r, int(self.message_len_s * 0.5) )
-        r = (r[:len(rm)] - rm)[:np.newaxis]
-
-        # Quantize
-        bits = np.where(r > 0, 1, 0)
-
-        # Fake decimation of the bits themselves after the quanitization
-        bits = bits[::self.decimation]
-
-        return bits
-
-    def _power_estimate(self, buf, start_bit, sz_bits):
-        # Take a rough power estimate, we get it in dBFS; db relative to full scale.
-        # This will get treated as dbm elsewhere in kismet which is fundamentally
-        # wrong, but no more wrong than some other power measurements from other 
-        # cards.  we do our best.
-        bit_offt = start_bit * self.decimation
-        bit_len = sz_bits * self.decimation
-        powr = np.average(np.add(self.square_lut[buf[start_bit:start_bit + bit_len:2]], self.square_lut[buf[start_bit + 1:start_bit + bit_len:2]]))
-        return int(10 * math.log10(powr))
-
-    def _single_manchester(self, a, b, c, d):
-        bit_p = a > b
-        bit = c > d
+        # A view of the USB buffer, only valid for the duration of the callback;
+        # the demod copies out what it needs to keep
+        nb = np.ctypeslib.as_array(buf, shape=(buflen,))
 
-        if bit and bit_p and c > b:
-            return 1
-        if bit and not bit_p and d < b:
-            return 1
-        if not bit and bit_p and d > b:
-            return 0
-        if not bit and not bit_p and c < b:
-            return 0
+        for msg in self.demod.process(nb):
+            if self.opts['debug']:
+                print(msg)
 
-        return None
+            self.post_message(msg)
 
-    def corr_preamble(self, buf):
-        corr = np.correlate(buf, self.search_preamble)
-        return np.argmax(corr)
-
-    def get_bits_as_int(self, buf):
-        pad = len(buf) % 8
-        if pad != 0:
-            padbuf = np.array([0] * (8 - pad))
-            buf = np.append(padbuf, buf)
-
-        return int.from_bytes(np.packbits(buf), byteorder='big', signed=False)
-
-    def reduce_bits(self, bits, sz):
-        return bits[int(self.reduced_w / 2):(sz * self.reduced_w):self.reduced_w]
-
-    def process(self, buf):
-        # 'decimate' and quantize to a stream of bits; the bitstream returned
-        # is still expanded by the sample multiplier / the bit width
-        rs = self._resample_quantize(buf)
-
-        i = 0
-        while True:
-            if i + len(self.scm_preamble) >= len(rs):
-                break
-
-            # Correlate for preamble; this is one of the most expensive parts of the
-            # whole process
-            p = self.corr_preamble(rs[i:i + (self.reduced_preamble_l * 4)])
-
-            if p == None:
-                break
-
-            p = i + p
-
-            if p + (24 * 8 * self.reduced_w) < len(rs):
-                # Convert to one bit per symbol
-                bits = self.reduce_bits(rs[p:], (14 * 8 * 2))
-
-                i = p + self.reduced_preamble_l * 4
-
-                # Compare the full preamble since we only match on the first 16 bits
-                if not np.array_equal(bits[:self.scm_preamble_len], self.scm_preamble):
-                    continue
-
-                if len(bits) % 2 != 0:
-                    bits = bits[:-1]
-
-                errors = 0
-                msgbuf = np.array([0] * int(len(bits) / 2))
-                a = 0
-                b = 1
-
-                if len(bits) < (24 * 8):
-                    break
-
-                # This is the simplest way to decode manchester with no error awareness
-                # but there is no huge benefit to using it, see below
-                # msgbuf = np.where(bits[::2] > bits[1::2], 1, 0)
-
-                # This isn't the simplest way to convert to manchester, but testing
-                # shows almost no impact on CPU load between this and the simplest
-                # non-error-checking encoding method since it's called only on the
-                # resolved end-stage signal
-                for ix in range(0, len(bits), 2):
-                    bit = self._single_manchester(bits[ix], bits[ix+1], a, b)
-
-                    a = bits[ix]
-                    b = bits[ix+1]
-
-                    if bit == None:
-                        errors = errors + 1
-
-                        if errors > 5:
-                            break
-                        else:
-                            if a > b:
-                                bit = 1
-                            else:
-                                bit = 0
-
-                            a = 0
-                            b = 1
-
-                    msgbuf[int(ix / 2)] = bit
-                    i = p + ix
-               
-                # SCM frame format
-                # [  0 : 21 ] 21 Sync / RF Preamble 1F2A60
-                # [ 21 : 23 ] 2  ID MSB
-                # [ 23      ] 1  Reserved
-                # [ 24 : 26 ] 2  Physical tamper
-                # [ 26 : 30 ] 4  Endpoint type
-                # [ 30 : 32 ] 2  Endpoint tamper
-                # [ 32 : 56 ] 24 Consumption value
-                # [ 56 : 80 ] 24 ID LSB
-                # [ 80 : 96 ] 16 Checksum
-
-                msgbuf = msgbuf[1:]
-                bytestr = np.packbits(msgbuf);
-
-                report_msg = {
-                        "amr_scm": bytearray(bytestr).hex(),
-                        "valid": False,
-                        "type": "SCM",
-                        }
-
-                checksum = self.get_bits_as_int(msgbuf[80:96])
-
-                # Anything with a checksum of 0 is summarily useless, don't even report it, it's
-                # a malformed fragment
-                if checksum == 0:
-                    continue
-
-                calc_checksum = self.bch_checksum(bytestr[2:10])
-
-                # Defer power calc until we know we have something sane-ish
-                pwr = self._power_estimate(buf, p, 14*8*2)
-
-                report_msg["signal"] = pwr
-
-                # Bounce invalid messages but report the signal anyhow
-                if checksum != calc_checksum:
-                    if self.opts['debug']:
-                        print(report_msg)
-                    self.kismet.add_task(self.message_queue.put, [report_msg])
-                    continue
-
-                # Flag as valid and start populating
-                report_msg["valid"] = True
-
-                meterid = (self.get_bits_as_int(msgbuf[21:23]) << 24)
-                meterid |= self.get_bits_as_int(msgbuf[56:80])
-
-                report_msg["meterid"] = meterid
-                report_msg["metertype"] = self.get_bits_as_int(msgbuf[26:30])
-                report_msg["consumption"] = self.get_bits_as_int(msgbuf[32:56])
-                report_msg["phytamper"] = self.get_bits_as_int(msgbuf[24:26])
-                report_msg["endptamper"] = self.get_bits_as_int(msgbuf[30:32])
-                
-                if self.opts['debug']:
-                    print(report_msg)
-
-                self.kismet.add_task(self.message_queue.put, [report_msg])
-
-            else:
-                break
+        return 
 
+    def post_message(self, msg):
+        # Called from the radio thread; hand the report to the asyncio loop safely
+        try:
+            self.kismet.get_loop().call_soon_threadsafe(self.message_queue.put_nowait, msg)
+        except RuntimeError:
+            # Loop is already closed, we're shutting down
+            pass
@@ -34,20 +34,20 @@ CREATE INDEX IF NOT EXISTS idx_kismet_devices_last_updated ON kismet_devices(las
 CREATE INDEX IF NOT EXISTS idx_kismet_devices_location ON kismet_devices(latitude, longitude) WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
 
 -- Create events table for storing Kismet events
+-- (matches the table the exporter creates, which writes it with COPY)
 CREATE TABLE IF NOT EXISTS kismet_events (
-    id SERIAL PRIMARY KEY,
+    received_at TIMESTAMPTZ NOT NULL,
     event_type TEXT NOT NULL,
-    event_time TIMESTAMP DEFAULT NOW(),
-    device_mac TEXT,
-    event_data JSONB,
-    created_at TIMESTAMP DEFAULT NOW()
+    device_key TEXT,
+    mac_addr TEXT,
+    payload JSONB NOT NULL
 );
 
 -- Create indexes for events table
-CREATE INDEX IF NOT EXISTS idx_kismet_events_type ON kismet_events(event_type);
-CREATE INDEX IF NOT EXISTS idx_kismet_events_time ON kismet_events(event_time);
-CREATE INDEX IF NOT EXISTS idx_kismet_events_device ON kismet_events(device_mac);
-CREATE INDEX IF NOT EXISTS idx_kismet_events_data ON kismet_events USING GIN(event_data);
+CREATE INDEX IF NOT EXISTS kismet_events_type_time_idx ON kismet_events(event_type, received_at DESC);
+CREATE INDEX IF NOT EXISTS kismet_events_mac_time_idx ON kismet_events(mac_addr, received_at DESC);
+CREATE INDEX IF NOT EXISTS kismet_events_time_idx ON kismet_events(received_at);
+CREATE INDEX IF NOT EXISTS kismet_events_payload_idx ON kismet_events USING GIN(payload jsonb_path_ops);
 
 -- Create a view for recent device activity
 CREATE OR REPLACE VIEW recent_devices AS
@@ -89,7 +89,7 @@ DECLARE
 BEGIN
     -- Delete old events
     DELETE FROM kismet_events 
-    WHERE event_time < NOW() - INTERVAL '1 day' * retention_days;
+    WHERE received_at < NOW() - INTERVAL '1 day' * retention_days;
     
     GET DIAGNOSTICS deleted_count = ROW_COUNT;
     
@@ -10,11 +10,12 @@ import json
 import argparse
 import logging
 import time
-import socket
-from datetime import datetime
+import math
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, Optional, Callable
 import signal
 import sys
+from collections import OrderedDict, deque
 
 # Database adapters
 try:
@@ -24,23 +25,117 @@ except ImportError:
     POSTGRES_AVAILABLE = False
 
 try:
-    from influxdb_client import InfluxDBClient, Point
+    from influxdb_client import InfluxDBClient
     from influxdb_client.client.write_api import SYNCHRONOUS
+    from influxdb_client.rest import ApiException
     INFLUXDB_AVAILABLE = True
 except ImportError:
     INFLUXDB_AVAILABLE = False
 
+# The async InfluxDB client needs aiohttp; without it, writes run in an executor
+try:
+    from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
+    INFLUXDB_ASYNC_AVAILABLE = True
+except ImportError:
+    INFLUXDB_ASYNC_AVAILABLE = False
+
 try:
     import paho.mqtt.client as mqtt
     MQTT_AVAILABLE = True
 except ImportError:
     MQTT_AVAILABLE = False
 
+OVERFLOW_POLICIES = ("block", "drop-oldest", "coalesce")
+
+class ExportQueue:
+    """
+    Bounded queue between WebSocket ingest and the exporter workers.
+
+    When the queue is full, 'block' makes ingest wait for a worker, 'drop-oldest'
+    discards the oldest pending item, and 'coalesce' replaces any pending update
+    for the same device with the newer one (blocking only when a new device
+    arrives at a full queue).  Coalesced updates keep their place in line and
+    their original enqueue time, so lag reflects how stale the device really is.
+    """
+    
+    def __init__(self, maxsize: int = 1000, overflow: str = "block"):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}'")
+            
+        self.maxsize = max(1, maxsize)
+        self.overflow = overflow
+        self.items = OrderedDict()
+        self.cond = asyncio.Condition()
+        self.pending = 0
+        self.sequence = 0
+        self.dropped = 0
+        self.coalesced = 0
+        
+    def __len__(self):
+        return len(self.items)
+        
+    async def put(self, kind: str, data: Dict[str, Any], mac_addr: Optional[str] = None):
+        """Queue an item, applying the overflow policy if the queue is full"""
+        async with self.cond:
+            coalesce = self.overflow == "coalesce" and mac_addr
+            if coalesce:
+                key = (kind, mac_addr)
+            else:
+                self.sequence += 1
+                key = self.sequence
+                
+            while True:
+                # Checked again after every wait, since another producer may
+                # have queued the same device while this one waited for room
+                if coalesce and key in self.items:
+                    (_, enqueued) = self.items[key]
+                    self.items[key] = ((kind, data), enqueued)
+                    self.coalesced += 1
+                    return
+                    
+                if len(self.items) < self.maxsize:
+                    break
+                    
+                if self.overflow == "drop-oldest":
+                    self.items.popitem(last=False)
+                    self.dropped += 1
+                    self.pending -= 1
+                    break
+                await self.cond.wait()
+                
+            self.items[key] = ((kind, data), time.monotonic())
+            self.pending += 1
+            self.cond.notify_all()
+            
+    async def get(self):
+        """Wait for the oldest item; returns ((kind, data), enqueue time)"""
+        async with self.cond:
+            while not self.items:
+                await self.cond.wait()
+                
+            (_, item) = self.items.popitem(last=False)
+            self.cond.notify_all()
+            return item
+            
+    async def task_done(self):
+        """Mark an item returned by get() as exported"""
+        async with self.cond:
+            self.pending -= 1
+            self.cond.notify_all()
+            
+    async def join(self):
+        """Wait until every queued item has been exported or dropped"""
+        async with self.cond:
+            while self.pending > 0:
+                await self.cond.wait()
+
+
 class KismetExportClient:
     """Main client for connecting to Kismet and exporting data"""
     
     def __init__(self, kismet_host: str = "localhost", kismet_port: int = 2501,
-                 update_rate: int = 5, export_type: str = "console"):
+                 update_rate: int = 5, export_type: str = "console",
+                 queue_size: int = 1000, workers: int = 1, overflow: str = "block"):
         self.kismet_host = kismet_host
         self.kismet_port = kismet_port
         self.update_rate = update_rate
@@ -49,12 +144,26 @@ class KismetExportClient:
         self.websocket = None
         self.exporter = None
         
+        # Ingest only queues updates; exporter workers drain the queue so a slow
+        # exporter doesn't stall the WebSocket reader
+        self.queue = ExportQueue(queue_size, overflow)
+        self.num_workers = max(1, workers)
+        self.workers = []
+        
         # Statistics
         self.stats = {
             'devices_processed': 0,
             'alerts_processed': 0,
             'start_time': None,
-            'last_update': None
+            'last_update': None,
+            'exported': 0,
+            'export_errors': 0,
+            'queue_depth': 0,
+            'queue_max_depth': 0,
+            'queue_lag': 0.0,
+            'queue_max_lag': 0.0,
+            'queue_dropped': 0,
+            'queue_coalesced': 0
         }
         
         # Setup logging
@@ -154,16 +263,71 @@ class KismetExportClient:
         # Extract key device information
         device_info = self.extract_device_info(device_data)
         
-        # Export to configured destination
+        # Queue for the exporter workers
         if self.exporter:
-            await self.exporter.export_device(device_info)
+            await self.enqueue("device", device_info, device_info['mac_addr'])
             
     async def process_event(self, event_data: Dict[str, Any]):
         """Process an event bus message"""
         self.stats['alerts_processed'] += 1
         
         if self.exporter:
-            await self.exporter.export_event(event_data)
+            await self.enqueue("event", event_data)
+            
+    async def enqueue(self, kind: str, data: Dict[str, Any], mac_addr: Optional[str] = None):
+        """Queue an update for export, starting the workers on first use"""
+        if not self.workers:
+            self.start_workers()
+            
+        await self.queue.put(kind, data, mac_addr)
+        
+        depth = len(self.queue)
+        self.stats['queue_depth'] = depth
+        self.stats['queue_max_depth'] = max(self.stats['queue_max_depth'], depth)
+        self.stats['queue_dropped'] = self.queue.dropped
+        self.stats['queue_coalesced'] = self.queue.coalesced
+        
+    def start_workers(self):
+        """Start the exporter worker tasks"""
+        self.workers = [asyncio.create_task(self.export_worker())
+                        for _ in range(self.num_workers)]
+        
+    async def export_worker(self):
+        """Export queued updates until cancelled"""
+        while True:
+            ((kind, data), enqueued) = await self.queue.get()
+            
+            lag = time.monotonic() - enqueued
+            self.stats['queue_depth'] = len(self.queue)
+            self.stats['queue_lag'] = lag
+            self.stats['queue_max_lag'] = max(self.stats['queue_max_lag'], lag)
+            
+            try:
+                if kind == "device":
+                    await self.exporter.export_device(data)
+                else:
+                    await self.exporter.export_event(data)
+                self.stats['exported'] += 1
+            except Exception as e:
+                self.stats['export_errors'] += 1
+                self.logger.error(f"Error exporting {kind}: {e}")
+            finally:
+                await self.queue.task_done()
+                
+    async def stop_workers(self, timeout: float = 5.0):
+        """Give the workers a chance to drain the queue, then cancel them"""
+        if not self.workers:
+            return
+            
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Export queue not drained, {len(self.queue)} updates discarded")
+            
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
             
     def extract_device_info(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
         """Extract and normalize device information"""
@@ -215,6 +379,18 @@ class KismetExportClient:
             print(f"Devices processed: {self.stats['devices_processed']}")
             print(f"Alerts processed: {self.stats['alerts_processed']}")
             print(f"Processing rate: {rate:.2f} devices/second")
+            print(f"Exported: {self.stats['exported']} ({self.stats['export_errors']} errors)")
+            print(f"Queue depth: {self.stats['queue_depth']} (max {self.stats['queue_max_depth']}), "
+                  f"lag: {self.stats['queue_lag']:.3f}s (max {self.stats['queue_max_lag']:.3f}s)")
+            print(f"Queue dropped: {self.stats['queue_dropped']}, coalesced: {self.stats['queue_coalesced']}")
+            
+            exporter_stats = getattr(self.exporter, 'stats', None)
+            if exporter_stats:
+                print("Exporter:")
+                for name, value in exporter_stats.items():
+                    if isinstance(value, float):
+                        value = f"{value:.3f}"
+                    print(f"  {name}: {value}")
             print(f"Last update: {datetime.fromtimestamp(self.stats['last_update']) if self.stats['last_update'] else 'Never'}")
             
     async def stop(self):
@@ -222,6 +398,7 @@ class KismetExportClient:
         self.running = False
         if self.websocket:
             await self.websocket.close()
+        await self.stop_workers()
         if self.exporter:
             await self.exporter.close()
         self.print_stats()
@@ -252,21 +429,213 @@ class ConsoleExporter:
 
 
 class PostgreSQLExporter:
-    """Export device data to PostgreSQL database"""
+    """
+    Export device data to PostgreSQL database
+
+    Devices are collected into micro-batches which are flushed when they reach
+    batch_size or every flush_interval seconds.  Each batch is loaded into a
+    per-connection temp table with COPY and merged with one set-based upsert,
+    instead of a round trip per device.  Flushes run one at a time, and the
+    upsert never replaces a row with an older last_seen.
+
+    With history set to 'day' or 'hour', every update is also appended to
+    kismet_device_history, range partitioned on observed_at.  Partitions are
+    created ahead of time and dropped once they fall outside the retention
+    window, and a BRIN index on observed_at keeps time-window queries cheap
+    without the cost of maintaining a b-tree on every insert.  History is
+    written separately from the device upsert, creating a missing partition
+    on demand, so it can never hold up the latest device state.
+
+    Events are buffered and written to kismet_events with binary COPY by their
+    own flush task, so an alert storm only costs the exporter workers an append
+    and never holds up device batches.
+    """
+    
+    # Columns loaded from device_info, in table order
+    DEVICE_COLUMNS = (
+        'mac_addr', 'name', 'username', 'phy_type', 'manufacturer',
+        'first_seen', 'last_seen', 'channel', 'frequency',
+        'total_packets', 'tx_packets', 'rx_packets', 'data_size',
+        'signal_dbm', 'noise_dbm', 'snr_db',
+        'latitude', 'longitude', 'altitude'
+    )
     
-    def __init__(self, connection_string: str):
+    UPSERT_SQL = """
+        INSERT INTO kismet_devices (
+            mac_addr, name, username, phy_type, manufacturer,
+            first_seen, last_seen, channel, frequency,
+            total_packets, tx_packets, rx_packets, data_size,
+            signal_dbm, noise_dbm, snr_db,
+            latitude, longitude, altitude, last_updated
+        )
+        SELECT
+            mac_addr, name, username, phy_type, manufacturer,
+            first_seen, last_seen, channel, frequency,
+            total_packets, tx_packets, rx_packets, data_size,
+            signal_dbm, noise_dbm, snr_db,
+            latitude, longitude, altitude, NOW()
+        FROM kismet_devices_stage
+        ON CONFLICT (mac_addr) DO UPDATE SET
+            name = EXCLUDED.name,
+            username = EXCLUDED.username,
+            last_seen = EXCLUDED.last_seen,
+            channel = EXCLUDED.channel,
+            frequency = EXCLUDED.frequency,
+            total_packets = EXCLUDED.total_packets,
+            tx_packets = EXCLUDED.tx_packets,
+            rx_packets = EXCLUDED.rx_packets,
+            data_size = EXCLUDED.data_size,
+            signal_dbm = EXCLUDED.signal_dbm,
+            noise_dbm = EXCLUDED.noise_dbm,
+            snr_db = EXCLUDED.snr_db,
+            latitude = EXCLUDED.latitude,
+            longitude = EXCLUDED.longitude,
+            altitude = EXCLUDED.altitude,
+            last_updated = NOW()
+        WHERE kismet_devices.last_seen IS NULL
+            OR kismet_devices.last_seen <= EXCLUDED.last_seen
+    """
+    
+    # Columns appended to the history table, in COPY order
+    HISTORY_COLUMNS = (
+        'observed_at', 'mac_addr', 'last_seen', 'channel', 'frequency',
+        'total_packets', 'data_size', 'signal_dbm', 'noise_dbm', 'snr_db',
+        'latitude', 'longitude', 'altitude'
+    )
+    
+    # Columns written to the events table, in COPY order
+    EVENT_COLUMNS = ('received_at', 'event_type', 'device_key', 'mac_addr', 'payload')
+    
+    # Fields holding the event type, device key and MAC, in order of preference;
+    # events may be flattened or carry kismet fields, such as alert content
+    EVENT_TYPE_FIELDS = ('event_type', 'kismet.eventbus.type', 'kismet.alert.header')
+    EVENT_DEVICE_KEY_FIELDS = ('device_key', 'kismet.alert.device_key', 'kismet.device.base.key')
+    EVENT_MAC_FIELDS = ('device_mac', 'mac_addr', 'kismet.alert.source_mac',
+                        'kismet.alert.transmitter_mac', 'kismet.device.base.macaddr')
+    
+    HISTORY_PERIODS = {
+        'day': (timedelta(days=1), "%Y%m%d"),
+        'hour': (timedelta(hours=1), "%Y%m%d%H")
+    }
+    
+    # check_violation, raised by COPY when no partition covers a row
+    NO_PARTITION_SQLSTATE = '23514'
+    
+    INT_COLUMNS = ('first_seen', 'last_seen', 'frequency', 'total_packets', 'tx_packets',
+                   'rx_packets', 'data_size', 'signal_dbm', 'noise_dbm', 'snr_db')
+    FLOAT_COLUMNS = ('latitude', 'longitude', 'altitude')
+    
+    def __init__(self, connection_string: str, batch_size: int = 500,
+                 flush_interval: float = 1.0, pool_size: int = 4,
+                 history: Optional[str] = None, history_retention: float = 30,
+                 history_ahead: int = 3, event_buffer: int = 100000):
+        if history is not None and history not in self.HISTORY_PERIODS:
+            raise ValueError(f"Unknown history partition period '{history}'")
+            
         self.connection_string = connection_string
-        self.conn = None
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.pool_size = max(1, pool_size)
+        self.pool = None
+        self.connect_lock = asyncio.Lock()
+        self.flush_task = None
+        
+        # History retention is in days, regardless of partition period
+        self.history = history
+        self.history_retention = timedelta(days=history_retention)
+        self.history_ahead = max(1, history_ahead)
+        self.history_task = None
+        
+        # Pending rows keyed by MAC; a newer update replaces the pending one,
+        # which also keeps the upsert from touching a row twice
+        self.batch = {}
+        
+        # Size and timer flushes take turns, so an older batch can't commit
+        # after a newer one on another pooled connection
+        self.flush_lock = asyncio.Lock()
+        
+        # Pending history rows; every update is kept
+        self.history_rows = []
+        
+        # Pending event rows, bounded so an unreachable database can't
+        # exhaust memory; the flush task is woken once a batch is ready
+        self.event_buffer = max(self.batch_size, event_buffer)
+        self.event_rows = deque(maxlen=self.event_buffer)
+        self.event_ready = asyncio.Event()
+        self.event_task = None
+        
+        # Cleared when the events table can't be set up; devices are still
+        # exported without it
+        self.events_enabled = True
+        
+        # Set on close; the flush tasks finish their current write and exit
+        # rather than being cancelled mid-COPY, which can't tell whether the
+        # server already applied it
+        self.stopping = asyncio.Event()
+        
+        self.logger = logging.getLogger(f"{__name__}.PostgreSQLExporter")
+        
+        self.stats = {
+            'batches': 0,
+            'rows': 0,
+            'flush_errors': 0,
+            'last_batch_size': 0,
+            'flush_latency': 0.0,
+            'max_flush_latency': 0.0,
+            'flush_time': 0.0,
+            'rows_per_sec': 0.0,
+            'history_rows': 0,
+            'history_errors': 0,
+            'partitions_created': 0,
+            'partitions_dropped': 0,
+            'events': 0,
+            'event_batches': 0,
+            'events_dropped': 0,
+            'event_flush_errors': 0
+        }
         
     async def connect(self):
         """Connect to PostgreSQL"""
         if not POSTGRES_AVAILABLE:
             raise ImportError("asyncpg not available. Install with: pip install asyncpg")
             
-        self.conn = await asyncpg.connect(self.connection_string)
-        
-        # Create table if it doesn't exist
-        await self.conn.execute("""
+        async with self.connect_lock:
+            if self.pool:
+                return
+                
+            # Create the table before the pool, since each pooled connection
+            # creates its staging table from it
+            conn = await asyncpg.connect(self.connection_string)
+            try:
+                await self.prepare_database(conn)
+            finally:
+                await conn.close()
+                
+            self.pool = await asyncpg.create_pool(self.connection_string, min_size=1,
+                                                  max_size=self.pool_size,
+                                                  init=self.init_connection)
+            self.stopping.clear()
+            self.flush_task = asyncio.create_task(self.flush_loop())
+            self.event_task = asyncio.create_task(self.event_loop())
+            if self.history:
+                self.history_task = asyncio.create_task(self.partition_loop())
+            
+    async def prepare_database(self, conn):
+        """Create the tables and partitions; events are optional"""
+        await self.create_tables(conn)
+        if self.history:
+            await self.maintain_partitions(conn)
+            
+        try:
+            await self.create_event_table(conn)
+            self.events_enabled = True
+        except Exception as e:
+            self.events_enabled = False
+            self.logger.error(f"Failed to set up kismet_events, events will not be exported: {e}")
+            
+    async def create_tables(self, conn):
+        """Create the device table, and the history table if enabled"""
+        await conn.execute("""
             CREATE TABLE IF NOT EXISTS kismet_devices (
                 mac_addr TEXT PRIMARY KEY,
                 name TEXT,
@@ -291,165 +660,912 @@ class PostgreSQLExporter:
             )
         """)
         
+        if self.history:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS kismet_device_history (
+                    observed_at TIMESTAMPTZ NOT NULL,
+                    mac_addr TEXT NOT NULL,
+                    last_seen BIGINT,
+                    channel TEXT,
+                    frequency BIGINT,
+                    total_packets BIGINT,
+                    data_size BIGINT,
+                    signal_dbm INTEGER,
+                    noise_dbm INTEGER,
+                    snr_db INTEGER,
+                    latitude DOUBLE PRECISION,
+                    longitude DOUBLE PRECISION,
+                    altitude DOUBLE PRECISION
+                ) PARTITION BY RANGE (observed_at)
+            """)
+            
+            # Rows arrive in time order, so a BRIN index stays tiny and cheap
+            # to maintain; created on the parent it applies to every partition
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS kismet_device_history_observed_brin
+                    ON kismet_device_history USING BRIN (observed_at)
+            """)
+            
+    async def create_event_table(self, conn):
+        """
+        Create the events table if it doesn't exist.  A kismet_events table with
+        the layout older init-db.sql scripts created (id, event_time,
+        device_mac, event_data) is renamed to kismet_events_legacy first, so
+        its rows are kept and the new table can take its place.
+        """
+        columns = await conn.fetch("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'kismet_events'
+        """)
+        columns = {row['column_name'] for row in columns}
+        
+        async with conn.transaction():
+            if columns and not columns.issuperset(self.EVENT_COLUMNS):
+                self.logger.warning("kismet_events has an older layout, renaming it to kismet_events_legacy")
+                await conn.execute("ALTER TABLE kismet_events RENAME TO kismet_events_legacy")
+                
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS kismet_events (
+                    received_at TIMESTAMPTZ NOT NULL,
+                    event_type TEXT NOT NULL,
+                    device_key TEXT,
+                    mac_addr TEXT,
+                    payload JSONB NOT NULL
+                )
+            """)
+            
+            # B-tree indexes serve recent events by type or device, and the GIN
+            # index serves containment (@>) searches of the payload
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS kismet_events_type_time_idx
+                    ON kismet_events (event_type, received_at DESC)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS kismet_events_mac_time_idx
+                    ON kismet_events (mac_addr, received_at DESC)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS kismet_events_time_idx
+                    ON kismet_events (received_at)
+            """)
+            await conn.execute("""
+                CREATE INDEX IF NOT EXISTS kismet_events_payload_idx
+                    ON kismet_events USING GIN (payload jsonb_path_ops)
+            """)
+            
+    def partition_start(self, when: datetime) -> datetime:
+        """Start of the history partition containing a UTC time"""
+        if self.history == 'hour':
+            return when.replace(minute=0, second=0, microsecond=0)
+        return when.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+    def partition_name(self, start: datetime) -> str:
+        """History partition table name for a partition start time"""
+        (_, suffix) = self.HISTORY_PERIODS[self.history]
+        return f"kismet_device_history_p{start.strftime(suffix)}"
+        
+    async def maintain_partitions(self, conn, now: Optional[datetime] = None):
+        """Create upcoming history partitions and drop expired ones"""
+        (period, suffix) = self.HISTORY_PERIODS[self.history]
+        
+        if now is None:
+            now = datetime.now(timezone.utc)
+            
+        partitions = await conn.fetch("""
+            SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'kismet_device_history'::regclass
+        """)
+        existing = set(row['relname'] for row in partitions)
+        
+        start = self.partition_start(now)
+        for i in range(self.history_ahead + 1):
+            lower = start + i * period
+            if self.partition_name(lower) not in existing:
+                await self.create_partition(conn, lower)
+            
+        # Partitions are only dropped once all of their rows have expired
+        cutoff = now - self.history_retention
+        prefix = "kismet_device_history_p"
+        for name in sorted(existing):
+            if not name.startswith(prefix):
+                continue
+            try:
+                lower = datetime.strptime(name[len(prefix):], suffix).replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            if lower + period <= cutoff:
+                await conn.execute(f"DROP TABLE IF EXISTS {name}")
+                self.stats['partitions_dropped'] += 1
+                self.logger.info(f"Dropped expired history partition {name}")
+                
+    async def create_partition(self, conn, lower: datetime):
+        """Create the history partition starting at lower"""
+        (period, _) = self.HISTORY_PERIODS[self.history]
+        await conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.partition_name(lower)}
+                PARTITION OF kismet_device_history
+                FOR VALUES FROM ('{lower.isoformat()}') TO ('{(lower + period).isoformat()}')
+        """)
+        self.stats['partitions_created'] += 1
+        
+    async def partition_loop(self):
+        """Keep history partitions ahead of time and within retention"""
+        (period, _) = self.HISTORY_PERIODS[self.history]
+        interval = min(period.total_seconds() / 4, 3600)
+        
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with self.pool.acquire() as conn:
+                    await self.maintain_partitions(conn)
+            except Exception as e:
+                self.logger.error(f"Failed to maintain history partitions: {e}")
+                
+    async def init_connection(self, conn):
+        """Create the staging table on a new pooled connection"""
+        # LIKE doesn't copy the primary key, so loading the stage is index free
+        await conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS kismet_devices_stage
+                (LIKE kismet_devices) ON COMMIT DELETE ROWS
+        """)
+        
+    def device_row(self, device_info: Dict[str, Any]) -> tuple:
+        """Convert device info to a kismet_devices row"""
+        return self.convert_row(self.DEVICE_COLUMNS, device_info)
+        
+    def history_row(self, device_info: Dict[str, Any], observed_at: datetime) -> tuple:
+        """Convert device info to a history row"""
+        return (observed_at,) + self.convert_row(self.HISTORY_COLUMNS[1:], device_info)
+        
+    def convert_row(self, columns: tuple, device_info: Dict[str, Any]) -> tuple:
+        """Convert device info columns to the types COPY expects"""
+        row = []
+        for column in columns:
+            value = device_info.get(column)
+            if value is not None:
+                if column in self.INT_COLUMNS:
+                    value = int(value)
+                elif column in self.FLOAT_COLUMNS:
+                    value = float(value)
+                else:
+                    value = str(value)
+            row.append(value)
+        return tuple(row)
+        
     async def export_device(self, device_info: Dict[str, Any]):
-        """Export device to PostgreSQL"""
-        if not self.conn:
+        """Queue device for the next batch upsert"""
+        if not self.pool:
             await self.connect()
             
-        await self.conn.execute("""
-            INSERT INTO kismet_devices (
-                mac_addr, name, username, phy_type, manufacturer,
-                first_seen, last_seen, channel, frequency,
-                total_packets, tx_packets, rx_packets, data_size,
-                signal_dbm, noise_dbm, snr_db,
-                latitude, longitude, altitude, last_updated
-            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19, NOW())
-            ON CONFLICT (mac_addr) DO UPDATE SET
-                name = EXCLUDED.name,
-                username = EXCLUDED.username,
-                last_seen = EXCLUDED.last_seen,
-                channel = EXCLUDED.channel,
-                frequency = EXCLUDED.frequency,
-                total_packets = EXCLUDED.total_packets,
-                tx_packets = EXCLUDED.tx_packets,
-                rx_packets = EXCLUDED.rx_packets,
-                data_size = EXCLUDED.data_size,
-                signal_dbm = EXCLUDED.signal_dbm,
-                noise_dbm = EXCLUDED.noise_dbm,
-                snr_db = EXCLUDED.snr_db,
-                latitude = EXCLUDED.latitude,
-                longitude = EXCLUDED.longitude,
-                altitude = EXCLUDED.altitude,
-                last_updated = NOW()
-        """, device_info['mac_addr'], device_info['name'], device_info['username'],
-             device_info['phy_type'], device_info['manufacturer'],
-             device_info['first_seen'], device_info['last_seen'],
-             device_info['channel'], device_info['frequency'],
-             device_info['total_packets'], device_info['tx_packets'], device_info['rx_packets'],
-             device_info['data_size'], device_info['signal_dbm'], device_info['noise_dbm'],
-             device_info['snr_db'], device_info['latitude'], device_info['longitude'],
-             device_info['altitude'])
-             
+        self.batch[device_info['mac_addr']] = self.device_row(device_info)
+        
+        if self.history:
+            self.history_rows.append(self.history_row(device_info, datetime.now(timezone.utc)))
+            
+        if len(self.batch) >= self.batch_size or len(self.history_rows) >= self.batch_size:
+            await self.flush()
+            
+    async def flush_loop(self):
+        """Flush partial batches every flush_interval until stopping"""
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+            
+    async def flush(self):
+        """Upsert the pending batch, one flush at a time"""
+        async with self.flush_lock:
+            await self.write_batch()
+            
+    async def write_batch(self):
+        """Write the pending device and history rows"""
+        if not self.batch and not self.history_rows:
+            return
+            
+        batch = self.batch
+        self.batch = {}
+        rows = list(batch.values())
+        
+        history = self.history_rows
+        self.history_rows = []
+        
+        start = time.perf_counter()
+        try:
+            async with self.pool.acquire() as conn:
+                if rows:
+                    async with conn.transaction():
+                        await conn.copy_records_to_table('kismet_devices_stage', records=rows,
+                                                         columns=self.DEVICE_COLUMNS)
+                        await conn.execute(self.UPSERT_SQL)
+                    batch = {}
+                    self.count_batch(rows, time.perf_counter() - start)
+                    
+                # History is written on its own, so a history problem never
+                # holds up the latest device state
+                if history:
+                    await self.write_history(conn, history)
+                    self.stats['history_rows'] += len(history)
+                    history = []
+        except asyncio.CancelledError:
+            # Cancelled mid-write; the transaction rolls back, so keep the rows
+            self.restore_batch(batch, history)
+            raise
+        except Exception as e:
+            self.restore_batch(batch, history)
+            if batch:
+                self.stats['flush_errors'] += 1
+                self.logger.error(f"Failed to upsert {len(rows)} devices: {e}")
+            else:
+                self.stats['history_errors'] += 1
+                self.logger.error(f"Failed to write {len(history)} history rows: {e}")
+                
+    async def write_history(self, conn, history: list):
+        """Append history rows, creating missing partitions on demand"""
+        try:
+            # COPY into the parent routes rows to their partition
+            await conn.copy_records_to_table('kismet_device_history', records=history,
+                                             columns=self.HISTORY_COLUMNS)
+        except Exception as e:
+            # No partition for a row, such as when partition maintenance has
+            # been failing or the clock passed the partitions made ahead
+            if getattr(e, 'sqlstate', None) != self.NO_PARTITION_SQLSTATE:
+                raise
+            for lower in sorted(set(self.partition_start(row[0]) for row in history)):
+                await self.create_partition(conn, lower)
+            await conn.copy_records_to_table('kismet_device_history', records=history,
+                                             columns=self.HISTORY_COLUMNS)
+            
+    def count_batch(self, rows: list, latency: float):
+        """Update statistics for an upserted batch"""
+        self.stats['batches'] += 1
+        self.stats['rows'] += len(rows)
+        self.stats['last_batch_size'] = len(rows)
+        self.stats['flush_latency'] = latency
+        self.stats['max_flush_latency'] = max(self.stats['max_flush_latency'], latency)
+        self.stats['flush_time'] += latency
+        self.stats['rows_per_sec'] = self.stats['rows'] / self.stats['flush_time']
+        
+        self.logger.debug(f"Upserted {len(rows)} devices in {latency * 1000:.1f}ms")
+        
+    def event_field(self, content: Dict[str, Any], fields: tuple) -> Optional[str]:
+        """First non-empty value of the listed fields"""
+        for field in fields:
+            value = content.get(field)
+            if value and value != "00:00:00:00:00:00":
+                return str(value)
+        return None
+        
+    def event_row(self, event_data: Dict[str, Any], received_at: datetime) -> tuple:
+        """Convert an event to a kismet_events row"""
+        content = event_data
+        event_type = self.event_field(event_data, self.EVENT_TYPE_FIELDS)
+        
+        # Event bus content arrives wrapped in its field name, such as kismet.alert
+        if len(event_data) == 1:
+            (name, inner) = next(iter(event_data.items()))
+            if isinstance(inner, dict):
+                content = inner
+                event_type = self.event_field(inner, self.EVENT_TYPE_FIELDS) or name
+                
+        return (received_at,
+                event_type or "unknown",
+                self.event_field(content, self.EVENT_DEVICE_KEY_FIELDS),
+                self.event_field(content, self.EVENT_MAC_FIELDS),
+                json.dumps(event_data))
+        
+    def restore_batch(self, batch: Dict[str, tuple], history: list):
+        """Return the rows of a failed flush to the pending batch"""
+        # Keep the rows for the next flush unless a newer update arrived
+        for mac, row in batch.items():
+            self.batch.setdefault(mac, row)
+        # History is kept up to a few batches so an outage can't exhaust memory
+        self.history_rows = (history + self.history_rows)[-self.batch_size * 10:]
+        
     async def export_event(self, event_data: Dict[str, Any]):
-        """Export event to PostgreSQL (could create events table)"""
-        pass
+        """Buffer event for the event flush task"""
+        if not self.pool:
+            await self.connect()
+            
+        if not self.events_enabled:
+            self.stats['events_dropped'] += 1
+            return
+            
+        if len(self.event_rows) == self.event_buffer:
+            self.stats['events_dropped'] += 1
+            
+        self.event_rows.append(self.event_row(event_data, datetime.now(timezone.utc)))
+        
+        if len(self.event_rows) >= self.batch_size:
+            self.event_ready.set()
+            
+    async def event_loop(self):
+        """Flush events once a batch is ready, or every flush_interval, until stopping"""
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.event_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.event_ready.clear()
+            await self.flush_events()
+            
+    async def flush_events(self):
+        """Write pending events with binary COPY"""
+        if not self.event_rows:
+            return
+            
+        rows = self.event_rows
+        self.event_rows = deque(maxlen=self.event_buffer)
+        
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.copy_records_to_table('kismet_events', records=rows,
+                                                 columns=self.EVENT_COLUMNS)
+        except asyncio.CancelledError:
+            self.restore_events(rows)
+            raise
+        except Exception as e:
+            self.restore_events(rows)
+            self.stats['event_flush_errors'] += 1
+            self.logger.error(f"Failed to write {len(rows)} events: {e}")
+            return
+            
+        self.stats['events'] += len(rows)
+        self.stats['event_batches'] += 1
+        
+    def restore_events(self, rows: deque):
+        """Return the events of a failed flush to the buffer"""
+        # Keep what fits in the buffer for the next flush, dropping the oldest
+        total = len(rows) + len(self.event_rows)
+        rows.extend(self.event_rows)
+        self.event_rows = rows
+        self.stats['events_dropped'] += total - len(rows)
         
     async def close(self):
-        """Close PostgreSQL connection"""
-        if self.conn:
-            await self.conn.close()
+        """Flush pending devices and events and close the PostgreSQL pool"""
+        self.stopping.set()
+        self.event_ready.set()
+        
+        if self.history_task:
+            self.history_task.cancel()
+        for task in (self.flush_task, self.event_task, self.history_task):
+            if task:
+                await asyncio.gather(task, return_exceptions=True)
+        self.flush_task = None
+        self.event_task = None
+        self.history_task = None
+            
+        if self.pool:
+            await self.flush()
+            await self.flush_events()
+            await self.pool.close()
+            self.pool = None
+            
+        if self.stats['batches']:
+            self.logger.info(f"PostgreSQL: {self.stats['rows']} rows in {self.stats['batches']} batches, "
+                             f"avg batch {self.stats['rows'] / self.stats['batches']:.0f}, "
+                             f"{self.stats['rows_per_sec']:.0f} rows/s")
 
 
 class InfluxDBExporter:
-    """Export device data to InfluxDB (time series database)"""
+    """
+    Export device data to InfluxDB (time series database)
+
+    Records are serialized straight to line protocol and buffered; a flush task
+    writes them in batches of batch_size, when a batch is ready or every
+    flush_interval seconds, through the async client (or the synchronous client
+    in an executor when aiohttp isn't available) so the event loop never waits
+    on HTTP.  Writes which failed to connect, or were refused with a 5xx or 429,
+    are kept and retried with backoff; the buffer is bounded by max_buffer
+    lines, dropping the oldest.  Batches the server rejects outright, such as
+    a field type conflict or a bad token or bucket, are logged and discarded
+    so they can't hold up the lines behind them.
+    """
+    
+    # Tags and fields written for each device, from device_info; tags are in
+    # key order, which InfluxDB prefers
+    DEVICE_TAGS = ('mac_addr', 'manufacturer', 'phy_type')
+    DEVICE_FIELDS = ('signal_dbm', 'noise_dbm', 'snr_db', 'total_packets', 'tx_packets',
+                     'rx_packets', 'data_size', 'frequency', 'latitude', 'longitude')
     
-    def __init__(self, url: str, token: str, org: str, bucket: str):
+    # Line protocol escaping, as used by Point
+    ESCAPE_KEY = str.maketrans({',': r'\,', '=': r'\=', ' ': r'\ ',
+                                '\n': r'\n', '\t': r'\t', '\r': r'\r'})
+    ESCAPE_STRING = str.maketrans({'"': r'\"', '\\': r'\\'})
+    
+    def __init__(self, url: str, token: str, org: str, bucket: str,
+                 batch_size: int = 5000, flush_interval: float = 1.0,
+                 max_buffer: int = 100000):
         if not INFLUXDB_AVAILABLE:
             raise ImportError("influxdb-client not available. Install with: pip install influxdb-client")
             
-        self.client = InfluxDBClient(url=url, token=token, org=org)
-        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        self.url = url
+        self.token = token
+        self.org = org
         self.bucket = bucket
+        self.client = None
+        self.write_api = None
+        
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.lines = deque(maxlen=self.max_buffer)
+        self.ready = asyncio.Event()
+        self.flush_task = None
+        
+        # Retry backoff after a failed write
+        self.backoff_min = 1
+        self.backoff_max = 30
+        self.backoff = self.backoff_min
+        self.retry_at = 0
         
+        self.logger = logging.getLogger(f"{__name__}.InfluxDBExporter")
+        
+        self.stats = {
+            'lines': 0,
+            'batches': 0,
+            'bytes': 0,
+            'write_errors': 0,
+            'rejected_batches': 0,
+            'rejected_lines': 0,
+            'dropped': 0,
+            'flush_latency': 0.0
+        }
+        
+    async def connect(self):
+        """Create the InfluxDB client and start the flush task"""
+        if INFLUXDB_ASYNC_AVAILABLE:
+            self.client = InfluxDBClientAsync(url=self.url, token=self.token, org=self.org)
+        else:
+            self.client = InfluxDBClient(url=self.url, token=self.token, org=self.org)
+        self.write_api = self.client.write_api() if INFLUXDB_ASYNC_AVAILABLE else \
+            self.client.write_api(write_options=SYNCHRONOUS)
+        self.flush_task = asyncio.create_task(self.flush_loop())
+        
+    def escape_key(self, value: str) -> str:
+        """Escape a measurement, tag key, tag value or field key"""
+        return value.translate(self.ESCAPE_KEY)
+        
+    def format_field(self, value) -> Optional[str]:
+        """Format a field value the way Point does; None for values Point skips"""
+        if value is None:
+            return None
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, int):
+            return f"{value}i"
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return None
+            value = str(value)
+            return value[:-2] if value.endswith(".0") else value
+        return f'"{str(value).translate(self.ESCAPE_STRING)}"'
+        
+    def line(self, measurement: str, tags: Dict[str, Any], fields: Dict[str, Any],
+             timestamp: int) -> Optional[str]:
+        """Serialize one record to line protocol"""
+        tag_set = "".join(f",{self.escape_key(k)}={self.escape_key(str(v))}"
+                          for k, v in tags.items() if v not in (None, ""))
+        
+        field_set = []
+        for k, v in fields.items():
+            v = self.format_field(v)
+            if v is not None:
+                field_set.append(f"{self.escape_key(k)}={v}")
+                
+        # A line needs at least one field
+        if not field_set:
+            return None
+            
+        return f"{self.escape_key(measurement)}{tag_set} {','.join(field_set)} {timestamp}"
+        
+    def append(self, line: Optional[str]):
+        """Buffer a line, waking the flush task once a batch is ready"""
+        if line is None:
+            return
+        if len(self.lines) == self.max_buffer:
+            self.stats['dropped'] += 1
+        self.lines.append(line)
+        if len(self.lines) >= self.batch_size:
+            self.ready.set()
+            
     async def export_device(self, device_info: Dict[str, Any]):
         """Export device to InfluxDB"""
-        point = Point("device_metrics") \
-            .tag("mac_addr", device_info['mac_addr']) \
-            .tag("phy_type", device_info['phy_type']) \
-            .tag("manufacturer", device_info['manufacturer']) \
-            .field("signal_dbm", device_info['signal_dbm']) \
-            .field("noise_dbm", device_info['noise_dbm']) \
-            .field("snr_db", device_info['snr_db']) \
-            .field("total_packets", device_info['total_packets']) \
-            .field("tx_packets", device_info['tx_packets']) \
-            .field("rx_packets", device_info['rx_packets']) \
-            .field("data_size", device_info['data_size']) \
-            .field("frequency", device_info['frequency']) \
-            .field("latitude", device_info['latitude']) \
-            .field("longitude", device_info['longitude']) \
-            .time(int(device_info['last_seen'] * 1000000000))  # Convert to nanoseconds
-            
-        self.write_api.write(bucket=self.bucket, record=point)
+        if not self.flush_task:
+            await self.connect()
+            
+        timestamp = int((device_info.get('last_seen') or time.time()) * 1000000000)  # Convert to nanoseconds
+        
+        self.append(self.line("device_metrics",
+                              {k: device_info.get(k) for k in self.DEVICE_TAGS},
+                              {k: device_info.get(k) for k in self.DEVICE_FIELDS},
+                              timestamp))
         
     async def export_event(self, event_data: Dict[str, Any]):
         """Export event to InfluxDB"""
-        point = Point("kismet_events") \
-            .field("event_data", json.dumps(event_data)) \
-            .time(int(time.time() * 1000000000))
+        if not self.flush_task:
+            await self.connect()
+            
+        self.append(self.line("kismet_events", {}, {'event_data': json.dumps(event_data)},
+                              int(time.time() * 1000000000)))
+        
+    async def flush_loop(self):
+        """Flush when a batch is ready or every flush_interval, backing off after errors"""
+        while True:
+            try:
+                await asyncio.wait_for(self.ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.ready.clear()
+            
+            if time.monotonic() < self.retry_at:
+                continue
+                
+            await self.flush()
+            
+    async def write(self, body: str):
+        """Write a batch of lines without blocking the event loop"""
+        if INFLUXDB_ASYNC_AVAILABLE:
+            await self.write_api.write(bucket=self.bucket, record=body)
+        else:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: self.write_api.write(bucket=self.bucket, record=body))
+            
+    async def flush(self):
+        """Write buffered lines in batches; returns False if a write failed"""
+        while self.lines:
+            batch = [self.lines.popleft() for _ in range(min(self.batch_size, len(self.lines)))]
+            body = "\n".join(batch)
+            
+            start = time.perf_counter()
+            try:
+                await self.write(body)
+            except asyncio.CancelledError:
+                self.restore(batch)
+                raise
+            except Exception as e:
+                if not self.retryable(e):
+                    self.stats['rejected_batches'] += 1
+                    self.stats['rejected_lines'] += len(batch)
+                    self.logger.error(f"InfluxDB rejected {len(batch)} lines, discarding them: {e}")
+                    continue
+                    
+                self.restore(batch)
+                self.stats['write_errors'] += 1
+                self.retry_at = time.monotonic() + self.backoff
+                self.logger.error(f"Failed to write {len(batch)} lines to InfluxDB, retrying in {self.backoff}s: {e}")
+                self.backoff = min(self.backoff * 2, self.backoff_max)
+                return False
+                
+            self.backoff = self.backoff_min
+            self.stats['lines'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['bytes'] += len(body)
+            self.stats['flush_latency'] = time.perf_counter() - start
             
-        self.write_api.write(bucket=self.bucket, record=point)
+        return True
+        
+    def retryable(self, e: Exception) -> bool:
+        """Whether a failed write may succeed later; HTTP errors other than 5xx and 429 won't"""
+        if not isinstance(e, ApiException) or not e.status:
+            return True
+        return e.status == 429 or e.status >= 500
+        
+    def restore(self, batch: list):
+        """Put a failed batch back at the front of the buffer, within its bound"""
+        room = self.max_buffer - len(self.lines)
+        if room < len(batch):
+            self.stats['dropped'] += len(batch) - room
+            batch = batch[len(batch) - room:] if room > 0 else []
+        self.lines.extendleft(reversed(batch))
         
     async def close(self):
-        """Close InfluxDB connection"""
-        self.client.close()
+        """Flush buffered lines and close InfluxDB connection"""
+        if self.flush_task:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+            
+        if self.client:
+            if not await self.flush():
+                self.logger.warning(f"Discarding {len(self.lines)} lines not written to InfluxDB")
+            if INFLUXDB_ASYNC_AVAILABLE:
+                await self.client.close()
+            else:
+                self.client.close()
+            self.client = None
 
 
 class MQTTExporter:
-    """Export device data to MQTT broker"""
+    """
+    Export device data to MQTT broker
+
+    A device is only published when its exported fields changed since the last
+    publish, optionally also to a retained latest-state topic; the last state of
+    at most max_devices devices is remembered, forgetting the least recently
+    updated, so a forgotten device is simply published again.  Changed devices
+    are batched into summaries on a separate topic every summary_interval.
+    Publishes are QoS 1 with at most max_inflight unacknowledged, waiting for
+    acks beyond that so backpressure reaches the export queue.  paho runs its
+    network loop in a thread and reconnects with backoff; its callbacks are
+    handed to the event loop.
+    """
+    
+    # Fields that change on every update without saying anything new
+    VOLATILE_FIELDS = ('timestamp',)
+    
+    # Fields in each summary entry
+    SUMMARY_FIELDS = ('mac_addr', 'phy_type', 'signal_dbm', 'total_packets', 'last_seen')
     
     def __init__(self, broker_host: str, broker_port: int = 1883, 
-                 topic_prefix: str = "kismet", username: str = None, password: str = None):
+                 topic_prefix: str = "kismet", username: str = None, password: str = None,
+                 retain_state: bool = False, summary_interval: float = 10.0,
+                 summary_max: int = 500, max_inflight: int = 100,
+                 connect_timeout: float = 10.0, max_queued: int = 10000,
+                 max_devices: int = 100000):
         if not MQTT_AVAILABLE:
             raise ImportError("paho-mqtt not available. Install with: pip install paho-mqtt")
             
         self.broker_host = broker_host
         self.broker_port = broker_port
         self.topic_prefix = topic_prefix
-        self.client = mqtt.Client()
+        self.retain_state = retain_state
+        self.summary_interval = summary_interval
+        self.summary_max = max(1, summary_max)
+        self.max_inflight = max(1, max_inflight)
+        self.connect_timeout = connect_timeout
+        self.max_devices = max(1, max_devices)
+        
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        else:
+            self.client = mqtt.Client()
         
         if username and password:
             self.client.username_pw_set(username, password)
             
+        # paho reconnects by itself with backoff, resending unacknowledged
+        # messages, and holds at most max_queued messages while disconnected
+        self.client.reconnect_delay_set(1, 60)
+        self.client.max_inflight_messages_set(self.max_inflight)
+        self.client.max_queued_messages_set(max_queued)
+        
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_publish = self.on_publish
+        
+        self.loop = None
+        self.started = False
+        self.connected = False
+        self.connect_future = None
+        self.inflight = 0
+        self.slot_free = asyncio.Event()
+        self.summary_task = None
+        
+        # Last published state per MAC, least recently updated first, and
+        # devices changed since the last summary
+        self.device_state = OrderedDict()
+        self.summary_pending = {}
+        
+        self.logger = logging.getLogger(f"{__name__}.MQTTExporter")
+        
+        self.stats = {
+            'published': 0,
+            'suppressed': 0,
+            'forgotten': 0,
+            'summaries': 0,
+            'acked': 0,
+            'inflight': 0,
+            'max_inflight': 0,
+            'publish_errors': 0,
+            'connects': 0,
+            'disconnects': 0
+        }
+        
+    def post(self, callback, *args):
+        """Run a callback on the event loop from the paho thread"""
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Loop is already closed, we're shutting down
+            pass
+            
+    # paho callbacks, called from the network thread with either callback API
+    def on_connect(self, client, userdata, flags, rc, *args):
+        self.post(self.connect_result, rc == 0, rc)
+        
+    def on_disconnect(self, client, userdata, *args):
+        self.post(self.disconnected)
+        
+    def on_publish(self, client, userdata, mid, *args):
+        self.post(self.published)
+        
+    def connect_result(self, success: bool, rc):
+        if success:
+            self.connected = True
+            self.stats['connects'] += 1
+            self.logger.info(f"Connected to MQTT broker at {self.broker_host}:{self.broker_port}")
+        else:
+            self.logger.error(f"Failed to connect to MQTT broker: {rc}")
+            
+        if self.connect_future and not self.connect_future.done():
+            self.connect_future.set_result(success)
+            
+    def disconnected(self):
+        if self.connected:
+            self.stats['disconnects'] += 1
+            self.logger.warning("Disconnected from MQTT broker, reconnecting")
         self.connected = False
         
+    def published(self):
+        self.stats['acked'] += 1
+        self.release_slot()
+        
+    def release_slot(self):
+        self.inflight -= 1
+        self.stats['inflight'] = self.inflight
+        self.slot_free.set()
+        
     async def connect(self):
         """Connect to MQTT broker"""
-        def on_connect(client, userdata, flags, rc):
-            if rc == 0:
-                self.connected = True
-                print(f"Connected to MQTT broker at {self.broker_host}:{self.broker_port}")
-            else:
-                print(f"Failed to connect to MQTT broker: {rc}")
-                
-        self.client.on_connect = on_connect
-        self.client.connect(self.broker_host, self.broker_port, 60)
+        self.loop = asyncio.get_running_loop()
+        self.connect_future = self.loop.create_future()
+        
+        self.client.connect_async(self.broker_host, self.broker_port, 60)
         self.client.loop_start()
+        self.started = True
         
-        # Wait for connection
-        while not self.connected:
-            await asyncio.sleep(0.1)
+        if self.summary_interval > 0:
+            self.summary_task = asyncio.create_task(self.summary_loop())
             
-    async def export_device(self, device_info: Dict[str, Any]):
-        """Export device to MQTT"""
-        if not self.connected:
+        # paho keeps retrying in the background if the first attempt fails,
+        # and queues publishes until it gets through
+        try:
+            await asyncio.wait_for(asyncio.shield(self.connect_future), self.connect_timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"No connection to MQTT broker after {self.connect_timeout}s, still trying")
+            
+    async def publish(self, topic: str, payload: str, retain: bool = False) -> bool:
+        """Publish at QoS 1, waiting while max_inflight messages are unacknowledged"""
+        if not self.started:
             await self.connect()
             
-        topic = f"{self.topic_prefix}/devices/{device_info['mac_addr'].replace(':', '_')}"
+        while self.inflight >= self.max_inflight:
+            self.slot_free.clear()
+            await self.slot_free.wait()
+            
+        self.inflight += 1
+        self.stats['inflight'] = self.inflight
+        self.stats['max_inflight'] = max(self.stats['max_inflight'], self.inflight)
+        
+        info = self.client.publish(topic, payload, qos=1, retain=retain)
+        
+        # Not connected is fine, paho sends queued messages after reconnecting;
+        # anything else means the message was discarded and won't be acked
+        if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+            self.release_slot()
+            self.stats['publish_errors'] += 1
+            return False
+            
+        self.stats['published'] += 1
+        return True
+        
+    async def export_device(self, device_info: Dict[str, Any]):
+        """Export device to MQTT if it changed"""
+        mac_addr = device_info['mac_addr']
+        
+        state = {k: v for k, v in device_info.items() if k not in self.VOLATILE_FIELDS}
+        if self.device_state.get(mac_addr) == state:
+            self.device_state.move_to_end(mac_addr)
+            self.stats['suppressed'] += 1
+            return
+            
+        mac_topic = mac_addr.replace(':', '_')
         payload = json.dumps(device_info)
         
-        self.client.publish(topic, payload, qos=1)
+        published = await self.publish(f"{self.topic_prefix}/devices/{mac_topic}", payload)
         
+        if self.retain_state:
+            published &= await self.publish(f"{self.topic_prefix}/state/{mac_topic}", payload,
+                                            retain=True)
+            
+        # Only a published state suppresses the next identical update
+        if published:
+            self.remember_state(mac_addr, state)
+        else:
+            self.device_state.pop(mac_addr, None)
+            
+
+        if self.summary_interval > 0:
+            self.summary_pending[mac_addr] = {k: device_info.get(k) for k in self.SUMMARY_FIELDS}
+            
+    def remember_state(self, mac_addr: str, state: Dict[str, Any]):
+        """Record a published device state, forgetting the least recently updated"""
+        self.device_state[mac_addr] = state
+        self.device_state.move_to_end(mac_addr)
+        
+        while len(self.device_state) > self.max_devices:
+            self.device_state.popitem(last=False)
+            self.stats['forgotten'] += 1
+            
+    async def summary_loop(self):
+        """Publish changed devices on the summary topic every summary_interval"""
+        while True:
+            await asyncio.sleep(self.summary_interval)
+            await self.publish_summary()
+            
+    async def publish_summary(self):
+        """Publish pending summary entries, summary_max devices per message"""
+        if not self.summary_pending:
+            return
+            
+        devices = list(self.summary_pending.values())
+        self.summary_pending = {}
+        
+        for i in range(0, len(devices), self.summary_max):
+            chunk = devices[i:i + self.summary_max]
+            await self.publish(f"{self.topic_prefix}/summary", json.dumps({
+                'timestamp': time.time(),
+                'count': len(chunk),
+                'devices': chunk
+            }))
+            self.stats['summaries'] += 1
+            
     async def export_event(self, event_data: Dict[str, Any]):
         """Export event to MQTT"""
-        if not self.connected:
-            await self.connect()
-            
         topic = f"{self.topic_prefix}/events"
         payload = json.dumps(event_data)
         
-        self.client.publish(topic, payload, qos=1)
+        await self.publish(topic, payload)
         
-    async def close(self):
-        """Close MQTT connection"""
-        if self.connected:
-            self.client.loop_stop()
-            self.client.disconnect()
+    async def close(self, timeout: float = 5.0):
+        """Wait for outstanding acks and close MQTT connection"""
+        if self.summary_task:
+            self.summary_task.cancel()
+            await asyncio.gather(self.summary_task, return_exceptions=True)
+            self.summary_task = None
+            
+        if not self.started:
+            return
+            
+        await self.publish_summary()
+        
+        deadline = time.monotonic() + timeout
+        while self.inflight > 0 and self.connected and time.monotonic() < deadline:
+            self.slot_free.clear()
+            try:
+                await asyncio.wait_for(self.slot_free.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+                
+        if self.inflight > 0:
+            self.logger.warning(f"Closing with {self.inflight} MQTT messages unacknowledged")
+            
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.started = False
+        self.connected = False
 
 
 class TCPExporter:
-    """Export device data to TCP server (configurable IP:port)"""
+    """
+    Export device data to TCP server (configurable IP:port)
+
+    Records are appended to a bounded buffer and a writer task sends them in
+    large writes, once flush_size bytes are waiting or every flush_interval
+    seconds.  While the server is unreachable, records stay in the buffer
+    (dropping the oldest past max_buffer bytes) and are replayed in order after
+    reconnecting.  Every record, device or event, takes the next number of one
+    sequence when it is captured, in every format, so the numbers continue
+    across reconnects and the server can detect gaps; a write that failed part
+    way is resent, so the server may see a record twice.
+    """
     
-    def __init__(self, server_host: str, server_port: int, format_type: str = "json"):
+    def __init__(self, server_host: str, server_port: int, format_type: str = "json",
+                 flush_size: int = 65536, flush_interval: float = 0.1,
+                 max_buffer: int = 8 * 1024 * 1024):
         self.server_host = server_host
         self.server_port = server_port
         self.format_type = format_type
@@ -458,6 +1574,34 @@ class TCPExporter:
         self.connected = False
         self.device_count = 0
         self.event_count = 0
+        self.sequence = 0
+        
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.flush_size, max_buffer)
+        self.buffer = deque()
+        self.buffered_bytes = 0
+        self.ready = asyncio.Event()
+        self.flush_task = None
+        
+        # Reconnect backoff
+        self.backoff_min = 1
+        self.backoff_max = 30
+        self.backoff = self.backoff_min
+        self.retry_at = 0
+        self.outage_start = None
+        
+        self.stats = {
+            'records_sent': 0,
+            'bytes_sent': 0,
+            'writes': 0,
+            'dropped': 0,
+            'replayed': 0,
+            'outages': 0,
+            'outage_time': 0.0,
+            'bytes_per_sec': 0.0
+        }
+        self.start_time = time.monotonic()
         
         # Setup logging
         self.logger = logging.getLogger(f"{__name__}.TCPExporter")
@@ -469,106 +1613,313 @@ class TCPExporter:
                 self.server_host, self.server_port
             )
             self.connected = True
+            self.backoff = self.backoff_min
             self.logger.info(f"Connected to TCP server at {self.server_host}:{self.server_port}")
+            
+            if self.outage_start is not None:
+                self.stats['outage_time'] += time.monotonic() - self.outage_start
+                self.stats['replayed'] += len(self.buffer)
+                self.outage_start = None
+                self.logger.info(f"Replaying {len(self.buffer)} records buffered during the outage")
         except Exception as e:
-            self.logger.error(f"Failed to connect to TCP server: {e}")
+            self.logger.error(f"Failed to connect to TCP server, retrying in {self.backoff}s: {e}")
             self.connected = False
+            self.retry_at = time.monotonic() + self.backoff
+            self.backoff = min(self.backoff * 2, self.backoff_max)
+            self.begin_outage()
             
-    async def send_data(self, data: str):
-        """Send data to TCP server"""
-        if not self.connected:
-            await self.connect()
+    def begin_outage(self):
+        if self.outage_start is None:
+            self.outage_start = time.monotonic()
+            self.stats['outages'] += 1
+            
+    def disconnect(self):
+        """Drop a failed connection; buffered records wait for the next one"""
+        if self.writer:
+            self.writer.close()
+        self.writer = None
+        self.reader = None
+        self.connected = False
+        self.begin_outage()
+        
+    def send_data(self, data: str):
+        """Buffer a record for the writer task"""
+        if not self.flush_task:
+            self.flush_task = asyncio.create_task(self.flush_loop())
+            
+        # Add newline delimiter for easier parsing on server side
+        message = (data + "\n").encode('utf-8')
+        
+        self.buffer.append(message)
+        self.buffered_bytes += len(message)
+        
+        while self.buffered_bytes > self.max_buffer:
+            self.buffered_bytes -= len(self.buffer.popleft())
+            self.stats['dropped'] += 1
+            
+        if self.buffered_bytes >= self.flush_size:
+            self.ready.set()
             
-        if self.connected and self.writer:
+    async def flush_loop(self):
+        """Write buffered records when enough are waiting or every flush_interval"""
+        while True:
             try:
-                # Add newline delimiter for easier parsing on server side
-                message = data + "\n"
-                self.writer.write(message.encode('utf-8'))
+                await asyncio.wait_for(self.ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.ready.clear()
+            await self.flush()
+            
+    async def flush(self):
+        """Send buffered records in writes of up to flush_size bytes"""
+        while self.buffer:
+            if not self.connected:
+                if time.monotonic() < self.retry_at:
+                    return
+                await self.connect()
+                if not self.connected:
+                    return
+                    
+            # Our end of the stream sees EOF when the server hangs up
+            if self.reader.at_eof() or self.writer.is_closing():
+                self.logger.error("TCP server closed the connection")
+                self.disconnect()
+                continue
+                
+            chunk = []
+            size = 0
+            while self.buffer and (not chunk or size + len(self.buffer[0]) <= self.flush_size):
+                message = self.buffer.popleft()
+                chunk.append(message)
+                size += len(message)
+            self.buffered_bytes -= size
+            
+            try:
+                self.writer.write(b"".join(chunk))
                 await self.writer.drain()
+            except asyncio.CancelledError:
+                self.restore(chunk)
+                raise
             except Exception as e:
                 self.logger.error(f"Failed to send data to TCP server: {e}")
-                self.connected = False
+                self.restore(chunk)
+                self.disconnect()
+                continue
                 
+            self.stats['records_sent'] += len(chunk)
+            self.stats['bytes_sent'] += size
+            self.stats['writes'] += 1
+            self.stats['bytes_per_sec'] = self.stats['bytes_sent'] / (time.monotonic() - self.start_time)
+            
+    def restore(self, chunk: list):
+        """Put unsent records back at the front of the buffer, within its bound"""
+        for message in reversed(chunk):
+            if self.buffered_bytes + len(message) > self.max_buffer:
+                self.stats['dropped'] += 1
+                continue
+            self.buffer.appendleft(message)
+            self.buffered_bytes += len(message)
+            
     async def export_device(self, device_info: Dict[str, Any]):
         """Export device to TCP server"""
         self.device_count += 1
+        self.sequence += 1
         
         if self.format_type == "json":
             # Send as JSON
             data = json.dumps({
                 "type": "device",
                 "data": device_info,
-                "sequence": self.device_count,
+                "sequence": self.sequence,
                 "timestamp": time.time()
             })
         elif self.format_type == "csv":
             # Send as CSV format
-            data = f"DEVICE,{device_info['mac_addr']},{device_info['phy_type']},{device_info['signal_dbm']},{device_info['total_packets']},{device_info['timestamp']}"
+            data = f"DEVICE,{self.sequence},{device_info['mac_addr']},{device_info['phy_type']},{device_info['signal_dbm']},{device_info['total_packets']},{device_info['timestamp']}"
         else:
             # Send as simple key-value format
-            data = f"DEVICE|{device_info['mac_addr']}|{device_info['phy_type']}|{device_info['signal_dbm']}|{device_info['total_packets']}"
+            data = f"DEVICE|{self.sequence}|{device_info['mac_addr']}|{device_info['phy_type']}|{device_info['signal_dbm']}|{device_info['total_packets']}"
             
-        await self.send_data(data)
+        self.send_data(data)
         
     async def export_event(self, event_data: Dict[str, Any]):
         """Export event to TCP server"""
         self.event_count += 1
+        self.sequence += 1
         
         if self.format_type == "json":
             data = json.dumps({
                 "type": "event",
                 "data": event_data,
-                "sequence": self.event_count,
+                "sequence": self.sequence,
                 "timestamp": time.time()
             })
         else:
-            data = f"EVENT|{json.dumps(event_data)}"
+            data = f"EVENT|{self.sequence}|{json.dumps(event_data)}"
             
-        await self.send_data(data)
+        self.send_data(data)
         
-    async def close(self):
-        """Close TCP connection"""
+    async def close(self, timeout: float = 5.0):
+        """Send what's buffered and close TCP connection"""
+        if self.flush_task:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+            
+        if self.buffer:
+            # One last attempt, without waiting out a reconnect backoff
+            self.retry_at = 0
+            try:
+                await asyncio.wait_for(self.flush(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if self.buffer:
+                self.logger.warning(f"Discarding {len(self.buffer)} records not sent to TCP server")
+                
         if self.writer:
             self.writer.close()
-            await self.writer.wait_closed()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
         self.connected = False
-        self.logger.info(f"TCP connection closed. Sent {self.device_count} devices, {self.event_count} events")
+        self.logger.info(f"TCP connection closed. Sent {self.device_count} devices, {self.event_count} events "
+                         f"({self.stats['records_sent']} records, {self.stats['outages']} outages, "
+                         f"{self.stats['dropped']} dropped)")
+
+
+class UDPDatagramProtocol(asyncio.DatagramProtocol):
+    """Tracks send errors and socket buffer pressure for UDPExporter"""
+    
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self.paused = False
+        
+    def pause_writing(self):
+        self.paused = True
+        
+    def resume_writing(self):
+        self.paused = False
+        
+    def error_received(self, exc):
+        # Usually ICMP port unreachable while nothing is listening
+        self.exporter.stats['errors'] += 1
+        self.exporter.logger.debug(f"UDP send error: {exc}")
+        
+    def connection_lost(self, exc):
+        self.exporter.transport = None
 
 
 class UDPExporter:
-    """Export device data to UDP server (configurable IP:port)"""
+    """
+    Export device data to UDP server (configurable IP:port)
+
+    Records are newline delimited and packed into datagrams of up to
+    max_payload bytes, sent through an asyncio datagram transport.  Each
+    datagram starts with a header line 'SEQ <sequence> <count>' so receivers
+    can measure loss from gaps in the datagram sequence.  A partly filled
+    datagram is sent after flush_interval seconds.  Datagrams are dropped,
+    rather than queued without bound, while the socket buffer is full.
+    """
     
-    def __init__(self, server_host: str, server_port: int, format_type: str = "json"):
+    # 1500 byte Ethernet MTU, less IPv4 and UDP headers
+    DEFAULT_MAX_PAYLOAD = 1472
+    
+    def __init__(self, server_host: str, server_port: int, format_type: str = "json",
+                 max_payload: int = DEFAULT_MAX_PAYLOAD, flush_interval: float = 0.05):
         self.server_host = server_host
         self.server_port = server_port
         self.format_type = format_type
-        self.sock = None
+        self.transport = None
+        self.protocol = None
         self.device_count = 0
         self.event_count = 0
         
+        self.max_payload = max_payload
+        self.flush_interval = flush_interval
+        self.sequence = 0
+        self.pending = []
+        self.pending_bytes = 0
+        self.flush_handle = None
+        
+        self.stats = {
+            'datagrams': 0,
+            'records': 0,
+            'bytes': 0,
+            'dropped': 0,
+            'oversize': 0,
+            'errors': 0
+        }
+        
         # Setup logging
         self.logger = logging.getLogger(f"{__name__}.UDPExporter")
         
     async def connect(self):
-        """Setup UDP socket"""
+        """Setup UDP transport"""
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            self.logger.info(f"UDP socket configured for {self.server_host}:{self.server_port}")
+            loop = asyncio.get_running_loop()
+            self.transport, self.protocol = await loop.create_datagram_endpoint(
+                lambda: UDPDatagramProtocol(self),
+                remote_addr=(self.server_host, self.server_port))
+            self.logger.info(f"UDP socket configured for {self.server_host}:{self.server_port}, "
+                             f"{self.max_payload} byte datagrams")
         except Exception as e:
             self.logger.error(f"Failed to create UDP socket: {e}")
             
+    def header(self, sequence: int, count: int) -> bytes:
+        """Datagram header line"""
+        return f"SEQ {sequence} {count}\n".encode('utf-8')
+        
     async def send_data(self, data: str):
-        """Send data via UDP"""
-        if not self.sock:
+        """Add a record to the pending datagram"""
+        if not self.transport:
             await self.connect()
-            
-        if self.sock:
-            try:
-                message = data.encode('utf-8')
-                self.sock.sendto(message, (self.server_host, self.server_port))
-            except Exception as e:
-                self.logger.error(f"Failed to send UDP data: {e}")
+            if not self.transport:
+                self.stats['dropped'] += 1
+                return
                 
+        message = (data + "\n").encode('utf-8')
+        
+        # Allow for the header growing as the sequence and count do
+        header_size = len(self.header(self.sequence + 1, len(self.pending) + 1))
+        if self.pending and header_size + self.pending_bytes + len(message) > self.max_payload:
+            self.flush()
+            
+        if len(self.header(self.sequence + 1, 1)) + len(message) > self.max_payload:
+            # Too big to pack; it goes alone and the network fragments it
+            self.stats['oversize'] += 1
+            
+        self.pending.append(message)
+        self.pending_bytes += len(message)
+        
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+            
+    def flush(self):
+        """Send the pending records as one datagram"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+            
+        if not self.pending:
+            return
+            
+        self.sequence += 1
+        datagram = self.header(self.sequence, len(self.pending)) + b"".join(self.pending)
+        count = len(self.pending)
+        self.pending = []
+        self.pending_bytes = 0
+        
+        # The sequence still advances for dropped datagrams, so receivers see the loss
+        if not self.transport or self.protocol.paused:
+            self.stats['dropped'] += count
+            return
+            
+        self.transport.sendto(datagram)
+        self.stats['datagrams'] += 1
+        self.stats['records'] += count
+        self.stats['bytes'] += len(datagram)
+        
     async def export_device(self, device_info: Dict[str, Any]):
         """Export device via UDP"""
         self.device_count += 1
@@ -607,10 +1958,13 @@ class UDPExporter:
         await self.send_data(data)
         
     async def close(self):
-        """Close UDP socket"""
-        if self.sock:
-            self.sock.close()
-        self.logger.info(f"UDP socket closed. Sent {self.device_count} devices, {self.event_count} events")
+        """Send the pending datagram and close UDP transport"""
+        self.flush()
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        self.logger.info(f"UDP socket closed. Sent {self.device_count} devices, {self.event_count} events "
+                         f"in {self.stats['datagrams']} datagrams")
 
 
 async def main():
@@ -621,14 +1975,38 @@ async def main():
     parser.add_argument("--export-type", choices=["console", "postgres", "influxdb", "mqtt", "tcp", "udp"], 
                        default="console", help="Export destination type")
     
+    # Export queue options
+    parser.add_argument("--queue-size", type=int, default=1000, help="Maximum updates waiting for export")
+    parser.add_argument("--export-workers", type=int, default=1,
+                       help="Concurrent exporter tasks (more than 1 doesn't preserve per-device order)")
+    parser.add_argument("--queue-overflow", choices=OVERFLOW_POLICIES, default="block",
+                       help="When the queue is full: block ingest, drop the oldest update, or coalesce updates per MAC")
+    
     # PostgreSQL options
     parser.add_argument("--postgres-conn", help="PostgreSQL connection string")
+    parser.add_argument("--postgres-batch-size", type=int, default=500, help="Devices per PostgreSQL upsert batch")
+    parser.add_argument("--postgres-flush-interval", type=float, default=1.0,
+                       help="Seconds between flushes of partial PostgreSQL batches")
+    parser.add_argument("--postgres-pool-size", type=int, default=4, help="PostgreSQL connection pool size")
+    parser.add_argument("--postgres-history", choices=["day", "hour"],
+                       help="Also append every update to a history table partitioned by day or hour")
+    parser.add_argument("--postgres-history-retention", type=float, default=30,
+                       help="Days of PostgreSQL history to keep")
+    parser.add_argument("--postgres-history-ahead", type=int, default=3,
+                       help="History partitions to create ahead of time")
+    parser.add_argument("--postgres-event-buffer", type=int, default=100000,
+                       help="Maximum events buffered for PostgreSQL before dropping the oldest")
     
     # InfluxDB options
     parser.add_argument("--influx-url", help="InfluxDB URL")
     parser.add_argument("--influx-token", help="InfluxDB token")
     parser.add_argument("--influx-org", help="InfluxDB organization")
     parser.add_argument("--influx-bucket", help="InfluxDB bucket")
+    parser.add_argument("--influx-batch-size", type=int, default=5000, help="Lines per InfluxDB write")
+    parser.add_argument("--influx-flush-interval", type=float, default=1.0,
+                       help="Seconds between flushes of partial InfluxDB batches")
+    parser.add_argument("--influx-buffer", type=int, default=100000,
+                       help="Maximum lines buffered for InfluxDB before dropping the oldest")
     
     # MQTT options
     parser.add_argument("--mqtt-host", help="MQTT broker hostname")
@@ -636,12 +2014,32 @@ async def main():
     parser.add_argument("--mqtt-topic-prefix", default="kismet", help="MQTT topic prefix")
     parser.add_argument("--mqtt-username", help="MQTT username")
     parser.add_argument("--mqtt-password", help="MQTT password")
+    parser.add_argument("--mqtt-retain-state", action="store_true",
+                       help="Also publish each device to a retained {prefix}/state/{mac} topic")
+    parser.add_argument("--mqtt-summary-interval", type=float, default=10.0,
+                       help="Seconds between {prefix}/summary messages of changed devices (0 to disable)")
+    parser.add_argument("--mqtt-max-inflight", type=int, default=100,
+                       help="Maximum unacknowledged QoS 1 messages")
+    parser.add_argument("--mqtt-connect-timeout", type=float, default=10.0,
+                       help="Seconds to wait for the first MQTT connection")
+    parser.add_argument("--mqtt-max-devices", type=int, default=100000,
+                       help="Devices whose last published state is remembered for change detection")
     
     # TCP/UDP options
     parser.add_argument("--server-host", default="172.18.18.20", help="TCP/UDP server hostname or IP address")
     parser.add_argument("--server-port", type=int, default=8685, help="TCP/UDP server port")
     parser.add_argument("--data-format", choices=["json", "csv", "simple"], default="json", 
                        help="Data format for TCP/UDP export (json, csv, or simple)")
+    parser.add_argument("--tcp-flush-size", type=int, default=65536,
+                       help="Bytes buffered before a TCP write")
+    parser.add_argument("--tcp-flush-interval", type=float, default=0.1,
+                       help="Seconds between TCP writes of partially filled buffers")
+    parser.add_argument("--tcp-buffer-size", type=int, default=8 * 1024 * 1024,
+                       help="Maximum bytes buffered for TCP, kept across outages")
+    parser.add_argument("--udp-max-payload", type=int, default=UDPExporter.DEFAULT_MAX_PAYLOAD,
+                       help="Maximum UDP datagram payload; MTU less IP and UDP headers (1472 for IPv4 on Ethernet)")
+    parser.add_argument("--udp-flush-interval", type=float, default=0.05,
+                       help="Seconds before sending a partly filled UDP datagram")
     
     args = parser.parse_args()
     
@@ -650,7 +2048,10 @@ async def main():
         kismet_host=args.kismet_host,
         kismet_port=args.kismet_port,
         update_rate=args.update_rate,
-        export_type=args.export_type
+        export_type=args.export_type,
+        queue_size=args.queue_size,
+        workers=args.export_workers,
+        overflow=args.queue_overflow
     )
     
     # Setup exporter based on type
@@ -660,25 +2061,37 @@ async def main():
         if not args.postgres_conn:
             print("Error: --postgres-conn required for PostgreSQL export")
             sys.exit(1)
-        client.exporter = PostgreSQLExporter(args.postgres_conn)
+        client.exporter = PostgreSQLExporter(args.postgres_conn, args.postgres_batch_size,
+                                             args.postgres_flush_interval, args.postgres_pool_size,
+                                             args.postgres_history, args.postgres_history_retention,
+                                             args.postgres_history_ahead, args.postgres_event_buffer)
     elif args.export_type == "influxdb":
         if not all([args.influx_url, args.influx_token, args.influx_org, args.influx_bucket]):
             print("Error: InfluxDB options required for InfluxDB export")
             sys.exit(1)
         client.exporter = InfluxDBExporter(args.influx_url, args.influx_token, 
-                                          args.influx_org, args.influx_bucket)
+                                          args.influx_org, args.influx_bucket,
+                                          args.influx_batch_size, args.influx_flush_interval,
+                                          args.influx_buffer)
     elif args.export_type == "mqtt":
         if not args.mqtt_host:
             print("Error: --mqtt-host required for MQTT export")
             sys.exit(1)
         client.exporter = MQTTExporter(args.mqtt_host, args.mqtt_port, 
-                                      args.mqtt_topic_prefix, args.mqtt_username, args.mqtt_password)
+                                      args.mqtt_topic_prefix, args.mqtt_username, args.mqtt_password,
+                                      retain_state=args.mqtt_retain_state,
+                                      summary_interval=args.mqtt_summary_interval,
+                                      max_inflight=args.mqtt_max_inflight,
+                                      connect_timeout=args.mqtt_connect_timeout,
+                                      max_devices=args.mqtt_max_devices)
     elif args.export_type == "tcp":
         print(f"Configuring TCP export to {args.server_host}:{args.server_port} (format: {args.data_format})")
-        client.exporter = TCPExporter(args.server_host, args.server_port, args.data_format)
+        client.exporter = TCPExporter(args.server_host, args.server_port, args.data_format,
+                                      args.tcp_flush_size, args.tcp_flush_interval, args.tcp_buffer_size)
     elif args.export_type == "udp":
         print(f"Configuring UDP export to {args.server_host}:{args.server_port} (format: {args.data_format})")
-        client.exporter = UDPExporter(args.server_host, args.server_port, args.data_format)
+        client.exporter = UDPExporter(args.server_host, args.server_port, args.data_format,
+                                      args.udp_max_payload, args.udp_flush_interval)
     
     # Setup signal handlers for graceful shutdown
     def signal_handler(signum, frame):
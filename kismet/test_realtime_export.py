@@ -0,0 +1,1041 @@
+#!/usr/bin/env python3
+"""
+Test script for the Kismet real-time export client
+Drives the ingest path with simulated device updates against slow exporters
+and checks the export queue overflow policies
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import paho.mqtt.client as mqtt
+from influxdb_client.rest import ApiException
+
+from kismet_realtime_export import (KismetExportClient, ExportQueue, PostgreSQLExporter,
+        InfluxDBExporter, MQTTExporter, TCPExporter, UDPExporter)
+
+class SlowExporter:
+    """Exporter which takes a fixed time per export, recording what it saw"""
+    
+    def __init__(self, delay: float = 0.005):
+        self.delay = delay
+        self.devices = []
+        self.events = []
+        self.active = 0
+        self.max_active = 0
+        
+    async def export_device(self, device_info):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            self.devices.append(device_info)
+        finally:
+            self.active -= 1
+            
+    async def export_event(self, event_data):
+        self.events.append(event_data)
+        
+    async def close(self):
+        pass
+
+def device_update(mac, packets):
+    return {
+        'kismet.device.base.macaddr': mac,
+        'kismet.device.base.phyname': 'IEEE802.11',
+        'kismet.device.base.packets.total': packets
+    }
+
+def make_client(exporter, **kwargs):
+    client = KismetExportClient(**kwargs)
+    client.exporter = exporter
+    client.stats['start_time'] = time.time()
+    return client
+
+async def ingest(client, macs, rounds):
+    """Feed rounds of updates for each MAC; returns the time ingest spent"""
+    start = time.perf_counter()
+    for r in range(rounds):
+        for mac in macs:
+            await client.process_device_update(device_update(mac, r))
+    return time.perf_counter() - start
+
+MACS = [f"aa:bb:cc:dd:ee:{i:02x}" for i in range(20)]
+
+def test_block():
+    """Test blocking keeps every update and bounds the queue"""
+    print("Testing block overflow...")
+    
+    async def run():
+        exporter = SlowExporter(0.001)
+        client = make_client(exporter, queue_size=10, overflow="block")
+        await ingest(client, MACS, 5)
+        await client.stop_workers()
+        return (client, exporter)
+        
+    (client, exporter) = asyncio.run(run())
+    
+    assert len(exporter.devices) == 100, f"Exported {len(exporter.devices)} of 100"
+    assert client.stats['queue_max_depth'] <= 10
+    assert client.stats['queue_dropped'] == 0
+    
+    print("✅ Block: OK")
+
+def test_drop_oldest():
+    """Test a slow exporter doesn't stall ingest when dropping"""
+    print("Testing drop-oldest overflow...")
+    
+    async def run():
+        exporter = SlowExporter(0.01)
+        client = make_client(exporter, queue_size=50, overflow="drop-oldest")
+        elapsed = await ingest(client, MACS, 25)
+        await client.stop_workers()
+        return (client, exporter, elapsed)
+        
+    (client, exporter, elapsed) = asyncio.run(run())
+    
+    # 500 updates at 10ms each would take 5s inline
+    assert elapsed < 1.0, f"Ingest stalled for {elapsed:.2f}s"
+    assert client.stats['queue_dropped'] > 0
+    assert len(exporter.devices) + client.stats['queue_dropped'] == 500
+    # The newest updates survive
+    assert exporter.devices[-1]['total_packets'] == 24
+    
+    print(f"📊 Ingest {elapsed * 1000:.0f}ms, {client.stats['queue_dropped']} dropped, "
+          f"max lag {client.stats['queue_max_lag'] * 1000:.0f}ms")
+    print("✅ Drop oldest: OK")
+
+def test_coalesce():
+    """Test coalescing exports the latest state of every device"""
+    print("Testing coalesce overflow...")
+    
+    async def run():
+        exporter = SlowExporter(0.002)
+        client = make_client(exporter, queue_size=len(MACS), overflow="coalesce")
+        elapsed = await ingest(client, MACS, 50)
+        await client.stop_workers()
+        return (client, exporter, elapsed)
+        
+    (client, exporter, elapsed) = asyncio.run(run())
+    
+    latest = {}
+    for d in exporter.devices:
+        latest[d['mac_addr']] = d['total_packets']
+        
+    assert latest == {mac: 49 for mac in MACS}, "Latest update lost for some devices"
+    assert client.stats['queue_coalesced'] > 0
+    assert len(exporter.devices) + client.stats['queue_coalesced'] == 1000
+    assert client.stats['queue_dropped'] == 0
+    
+    print(f"📊 {len(exporter.devices)} exported, {client.stats['queue_coalesced']} coalesced")
+    print("✅ Coalesce: OK")
+
+def test_coalesce_waiting_producers():
+    """Test producers waiting with the same new device coalesce into one item"""
+    print("Testing coalesce with waiting producers...")
+    
+    async def run():
+        queue = ExportQueue(2, "coalesce")
+        await queue.put("device", {'n': 0}, MACS[0])
+        await queue.put("device", {'n': 0}, MACS[1])
+        
+        # Both wait for room with the same device, which isn't queued yet
+        producers = [asyncio.create_task(queue.put("device", {'n': n}, MACS[2])) for n in (1, 2)]
+        await asyncio.sleep(0)
+        
+        items = []
+        while len(items) < 3:
+            (item, _) = await queue.get()
+            items.append(item)
+            await queue.task_done()
+        await asyncio.gather(*producers)
+        await asyncio.wait_for(queue.join(), 1)
+        return (queue, items)
+        
+    (queue, items) = asyncio.run(run())
+    
+    assert items[-1] == ("device", {'n': 2}), items
+    assert queue.pending == 0 and len(queue) == 0, f"{queue.pending} pending"
+    assert queue.coalesced == 1
+    
+    print("✅ Coalesce with waiting producers: OK")
+
+def test_workers():
+    """Test several workers export concurrently"""
+    print("Testing exporter workers...")
+    
+    async def run():
+        exporter = SlowExporter(0.01)
+        client = make_client(exporter, queue_size=100, workers=4)
+        await ingest(client, MACS, 2)
+        start = time.perf_counter()
+        await client.queue.join()
+        elapsed = time.perf_counter() - start
+        await client.stop_workers()
+        return (exporter, elapsed)
+        
+    (exporter, elapsed) = asyncio.run(run())
+    
+    assert exporter.max_active == 4, f"{exporter.max_active} concurrent exports"
+    assert len(exporter.devices) == 40
+    assert elapsed < 40 * 0.01, f"Draining took {elapsed:.2f}s"
+    
+    print("✅ Workers: OK")
+
+def test_events_not_coalesced():
+    """Test events always queue separately"""
+    print("Testing events in a coalescing queue...")
+    
+    async def run():
+        queue = ExportQueue(10, "coalesce")
+        for i in range(3):
+            await queue.put("event", {'n': i})
+        await queue.put("device", {'n': 0}, "aa:bb:cc:dd:ee:ff")
+        await queue.put("device", {'n': 1}, "aa:bb:cc:dd:ee:ff")
+        return [(await queue.get())[0] for _ in range(len(queue))]
+        
+    items = asyncio.run(run())
+    
+    assert items == [("event", {'n': 0}), ("event", {'n': 1}), ("event", {'n': 2}),
+                     ("device", {'n': 1})], items
+    
+    print("✅ Events: OK")
+
+class NoPartitionError(Exception):
+    """Error COPY raises when no history partition covers a row"""
+    sqlstate = '23514'
+
+class FakeConnection:
+    """Stand-in for an asyncpg pool connection recording COPY batches"""
+    
+    def __init__(self, pool):
+        self.pool = pool
+        
+    def transaction(self):
+        return self
+        
+    async def __aenter__(self):
+        return self
+        
+    async def __aexit__(self, *args):
+        return False
+        
+    async def copy_records_to_table(self, table, records, columns):
+        if self.pool.fail > 0:
+            self.pool.fail -= 1
+            raise ConnectionError("connection lost")
+        if table == 'kismet_device_history':
+            if self.pool.history_fail > 0:
+                self.pool.history_fail -= 1
+                raise ConnectionError("connection lost")
+            if not self.pool.partitioned:
+                raise NoPartitionError("no partition of relation found for row")
+        self.pool.active += 1
+        self.pool.max_active = max(self.pool.max_active, self.pool.active)
+        try:
+            await asyncio.sleep(self.pool.delay)
+        finally:
+            self.pool.active -= 1
+        self.pool.copies.append((table, list(records), columns))
+        
+    async def execute(self, query):
+        self.pool.queries.append(query)
+        if "PARTITION OF" in query:
+            self.pool.partitioned = True
+        
+class FakePool:
+    def __init__(self):
+        self.copies = []
+        self.queries = []
+        self.fail = 0
+        self.delay = 0
+        self.partitioned = True
+        self.history_fail = 0
+        self.active = 0
+        self.max_active = 0
+        
+    def acquire(self):
+        return FakeConnection(self)
+        
+    async def close(self):
+        pass
+
+def test_postgres_batching():
+    """Test devices are upserted in batches, keeping the latest row per MAC"""
+    print("Testing PostgreSQL batching...")
+    
+    async def run():
+        exporter = PostgreSQLExporter("postgresql://unused", batch_size=10, flush_interval=60)
+        exporter.pool = pool = FakePool()
+        
+        client = KismetExportClient()
+        for r in range(3):
+            for mac in MACS[:15]:
+                info = client.extract_device_info(device_update(mac, r))
+                info['frequency'] = 2437000.0
+                await exporter.export_device(info)
+                
+        # A failed flush keeps its rows for the next one
+        pool.fail = 1
+        await exporter.flush()
+        failed = len(exporter.batch)
+        await exporter.close()
+        return (exporter, pool, failed)
+        
+    (exporter, pool, failed) = asyncio.run(run())
+    
+    columns = PostgreSQLExporter.DEVICE_COLUMNS
+    rows = [dict(zip(columns, row)) for (_, records, _) in pool.copies for row in records]
+    
+    assert all(len(records) == 10 for (_, records, _) in pool.copies[:4])
+    assert failed == 5 and exporter.stats['flush_errors'] == 1
+    assert len(rows) == 45 and exporter.stats['rows'] == 45
+    assert len(pool.queries) == len(pool.copies), "Upsert not run once per batch"
+    assert rows[-1]['total_packets'] == 2
+    assert isinstance(rows[0]['frequency'], int), "Rows not converted for COPY"
+    
+    print(f"📊 {exporter.stats['batches']} batches, {exporter.stats['rows']} rows")
+    print("✅ PostgreSQL batching: OK")
+
+def test_postgres_flush_order():
+    """Test size and timer flushes don't overlap, so batches commit in order"""
+    print("Testing PostgreSQL flush ordering...")
+    
+    async def run():
+        exporter = PostgreSQLExporter("postgresql://unused", batch_size=10, flush_interval=0.01)
+        exporter.pool = pool = FakePool()
+        pool.delay = 0.02
+        exporter.flush_task = asyncio.create_task(exporter.flush_loop())
+        
+        client = KismetExportClient()
+        for r in range(20):
+            for mac in MACS[:12]:
+                await exporter.export_device(client.extract_device_info(device_update(mac, r)))
+            await asyncio.sleep(0.005)
+        await exporter.close()
+        return pool
+        
+    pool = asyncio.run(run())
+    
+    latest = {}
+    for (_, records, _) in pool.copies:
+        for row in records:
+            latest[row[0]] = row[PostgreSQLExporter.DEVICE_COLUMNS.index('total_packets')]
+    
+    assert pool.max_active == 1, f"{pool.max_active} flushes ran at once"
+    assert set(latest.values()) == {19}, latest
+    assert all("kismet_devices.last_seen <= EXCLUDED.last_seen" in q for q in pool.queries)
+    
+    print(f"📊 {len(pool.copies)} batches")
+    print("✅ PostgreSQL flush ordering: OK")
+
+class FakePartitionConnection:
+    """Stand-in connection tracking history partitions by name"""
+    
+    def __init__(self, partitions):
+        self.partitions = set(partitions)
+        self.queries = []
+        
+    async def fetch(self, query):
+        return [{'relname': name} for name in self.partitions]
+        
+    async def execute(self, query):
+        self.queries.append(query)
+        words = query.split()
+        if words[:2] == ["CREATE", "TABLE"]:
+            self.partitions.add(words[5])
+        elif words[:2] == ["DROP", "TABLE"]:
+            self.partitions.discard(words[4])
+
+def test_history_partitions():
+    """Test history partitions are created ahead and dropped past retention"""
+    print("Testing history partition maintenance...")
+    
+    async def run():
+        exporter = PostgreSQLExporter("postgresql://unused", history='hour',
+                                      history_retention=0.25, history_ahead=2)
+        conn = FakePartitionConnection(["kismet_device_history_p2025011700",
+                                        "kismet_device_history_p2025011705",
+                                        "kismet_device_history_p2025011706"])
+        await exporter.maintain_partitions(conn, datetime(2025, 1, 17, 12, 30, tzinfo=timezone.utc))
+        return (exporter, conn)
+        
+    (exporter, conn) = asyncio.run(run())
+    
+    # 6 hours retention from 12:30 keeps the 06:00 partition, which ends at 07:00
+    assert conn.partitions == {"kismet_device_history_p2025011706",
+                               "kismet_device_history_p2025011712",
+                               "kismet_device_history_p2025011713",
+                               "kismet_device_history_p2025011714"}, conn.partitions
+    assert exporter.stats['partitions_created'] == 3
+    assert exporter.stats['partitions_dropped'] == 2
+    assert any("FROM ('2025-01-17T13:00:00+00:00') TO ('2025-01-17T14:00:00+00:00')" in q
+               for q in conn.queries)
+    
+    print("✅ History partitions: OK")
+
+def test_history_missing_partition():
+    """Test a missing history partition is created without holding up devices"""
+    print("Testing history with a missing partition...")
+    
+    async def run():
+        exporter = PostgreSQLExporter("postgresql://unused", batch_size=100, history='hour')
+        exporter.pool = pool = FakePool()
+        pool.partitioned = False
+        
+        client = KismetExportClient()
+        for mac in MACS[:5]:
+            await exporter.export_device(client.extract_device_info(device_update(mac, 0)))
+        
+        # The first history write fails outright, and devices are still upserted
+        pool.history_fail = 1
+        await exporter.flush()
+        failed = (exporter.stats['history_errors'], len(exporter.history_rows), len(exporter.batch))
+        
+        for mac in MACS[:5]:
+            await exporter.export_device(client.extract_device_info(device_update(mac, 1)))
+        await exporter.close()
+        return (exporter, pool, failed)
+        
+    (exporter, pool, failed) = asyncio.run(run())
+    
+    tables = [table for (table, _, _) in pool.copies]
+    hour = exporter.partition_name(exporter.partition_start(datetime.now(timezone.utc)))
+    
+    assert failed == (1, 5, 0), failed
+    assert tables == ['kismet_devices_stage', 'kismet_devices_stage', 'kismet_device_history'], tables
+    assert len(pool.copies[2][1]) == 10, "History rows lost"
+    assert exporter.stats['partitions_created'] == 1
+    assert any(hour in q for q in pool.queries), "Partition for now not created"
+    assert exporter.stats['rows'] == 10 and exporter.stats['flush_errors'] == 0
+    
+    print("✅ History missing partition: OK")
+
+def test_postgres_events():
+    """Test events are buffered, bounded and written with COPY"""
+    print("Testing PostgreSQL events...")
+    
+    alert = {"kismet.alert": {"kismet.alert.header": "DEAUTHFLOOD",
+                              "kismet.alert.device_key": "4202770D00000000_AABBCC000007",
+                              "kismet.alert.source_mac": "00:00:00:00:00:00",
+                              "kismet.alert.transmitter_mac": "AA:BB:CC:00:00:07"}}
+    
+    async def run():
+        exporter = PostgreSQLExporter("postgresql://unused", batch_size=10, event_buffer=50)
+        exporter.pool = pool = FakePool()
+        
+        # Writes fail while the buffer overflows, then recover
+        pool.fail = 1
+        for i in range(60):
+            await exporter.export_event(alert)
+        await exporter.flush_events()
+        await exporter.export_event({'event_type': 'NEWDEVICE', 'device_mac': 'aa:bb:cc:dd:ee:ff'})
+        await exporter.close()
+        return (exporter, pool)
+        
+    (exporter, pool) = asyncio.run(run())
+    
+    rows = [dict(zip(PostgreSQLExporter.EVENT_COLUMNS, row))
+            for (table, records, _) in pool.copies if table == 'kismet_events' for row in records]
+    
+    assert exporter.stats['event_flush_errors'] == 1
+    # The failed batch refills the buffer, so the last event drops one more
+    assert exporter.stats['events_dropped'] == 11
+    assert len(rows) == 50 and exporter.stats['events'] == 50
+    assert rows[0]['event_type'] == "DEAUTHFLOOD"
+    assert rows[0]['device_key'] == "4202770D00000000_AABBCC000007"
+    assert rows[0]['mac_addr'] == "AA:BB:CC:00:00:07", "Unset source MAC not skipped"
+    assert (rows[-1]['event_type'], rows[-1]['mac_addr']) == ("NEWDEVICE", "aa:bb:cc:dd:ee:ff")
+    
+    print("✅ PostgreSQL events: OK")
+
+class FakeSchemaConnection:
+    """Stand-in connection with an existing kismet_events layout"""
+    
+    def __init__(self, columns, fail=None):
+        self.columns = columns
+        self.fail = fail
+        self.queries = []
+        
+    def transaction(self):
+        return self
+        
+    async def __aenter__(self):
+        return self
+        
+    async def __aexit__(self, *args):
+        return False
+        
+    async def fetch(self, query):
+        return [{'column_name': c} for c in self.columns]
+        
+    async def execute(self, query):
+        if self.fail and self.fail in query:
+            raise RuntimeError(f"column {self.fail} does not exist")
+        self.queries.append(" ".join(query.split()))
+
+def test_postgres_legacy_events():
+    """Test an old kismet_events layout is moved aside, and can't stop devices"""
+    print("Testing PostgreSQL legacy events table...")
+    
+    legacy = ['id', 'event_type', 'event_time', 'device_mac', 'event_data', 'created_at']
+    
+    async def run():
+        exporter = PostgreSQLExporter("postgresql://unused")
+        
+        conn = FakeSchemaConnection(legacy)
+        await exporter.prepare_database(conn)
+        migrated = (exporter.events_enabled, conn.queries)
+        
+        conn = FakeSchemaConnection(list(PostgreSQLExporter.EVENT_COLUMNS))
+        await exporter.prepare_database(conn)
+        current = conn.queries
+        
+        # The event schema failing leaves devices working and events off
+        conn = FakeSchemaConnection(legacy, fail="received_at")
+        await exporter.prepare_database(conn)
+        
+        exporter.pool = pool = FakePool()
+        client = KismetExportClient()
+        await exporter.export_device(client.extract_device_info(device_update(MACS[0], 0)))
+        await exporter.export_event({'event_type': 'NEWDEVICE'})
+        await exporter.close()
+        return (exporter, pool, migrated, current, conn.queries)
+        
+    (exporter, pool, migrated, current, failed) = asyncio.run(run())
+    
+    (enabled, queries) = migrated
+    renames = [q for q in queries if "RENAME" in q]
+    
+    assert enabled
+    assert renames == ["ALTER TABLE kismet_events RENAME TO kismet_events_legacy"], renames
+    assert queries.index(renames[0]) < [i for (i, q) in enumerate(queries) if "CREATE TABLE IF NOT EXISTS kismet_events" in q][0]
+    assert not any("RENAME" in q for q in current), "Current layout renamed"
+    
+    assert any("kismet_devices" in q for q in failed), "Device table not created"
+    assert not exporter.events_enabled
+    assert [t for (t, _, _) in pool.copies] == ['kismet_devices_stage'], pool.copies
+    assert exporter.stats['rows'] == 1 and exporter.stats['events_dropped'] == 1
+    
+    print("✅ PostgreSQL legacy events table: OK")
+
+class FakeWriteApi:
+    """Stand-in for the InfluxDB write API, failing the first writes"""
+    
+    def __init__(self, fail=0, reject=None):
+        self.fail = fail
+        self.reject = reject
+        self.writes = []
+        
+    async def write(self, bucket, record):
+        if self.fail > 0:
+            self.fail -= 1
+            raise ConnectionError("service unavailable")
+        if self.reject and self.reject[1] in record:
+            raise ApiException(status=self.reject[0], reason="Unprocessable Entity")
+        self.writes.append(record.split("\n"))
+        
+    async def close(self):
+        pass
+
+def test_influxdb_batching():
+    """Test InfluxDB lines are batched, retried and bounded"""
+    print("Testing InfluxDB batching...")
+    
+    async def run():
+        exporter = InfluxDBExporter("http://unused", "token", "org", "bucket",
+                                    batch_size=100, flush_interval=0.05, max_buffer=300)
+        exporter.backoff_min = exporter.backoff = 0.05
+        exporter.client = exporter.write_api = api = FakeWriteApi(fail=2)
+        exporter.flush_task = asyncio.create_task(exporter.flush_loop())
+        
+        client = KismetExportClient()
+        for r in range(2):
+            for i in range(200):
+                info = client.extract_device_info(device_update(f"aa:bb:cc:dd:{i >> 8:02x}:{i & 255:02x}", r))
+                info.update({'manufacturer': "Foo, Inc", 'signal_dbm': -50, 'latitude': 1.5, 'last_seen': 1700000000})
+                await exporter.export_device(info)
+        await exporter.export_event({'text': 'say "hi"'})
+        
+        await asyncio.sleep(0.5)
+        await exporter.close()
+        return (exporter, api)
+        
+    (exporter, api) = asyncio.run(run())
+    
+    lines = [line for batch in api.writes for line in batch]
+    
+    assert all(len(batch) <= 100 for batch in api.writes)
+    assert exporter.stats['write_errors'] == 2
+    # The buffer holds 300 lines while writes fail; the oldest are dropped
+    assert len(lines) + exporter.stats['dropped'] == 401, (len(lines), exporter.stats)
+    assert lines[0].startswith("device_metrics,mac_addr=aa:bb:cc:dd:")
+    assert ",manufacturer=Foo\\,\\ Inc,phy_type=IEEE802.11 " in lines[0], lines[0]
+    assert "total_packets=1i" in lines[-2], "Newest updates dropped"
+    assert "signal_dbm=-50i" in lines[0] and "latitude=1.5" in lines[0]
+    assert lines[0].endswith(" 1700000000000000000")
+    assert lines[-1].startswith('kismet_events event_data="{\\"text\\": \\"say \\\\\\"hi\\\\\\"\\"}" ')
+    
+    print(f"📊 {len(lines)} lines in {len(api.writes)} writes, {exporter.stats['dropped']} dropped")
+    print("✅ InfluxDB batching: OK")
+
+def test_influxdb_rejected():
+    """Test a batch InfluxDB rejects is discarded, and server errors are retried"""
+    print("Testing InfluxDB rejected batches...")
+    
+    async def run():
+        exporter = InfluxDBExporter("http://unused", "token", "org", "bucket",
+                                    batch_size=10, flush_interval=60, max_buffer=100)
+        exporter.client = exporter.write_api = api = FakeWriteApi(reject=(422, "frequency=0i"))
+        exporter.flush_task = True
+        
+        for i in range(30):
+            freq = 0 if 10 <= i < 20 else 2437000.5
+            exporter.append(exporter.line("device_metrics", {'mac_addr': f"aa:bb:cc:dd:ee:{i:02x}"},
+                                          {'frequency': freq}, 1700000000))
+        rejected = await exporter.flush()
+        
+        # A 503 is kept and retried
+        api.reject = (503, "frequency")
+        exporter.append(exporter.line("device_metrics", {}, {'frequency': 1.5}, 1700000000))
+        unavailable = await exporter.flush()
+        
+        return (exporter, api, rejected, unavailable)
+        
+    (exporter, api, rejected, unavailable) = asyncio.run(run())
+    
+    assert rejected, "Rejected batch treated as a failed write"
+    assert [len(batch) for batch in api.writes] == [10, 10], api.writes
+    assert api.writes[1][0].startswith("device_metrics,mac_addr=aa:bb:cc:dd:ee:14 ")
+    assert exporter.stats['rejected_batches'] == 1 and exporter.stats['rejected_lines'] == 10
+    assert exporter.stats['lines'] == 20
+    
+    assert not unavailable and len(exporter.lines) == 1
+    assert exporter.stats['write_errors'] == 1
+    
+    print("✅ InfluxDB rejected batches: OK")
+
+class FakeBroker:
+    """
+    Minimal MQTT 3.1.1 broker stand-in: accepts any client, records publishes
+    and acknowledges QoS 1 after ack_delay, tracking how many were outstanding
+    """
+    
+    def __init__(self, ack_delay: float = 0.0):
+        self.ack_delay = ack_delay
+        self.messages = []
+        self.unacked = 0
+        self.max_unacked = 0
+        self.connects = 0
+        self.writers = []
+        self.handlers = []
+        
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        
+    async def stop(self):
+        self.drop()
+        for handler in self.handlers:
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        self.server.close()
+        await self.server.wait_closed()
+        
+    def drop(self):
+        """Drop every client connection"""
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+        
+    async def ack(self, writer, packet_id):
+        await asyncio.sleep(self.ack_delay)
+        self.unacked -= 1
+        if not writer.is_closing():
+            writer.write(b"\x40\x02" + packet_id)
+            
+    async def handle(self, reader, writer):
+        self.writers.append(writer)
+        self.handlers.append(asyncio.current_task())
+        try:
+            while True:
+                header = (await reader.readexactly(1))[0]
+                (length, shift) = (0, 0)
+                while True:
+                    b = (await reader.readexactly(1))[0]
+                    length |= (b & 0x7F) << shift
+                    shift += 7
+                    if b < 0x80:
+                        break
+                body = await reader.readexactly(length)
+                
+                ptype = header >> 4
+                if ptype == 1:
+                    self.connects += 1
+                    writer.write(b"\x20\x02\x00\x00")
+                elif ptype == 3:
+                    qos = (header >> 1) & 3
+                    topic_len = int.from_bytes(body[:2], "big")
+                    pos = 2 + topic_len
+                    topic = body[2:pos].decode()
+                    if qos:
+                        packet_id = body[pos:pos + 2]
+                        pos += 2
+                        self.unacked += 1
+                        self.max_unacked = max(self.max_unacked, self.unacked)
+                        asyncio.create_task(self.ack(writer, packet_id))
+                    self.messages.append((topic, json.loads(body[pos:]), bool(header & 1)))
+                elif ptype == 12:
+                    writer.write(b"\xd0\x00")
+                elif ptype == 14:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+def test_mqtt_publishing():
+    """Test MQTT change suppression, summaries and in-flight bounds against a broker stand-in"""
+    print("Testing MQTT publishing...")
+    
+    async def run():
+        broker = FakeBroker(ack_delay=0.01)
+        await broker.start()
+        
+        exporter = MQTTExporter("127.0.0.1", broker.port, retain_state=True,
+                                summary_interval=0.2, summary_max=50, max_inflight=10)
+        client = KismetExportClient()
+        
+        start = time.perf_counter()
+        for r in range(2):
+            for i in range(100):
+                # The second round only changes half the devices
+                info = client.extract_device_info(device_update(f"aa:bb:cc:dd:ee:{i:02x}", r if i % 2 else 0))
+                await exporter.export_device(info)
+        elapsed = time.perf_counter() - start
+        
+        await asyncio.sleep(0.3)
+        await exporter.close()
+        await broker.stop()
+        return (exporter, broker, elapsed)
+        
+    (exporter, broker, elapsed) = asyncio.run(run())
+    
+    devices = [m for m in broker.messages if m[0].startswith("kismet/devices/")]
+    states = [m for m in broker.messages if m[0].startswith("kismet/state/")]
+    summaries = [m[1] for m in broker.messages if m[0] == "kismet/summary"]
+    
+    assert len(devices) == 150, f"{len(devices)} device publishes"
+    assert exporter.stats['suppressed'] == 50
+    assert len(states) == 150 and all(retain for (_, _, retain) in states)
+    assert not any(retain for (_, _, retain) in devices)
+    assert broker.max_unacked <= 10, f"{broker.max_unacked} messages in flight"
+    assert exporter.stats['acked'] == len(broker.messages) and exporter.inflight == 0
+    assert all(s['count'] <= 50 for s in summaries)
+    assert sum(s['count'] for s in summaries) >= 100
+    
+    rate = (len(devices) + len(states)) / elapsed
+    print(f"📊 {rate:.0f} msgs/s, {broker.max_unacked} max in flight, {len(summaries)} summaries")
+    print("✅ MQTT publishing: OK")
+
+class FakePublishInfo:
+    def __init__(self, rc):
+        self.rc = rc
+
+def test_mqtt_state_tracking():
+    """Test only published states suppress updates, and remembered states are bounded"""
+    print("Testing MQTT state tracking...")
+    
+    async def run():
+        exporter = MQTTExporter("127.0.0.1", summary_interval=0, max_inflight=1000, max_devices=10)
+        exporter.started = True
+        
+        # The client rejects the first publish, as when its queue is full
+        results = [mqtt.MQTT_ERR_QUEUE_SIZE]
+        published = []
+        
+        def publish(topic, payload, qos=0, retain=False):
+            rc = results.pop(0) if results else mqtt.MQTT_ERR_SUCCESS
+            if rc == mqtt.MQTT_ERR_SUCCESS:
+                published.append(topic)
+            return FakePublishInfo(rc)
+        exporter.client.publish = publish
+        
+        client = KismetExportClient()
+        info = client.extract_device_info(device_update(MACS[0], 0))
+        for _ in range(3):
+            await exporter.export_device(info)
+            
+        for mac in MACS:
+            await exporter.export_device(client.extract_device_info(device_update(mac, 0)))
+        return (exporter, published)
+        
+    (exporter, published) = asyncio.run(run())
+    
+    # The rejected state is published by the next update, then suppressed
+    assert exporter.stats['publish_errors'] == 1
+    assert published[0] == f"kismet/devices/{MACS[0].replace(':', '_')}"
+    assert exporter.stats['suppressed'] == 2, exporter.stats
+    assert list(exporter.device_state) == MACS[10:], "Not the most recent devices"
+    assert exporter.stats['forgotten'] == 10
+    
+    print("✅ MQTT state tracking: OK")
+
+def test_mqtt_reconnect():
+    """Test MQTT messages published during an outage arrive after reconnecting"""
+    print("Testing MQTT reconnect...")
+    
+    async def run():
+        broker = FakeBroker()
+        await broker.start()
+        
+        exporter = MQTTExporter("127.0.0.1", broker.port, summary_interval=0, max_inflight=5)
+        exporter.client.reconnect_delay_set(1, 1)
+        client = KismetExportClient()
+        
+        for i in range(10):
+            await exporter.export_device(client.extract_device_info(device_update(f"aa:bb:cc:dd:ee:{i:02x}", 0)))
+        await asyncio.sleep(0.2)
+        
+        broker.drop()
+        await asyncio.sleep(0.1)
+        for i in range(10):
+            await exporter.export_device(client.extract_device_info(device_update(f"aa:bb:cc:dd:ee:{i:02x}", 1)))
+            
+        await asyncio.sleep(1.5)
+        await exporter.close()
+        await broker.stop()
+        return (exporter, broker)
+        
+    (exporter, broker) = asyncio.run(run())
+    
+    received = set((m[1]['mac_addr'], m[1]['total_packets']) for m in broker.messages)
+    
+    assert broker.connects == 2, f"{broker.connects} connects"
+    assert exporter.stats['disconnects'] == 1
+    assert len(received) == 20, f"{len(received)} of 20 updates received"
+    assert exporter.inflight == 0
+    
+    print("✅ MQTT reconnect: OK")
+
+class LineServer:
+    """TCP server stand-in collecting newline-delimited records, as JSON by default"""
+    
+    def __init__(self, parse=json.loads):
+        self.parse = parse
+        self.records = []
+        self.connections = 0
+        self.writers = []
+        self.handlers = []
+        self.port = 0
+        
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        
+    async def stop(self):
+        self.server.close()
+        for writer in self.writers:
+            writer.close()
+        for handler in self.handlers:
+            handler.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+        self.writers = []
+        self.handlers = []
+        await self.server.wait_closed()
+        
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.writers.append(writer)
+        self.handlers.append(asyncio.current_task())
+        try:
+            async for line in reader:
+                self.records.append(self.parse(line))
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+def test_tcp_replay():
+    """Test TCP records are coalesced into large writes and replayed after an outage"""
+    print("Testing TCP buffering and replay...")
+    
+    async def run():
+        server = LineServer()
+        await server.start()
+        
+        exporter = TCPExporter("127.0.0.1", server.port, flush_size=16384, flush_interval=0.05)
+        exporter.backoff_min = exporter.backoff = 0.1
+        client = KismetExportClient()
+        
+        async def send(count):
+            for i in range(count):
+                await exporter.export_device(client.extract_device_info(device_update(MACS[i % 20], i)))
+                
+        await send(1000)
+        await asyncio.sleep(0.2)
+        
+        # The server goes away; records captured meanwhile are kept
+        await server.stop()
+        await send(10)
+        await asyncio.sleep(0.3)
+        await send(1000)
+        
+        await server.start()
+        await asyncio.sleep(0.5)
+        await exporter.close()
+        await server.stop()
+        return (exporter, server)
+        
+    (exporter, server) = asyncio.run(run())
+    
+    sequences = sorted(set(r['sequence'] for r in server.records))
+    
+    assert sequences == list(range(1, 2011)), f"Missing {2010 - len(sequences)} records"
+    assert exporter.stats['outages'] == 1
+    assert exporter.stats['replayed'] >= 1000
+    assert exporter.stats['dropped'] == 0
+    assert exporter.stats['writes'] < 2010 / 10, f"{exporter.stats['writes']} writes"
+    
+    print(f"📊 {exporter.stats['records_sent']} records in {exporter.stats['writes']} writes, "
+          f"{exporter.stats['outage_time']:.2f}s outage, {exporter.stats['replayed']} replayed")
+    print("✅ TCP replay: OK")
+
+def test_tcp_sequence():
+    """Test devices and events share one record sequence in every TCP format"""
+    print("Testing TCP record sequence...")
+    
+    async def run(format_type):
+        server = LineServer(parse=lambda line: line.decode().rstrip("\n"))
+        await server.start()
+        
+        exporter = TCPExporter("127.0.0.1", server.port, format_type=format_type, flush_interval=0.05)
+        client = KismetExportClient()
+        
+        for i in range(3):
+            update = device_update(MACS[i], i)
+            update['kismet.device.base.signal'] = {'kismet.common.signal.last_signal': -40 - i}
+            await exporter.export_device(client.extract_device_info(update))
+            await exporter.export_event({'kismet.alert.header': f"ALERT{i}"})
+            
+        await asyncio.sleep(0.2)
+        await exporter.close()
+        await server.stop()
+        return server.records
+        
+    records = asyncio.run(run("json"))
+    assert [(json.loads(r)['type'], json.loads(r)['sequence']) for r in records] == [
+        ("device", 1), ("event", 2), ("device", 3), ("event", 4), ("device", 5), ("event", 6)], records
+    
+    for (format_type, sep) in (("csv", ","), ("simple", "|")):
+        records = asyncio.run(run(format_type))
+        
+        devices = [r.split(sep) for r in records if r.startswith("DEVICE")]
+        events = [r.split("|", 2) for r in records if r.startswith("EVENT")]
+        
+        assert [int(d[1]) for d in devices] == [1, 3, 5], records
+        assert [d[2] for d in devices] == MACS[:3], records
+        assert [int(e[1]) for e in events] == [2, 4, 6], records
+        assert json.loads(events[2][2]) == {'kismet.alert.header': "ALERT2"}, records
+        
+    print("✅ TCP record sequence: OK")
+
+class DatagramCollector(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.datagrams = []
+        
+    def datagram_received(self, data, addr):
+        self.datagrams.append(data)
+
+def test_udp_packing():
+    """Test UDP records are packed into datagrams with sequence and count headers"""
+    print("Testing UDP datagram packing...")
+    
+    async def run():
+        loop = asyncio.get_running_loop()
+        (transport, collector) = await loop.create_datagram_endpoint(DatagramCollector,
+                                                                     local_addr=("127.0.0.1", 0))
+        port = transport.get_extra_info('sockname')[1]
+        
+        exporter = UDPExporter("127.0.0.1", port, max_payload=1472, flush_interval=0.05)
+        client = KismetExportClient()
+        
+        for i in range(500):
+            info = client.extract_device_info(device_update(MACS[i % 20], i))
+            info.update({'signal_dbm': -50})
+            await exporter.export_device(info)
+            if i % 5 == 0:
+                await asyncio.sleep(0)
+        # An oversized record goes in a datagram of its own
+        await exporter.export_event({'text': "x" * 2000})
+        
+        # The last partial datagram goes out after the flush interval
+        await asyncio.sleep(0.2)
+        await exporter.close()
+        transport.close()
+        return (exporter, collector.datagrams)
+        
+    (exporter, datagrams) = asyncio.run(run())
+    
+    sequences = []
+    records = []
+    for datagram in datagrams:
+        lines = datagram.decode().split("\n")
+        (tag, sequence, count) = lines[0].split()
+        assert tag == "SEQ" and lines[-1] == ""
+        assert int(count) == len(lines) - 2, f"Header count {count}, {len(lines) - 2} records"
+        sequences.append(int(sequence))
+        records += [json.loads(line) for line in lines[1:-1]]
+        
+    oversize = [d for d in datagrams if len(d) > 1472]
+    
+    assert sequences == list(range(1, len(datagrams) + 1))
+    assert [r['sequence'] for r in records if r['type'] == 'device'] == list(range(1, 501))
+    assert len(oversize) == 1 and exporter.stats['oversize'] == 1
+    assert len(datagrams) < 500 / 2, f"{len(datagrams)} datagrams for 500 records"
+    
+    print(f"📊 {len(records)} records in {len(datagrams)} datagrams, "
+          f"{sum(len(d) for d in datagrams) / len(datagrams):.0f} bytes average")
+    print("✅ UDP packing: OK")
+
+def run_all_tests():
+    print("🧪 Running real-time export tests\n")
+    
+    tests = [
+        test_block,
+        test_drop_oldest,
+        test_coalesce,
+        test_coalesce_waiting_producers,
+        test_workers,
+        test_events_not_coalesced,
+        test_postgres_batching,
+        test_postgres_flush_order,
+        test_history_partitions,
+        test_history_missing_partition,
+        test_postgres_events,
+        test_postgres_legacy_events,
+        test_influxdb_batching,
+        test_influxdb_rejected,
+        test_mqtt_publishing,
+        test_mqtt_state_tracking,
+        test_mqtt_reconnect,
+        test_tcp_replay,
+        test_tcp_sequence,
+        test_udp_packing,
+    ]
+    
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+        except AssertionError as e:
+            print(f"❌ {test.__name__} failed: {e}")
+            
+    print(f"\n📊 Results: {passed}/{len(tests)} tests passed")
+    
+    return passed == len(tests)
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(0 if run_all_tests() else 1)